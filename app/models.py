@@ -1,14 +1,47 @@
-
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
+from sys import intern
 from typing import List, Optional, Dict
 
-@dataclass
+# Slotted dataclasses: no per-instance __dict__. Low-cardinality strings
+# (glass, source, ingredient names, fetched_at, ...) are interned so a large
+# corpus shares one copy of each.
+
+def _intern(s):
+    return intern(s) if type(s) is str else s
+
+@dataclass(slots=True, frozen=True)
+class Quantity:
+    """A measure as numbers (see utils.measure); ml_* are None for non-volume units."""
+    amount_min: float
+    amount_max: float
+    unit: Optional[str] = None
+    ml_min: Optional[float] = None
+    ml_max: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {"amount_min": self.amount_min, "amount_max": self.amount_max, "unit": self.unit,
+                "ml_min": self.ml_min, "ml_max": self.ml_max}
+
+@dataclass(slots=True)
 class Ingredient:
     id: str
     name: str
     measure: Optional[str] = None
+    quantity: Optional[Quantity] = None
 
-@dataclass
+    def __post_init__(self):
+        self.id = _intern(self.id)
+        self.name = _intern(self.name)
+        self.measure = _intern(self.measure)
+        if type(self.quantity) is dict:
+            self.quantity = Quantity(**self.quantity)
+
+    def to_dict(self) -> Dict:
+        q = self.quantity
+        return {"id": self.id, "name": self.name, "measure": self.measure,
+                "quantity": None if q is None else q.to_dict()}
+
+@dataclass(slots=True)
 class Attribution:
     source_name: str
     source_url: str
@@ -16,7 +49,17 @@ class Attribution:
     license: Optional[str] = None
     fetched_at: Optional[str] = None
 
-@dataclass
+    def __post_init__(self):
+        self.source_name = _intern(self.source_name)
+        self.author = _intern(self.author)
+        self.license = _intern(self.license)
+        self.fetched_at = _intern(self.fetched_at)
+
+    def to_dict(self) -> Dict:
+        return {"source_name": self.source_name, "source_url": self.source_url, "author": self.author,
+                "license": self.license, "fetched_at": self.fetched_at}
+
+@dataclass(slots=True)
 class RecipeVersion:
     id: str
     name: str
@@ -30,17 +73,46 @@ class RecipeVersion:
     method: Optional[str] = None
     attribution: Attribution = None
 
+    def __post_init__(self):
+        self.glass = _intern(self.glass)
+        self.method = _intern(self.method)
+        self.tags = [_intern(t) for t in self.tags]
+
     def to_dict(self) -> Dict:
-        d = asdict(self)
-        return d
+        # Flat and non-recursive; same shape as dataclasses.asdict
+        a = self.attribution
+        return {
+            "id": self.id,
+            "name": self.name,
+            "name_slug": self.name_slug,
+            "ingredients": [{"id": i.id, "name": i.name, "measure": i.measure,
+                             "quantity": None if i.quantity is None else i.quantity.to_dict()}
+                            for i in self.ingredients],
+            "instructions": self.instructions,
+            "glass": self.glass,
+            "tags": list(self.tags),
+            "image": self.image,
+            "garnish": self.garnish,
+            "method": self.method,
+            "attribution": None if a is None else {
+                "source_name": a.source_name, "source_url": a.source_url, "author": a.author,
+                "license": a.license, "fetched_at": a.fetched_at},
+        }
 
-@dataclass
+@dataclass(slots=True)
 class CanonicalRecipe:
     id: str
     name: str
     versions: List[str]
     primary_version_id: Optional[str] = None
     aka: List[str] = field(default_factory=list)
+    # representative version id -> its near-duplicates (pipeline.similarity); with
+    # near-duplicate collapsing these are not in `versions`
+    duplicates: Dict[str, List[str]] = field(default_factory=dict)
 
     def to_dict(self) -> Dict:
-        return asdict(self)
+        d = {"id": self.id, "name": self.name, "versions": list(self.versions),
+             "primary_version_id": self.primary_version_id, "aka": list(self.aka)}
+        if self.duplicates:
+            d["duplicates"] = {rep: list(ids) for rep, ids in self.duplicates.items()}
+        return d
@@ -0,0 +1,221 @@
+# app/table.py
+"""
+Columnar storage for large RecipeVersion corpora.
+
+Every string lives once in a shared pool and the table only keeps
+array('I') columns of pool offsets; ingredients and tags are flattened into
+their own columns with a per-row start offset. A version costs a few dozen
+bytes of columns plus its genuinely unique strings (id, name, instructions,
+urls), instead of a tree of dicts/objects with their own copies.
+
+VersionTable is a read-only Mapping of version id -> RecipeVersion dict, so
+code written against the `{id: dict}` shape of pipeline.export_pack keeps
+working; rows() yields light views for code written against RecipeVersion.
+Appending an id again replaces its row; replaced rows are dropped by
+compact(), which append() runs once they outnumber the live ones.
+
+Ingredient quantities are not stored: they are a function of the measure, so
+they are parsed once per distinct measure (utils.measure) when read.
+"""
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.models import Attribution, Ingredient, Quantity, RecipeVersion
+from utils.measure import parse_measure
+
+# (field, interned) -- interned fields are deduplicated in the pool, the
+# rest are near-unique per version and simply appended
+FIELDS = (("id", False), ("name", False), ("name_slug", False), ("instructions", False),
+          ("glass", True), ("image", False), ("garnish", True), ("method", True))
+ATTRIBUTION_FIELDS = (("source_name", True), ("source_url", False), ("author", True),
+                      ("license", True), ("fetched_at", True))
+
+NONE = 0  # pool offset reserved for None
+
+def _as_dict(q: Optional[Quantity]) -> Optional[dict]:
+    return None if q is None else q.to_dict()
+
+class StringPool:
+    def __init__(self):
+        self.values: List = [None]
+        self._index: Dict = {}
+
+    def intern(self, s) -> int:
+        if s is None:
+            return NONE
+        i = self._index.get(s)
+        if i is None:
+            i = self._index[s] = len(self.values)
+            self.values.append(s)
+        return i
+
+    def add(self, s) -> int:
+        if s is None:
+            return NONE
+        self.values.append(s)
+        return len(self.values) - 1
+
+    def __len__(self):
+        return len(self.values)
+
+class VersionTable(Mapping):
+    def __init__(self):
+        self.pool = StringPool()
+        self.cols = {name: array("I") for name, _ in FIELDS + ATTRIBUTION_FIELDS}
+        self.has_attribution = bytearray()
+        self.ing_start = array("I", [0])
+        self.ing_id = array("I")
+        self.ing_name = array("I")
+        self.ing_measure = array("I")
+        self.tag_start = array("I", [0])
+        self.tags = array("I")
+        self._rows: Dict[str, int] = {}  # version id -> live row (a re-appended id replaces the old row)
+        self._dead = 0  # replaced rows still in the columns
+        self._quantities: Dict[int, Optional[Quantity]] = {}  # measure pool offset -> parsed quantity
+
+    @classmethod
+    def from_dicts(cls, dicts: Iterable[dict]) -> "VersionTable":
+        t = cls()
+        for d in dicts:
+            t.append(d)
+        return t
+
+    def append(self, v) -> int:
+        """Add a RecipeVersion (or its dict form); returns the row number."""
+        d = v if isinstance(v, dict) else v.to_dict()
+        pool, cols = self.pool, self.cols
+        row = len(self.has_attribution)
+        for name, interned in FIELDS:
+            cols[name].append(pool.intern(d.get(name)) if interned else pool.add(d.get(name)))
+        a = d.get("attribution")
+        self.has_attribution.append(1 if a else 0)
+        a = a or {}
+        for name, interned in ATTRIBUTION_FIELDS:
+            cols[name].append(pool.intern(a.get(name)) if interned else pool.add(a.get(name)))
+        for ing in d.get("ingredients") or ():
+            self.ing_id.append(pool.intern(ing.get("id")))
+            self.ing_name.append(pool.intern(ing.get("name")))
+            self.ing_measure.append(pool.intern(ing.get("measure")))
+        self.ing_start.append(len(self.ing_id))
+        for tag in d.get("tags") or ():
+            self.tags.append(pool.intern(tag))
+        self.tag_start.append(len(self.tags))
+        vid = pool.values[cols["id"][row]]
+        if vid in self._rows:
+            self._dead += 1
+        self._rows[vid] = row
+        if self._dead > len(self._rows):
+            self.compact()
+        return self._rows[vid]
+
+    def compact(self) -> None:
+        """Rebuild the columns and pool from the live rows only."""
+        if not self._dead:
+            return
+        live = VersionTable()
+        for row in self._rows.values():
+            live.append(self.row_dict(row))
+        self.__dict__.update(live.__dict__)
+
+    # -- Mapping: version id -> dict -------------------------------------
+
+    def __getitem__(self, vid: str) -> dict:
+        return self.row_dict(self._rows[vid])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, vid) -> bool:
+        return vid in self._rows
+
+    # -- rows ----------------------------------------------------------------
+
+    def value(self, row: int, name: str):
+        return self.pool.values[self.cols[name][row]]
+
+    def quantity(self, measure: int) -> Optional[Quantity]:
+        """Parsed quantity for a measure pool offset (memoized per table)."""
+        try:
+            return self._quantities[measure]
+        except KeyError:
+            q = self._quantities[measure] = parse_measure(self.pool.values[measure])
+            return q
+
+    def ingredient_ids(self, row: int) -> List[str]:
+        s = self.pool.values
+        return [s[i] for i in self.ing_id[self.ing_start[row]:self.ing_start[row + 1]]]
+
+    def row_dict(self, row: int) -> dict:
+        # same key order as RecipeVersion.to_dict
+        s, cols = self.pool.values, self.cols
+        lo, hi = self.ing_start[row], self.ing_start[row + 1]
+        return {
+            "id": s[cols["id"][row]],
+            "name": s[cols["name"][row]],
+            "name_slug": s[cols["name_slug"][row]],
+            "ingredients": [{"id": s[i], "name": s[n], "measure": s[m], "quantity": _as_dict(self.quantity(m))}
+                            for i, n, m in zip(self.ing_id[lo:hi], self.ing_name[lo:hi], self.ing_measure[lo:hi])],
+            "instructions": s[cols["instructions"][row]],
+            "glass": s[cols["glass"][row]],
+            "tags": [s[t] for t in self.tags[self.tag_start[row]:self.tag_start[row + 1]]],
+            "image": s[cols["image"][row]],
+            "garnish": s[cols["garnish"][row]],
+            "method": s[cols["method"][row]],
+            "attribution": ({name: s[cols[name][row]] for name, _ in ATTRIBUTION_FIELDS}
+                            if self.has_attribution[row] else None),
+        }
+
+    def version(self, row: int) -> RecipeVersion:
+        d = self.row_dict(row)
+        d["ingredients"] = [Ingredient(**i) for i in d["ingredients"]]
+        if d["attribution"]:
+            d["attribution"] = Attribution(**d["attribution"])
+        return RecipeVersion(**d)
+
+    def rows(self) -> Iterator["VersionRow"]:
+        for row in self._rows.values():
+            yield VersionRow(self, row)
+
+    def nbytes(self) -> int:
+        """Bytes held by the column arrays (the pool's strings not included)."""
+        arrays = list(self.cols.values()) + [self.ing_start, self.ing_id, self.ing_name, self.ing_measure,
+                                             self.tag_start, self.tags]
+        return sum(a.itemsize * len(a) for a in arrays) + len(self.has_attribution)
+
+class VersionRow:
+    """Read-only RecipeVersion view over one table row (what pipeline.dedupe reads)."""
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: VersionTable, row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def id(self) -> str:
+        return self.table.value(self.row, "id")
+
+    @property
+    def name(self) -> str:
+        return self.table.value(self.row, "name")
+
+    @property
+    def name_slug(self) -> Optional[str]:
+        return self.table.value(self.row, "name_slug")
+
+    @property
+    def instructions(self) -> Optional[str]:
+        return self.table.value(self.row, "instructions")
+
+    @property
+    def ingredients(self) -> List[Ingredient]:
+        t, s = self.table, self.table.pool.values
+        lo, hi = t.ing_start[self.row], t.ing_start[self.row + 1]
+        return [Ingredient(s[i], s[n], s[m], t.quantity(m)) for i, n, m in
+                zip(t.ing_id[lo:hi], t.ing_name[lo:hi], t.ing_measure[lo:hi])]
+
+    def to_dict(self) -> dict:
+        return self.table.row_dict(self.row)
@@ -0,0 +1,70 @@
+"""
+Benchmark for the IBA parse stage.
+
+    python -m benchmarks.iba_parse --pages 500 --workers 4
+
+Parses synthetic, IBA-shaped recipe pages (WordPress-sized boilerplate around
+the recipe sections) with each available tree builder, inline and across a
+process pool, and prints pages/sec for each configuration.
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scrapers.iba import parse_recipe, _parse_job, BASE
+
+INGREDIENTS = ["45 ml Gin", "20 ml fresh lemon juice", "A dash of Angostura bitters", "15 ml Sugar Syrup",
+               "Few drops of orange bitters", "2 bar spoons Maraschino", "Top with soda water", "1 egg white",
+               "60 ml Cognac", "10 ml Bénédictine", "30 ml Campari", "30 ml Sweet Red Vermouth"]
+
+def make_page(i: int, boilerplate: int = 150) -> str:
+    r = random.Random(i)
+    nav = "".join(f"<li class='menu-item'><a href='/menu/{j}/'>Menu item {j}</a></li>" for j in range(boilerplate))
+    footer = "".join(f"<div class='widget'><p>Footer text {j}</p><span>link {j}</span></div>" for j in range(boilerplate))
+    ings = "".join(f"<li>{x}</li>" for x in r.sample(INGREDIENTS, r.randint(3, 7)))
+    return (
+        f"<html><head><title>Cocktail {i}</title></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header><main>"
+        f"<h1>Cocktail {i}</h1><img class='attachment-medium_large' src='/wp-content/{i}.jpg'>"
+        f"<div class='elementor'><h4>Ingredients</h4><ul>{ings}</ul>"
+        f"<h4>Method</h4><p>Pour all ingredients into a mixing glass with ice.</p><p>Stir and strain.</p>"
+        f"<h4>Garnish</h4><p>Orange zest</p></div>"
+        f"<a rel='tag' href='/tag/unforgettables/'>Unforgettables</a></main>"
+        f"<footer>{footer}</footer></body></html>"
+    )
+
+def parsers():
+    out = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        out.append("lxml")
+    except ImportError:
+        pass
+    return out
+
+def run(pages, parser, workers):
+    jobs = [(f"{BASE}iba-cocktail/{i}/", html, BASE, parser) for i, html in enumerate(pages)]
+    t = time.perf_counter()
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            n = sum(1 for _ in pool.map(_parse_job, jobs, chunksize=8))
+    else:
+        n = sum(1 for _ in map(_parse_job, jobs))
+    return n / (time.perf_counter() - t)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=300)
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+
+    pages = [make_page(i) for i in range(args.pages)]
+    parse_recipe(BASE, pages[0])  # warm up the substitution rules
+    print(f"{'parser':<12} {'workers':>7} {'pages/s':>10}")
+    for parser in parsers():
+        for workers in (0, args.workers):
+            print(f"{parser:<12} {workers:>7} {run(pages, parser, workers):>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark for pipeline.query at pack scale.
+
+    python -m benchmarks.ingredient_query --cocktails 50000
+
+Builds postings for a synthetic corpus (Zipf-like ingredient popularity,
+3-8 ingredients per cocktail), then times has-all, has-any and
+makeable-with-N-missing queries and prints p50/p99 in microseconds.
+"""
+import argparse
+import random
+import time
+
+from pipeline.export_pack import encode_postings
+from pipeline.query import IngredientQuery
+
+def synthetic_postings(n_cocktails: int, n_ingredients: int, seed: int = 0) -> dict:
+    r = random.Random(seed)
+    ingredients = [f"ing_{i}" for i in range(n_ingredients)]
+    weights = [1.0 / (i + 1) for i in range(n_ingredients)]
+    postings = {}
+    for c in range(n_cocktails):
+        for iid in set(r.choices(ingredients, weights, k=r.randint(3, 8))):
+            postings.setdefault(iid, set()).add(c)
+    return encode_postings(postings, n_cocktails)
+
+def timed(fn, runs):
+    samples = []
+    for args in runs:
+        t = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - t) * 1e6)
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cocktails", type=int, default=50000)
+    ap.add_argument("--ingredients", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--bar", type=int, default=30, help="ingredients in the bar for makeable queries")
+    args = ap.parse_args()
+
+    postings = synthetic_postings(args.cocktails, args.ingredients)
+    t = time.perf_counter()
+    q = IngredientQuery(postings)
+    print(f"load: {(time.perf_counter() - t) * 1e3:.1f} ms for {args.cocktails} cocktails")
+
+    r = random.Random(1)
+    pool = list(q.bits)[:200]  # the popular end, where bitsets are densest
+    pick = lambda k: r.sample(pool, k)
+    cases = [
+        ("has_all(2)", q.has_all, [(pick(2),) for _ in range(args.queries)]),
+        ("has_any(3)", q.has_any, [(pick(3),) for _ in range(args.queries)]),
+    ]
+    for missing in (0, 1, 2):
+        cases.append((f"makeable(bar={args.bar}, missing={missing})", q.makeable,
+                      [(pick(args.bar), missing) for _ in range(args.queries)]))
+    print(f"{'query':<36} {'p50 us':>8} {'p99 us':>8}")
+    for name, fn, runs in cases:
+        p50, p99 = timed(fn, runs)
+        print(f"{name:<36} {p50:>8.1f} {p99:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Memory footprint of an in-memory RecipeVersion corpus, and to_dict speed.
+
+    python -m benchmarks.memory --versions 200000
+
+Builds a synthetic corpus (benchmarks.synthetic: realistic repetition of
+glasses, sources, ingredients and fetch timestamps) and reports the traced
+allocation size of the same versions held as JSON-loaded dicts, as
+RecipeVersion objects and as a VersionTable, then times dataclasses.asdict
+against to_dict.
+"""
+import argparse
+import dataclasses
+import gc
+import time
+import tracemalloc
+
+from app.models import Attribution, Ingredient, RecipeVersion
+from app.table import VersionTable
+from benchmarks.synthetic import versions
+from pipeline.io import dumpb, loads
+
+def synthetic_lines(n: int):
+    """Encoded JSONL lines, so every record decodes into fresh objects like iter_jsonl does."""
+    return [dumpb(v) for v in versions(n)]
+
+def to_version(d: dict) -> RecipeVersion:
+    d["ingredients"] = [Ingredient(**i) for i in d["ingredients"]]
+    d["attribution"] = Attribution(**d["attribution"])
+    return RecipeVersion(**d)
+
+def traced(build):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--versions", type=int, default=200_000)
+    args = ap.parse_args()
+
+    lines = synthetic_lines(args.versions)
+    dicts, dict_bytes = traced(lambda: [loads(l) for l in lines])
+    del dicts
+    table, table_bytes = traced(lambda: VersionTable.from_dicts(loads(l) for l in lines))
+    objects, object_bytes = traced(lambda: [to_version(loads(l)) for l in lines])
+
+    print(f"{args.versions:,} versions")
+    for label, size in (("dicts", dict_bytes), ("RecipeVersion", object_bytes), ("VersionTable", table_bytes)):
+        print(f"  {label:<14} {size / 2**20:8.1f} MiB  {size / args.versions:7.0f} B/version  "
+              f"{dict_bytes / size:5.1f}x smaller than dicts")
+
+    t = time.perf_counter()
+    for v in objects:
+        dataclasses.asdict(v)
+    t_asdict = time.perf_counter() - t
+    t = time.perf_counter()
+    for v in objects:
+        v.to_dict()
+    t_to_dict = time.perf_counter() - t
+    t = time.perf_counter()
+    for i in range(len(table)):
+        table.row_dict(i)
+    t_row = time.perf_counter() - t
+    print(f"  asdict {t_asdict:.2f} s, to_dict {t_to_dict:.2f} s ({t_asdict / t_to_dict:.1f}x), "
+          f"VersionTable.row_dict {t_row:.2f} s")
+
+if __name__ == "__main__":
+    main()
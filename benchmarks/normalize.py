@@ -0,0 +1,60 @@
+"""
+Benchmark for the ingredient normalization stage.
+
+    python -m benchmarks.normalize --lines 1000000
+
+Normalizes synthetic raw ingredient names (alias hits, token variants and
+unknown names) and prints lines/minute:
+
+    uncached  the resolution itself (_resolve, no memo) on distinct names
+    cold      canonical_id on names with realistic repetition, empty memo
+    warm      the same names again (all memo hits)
+
+cold and warm mostly measure the memo; uncached is the normalization cost.
+"""
+import argparse
+import random
+import time
+
+from pipeline.normalize import IngredientNormalizer
+
+VARIANTS = ["Fresh Lime Juice", "juice of 1 lime", "Lime juice", "Sugar Syrup", "Gomme syrup",
+            "Angostura Bitters", "Sweet Red Vermouth", "Freshly squeezed orange juice", "Club Soda",
+            "White of 1 Egg", "London Dry Gin", "Light rum", "Bourbon Whiskey", "Mint leaves"]
+
+def synthetic_lines(n: int, distinct: int = 20000, seed: int = 0):
+    r = random.Random(seed)
+    pool = VARIANTS + [f"House Liqueur No {i} Reserve" for i in range(distinct)]
+    weights = [1.0 / (i + 1) ** 0.8 for i in range(len(pool))]
+    return r.choices(pool, weights, k=n)
+
+def distinct_lines(n: int, seed: int = 0):
+    """n different raw names (the numbers are dropped again as quantities)."""
+    r = random.Random(seed)
+    pool = VARIANTS + [f"House Liqueur No {i} Reserve" for i in range(1000)]
+    return [f"{r.choice(pool)} {i}" for i in range(n)]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    norm = IngredientNormalizer()
+    unique = distinct_lines(args.lines)
+    t = time.perf_counter()
+    for raw in unique:
+        norm._resolve(raw)
+    dt = time.perf_counter() - t
+    print(f"uncached: {args.lines / dt * 60:,.0f} lines/min ({dt:.2f} s)")
+    del unique
+
+    lines = synthetic_lines(args.lines)
+    for label in ("cold", "warm"):
+        t = time.perf_counter()
+        norm.normalize_many(lines)
+        dt = time.perf_counter() - t
+        print(f"{label}: {args.lines / dt * 60:,.0f} lines/min ({dt:.2f} s)")
+    print(norm.canonical_id.cache_info())
+
+if __name__ == "__main__":
+    main()
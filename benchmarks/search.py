@@ -0,0 +1,70 @@
+"""
+Benchmark for pipeline.search at pack scale.
+
+    python -m benchmarks.search --cocktails 100000
+
+Builds the search index over synthetic cocktails, then times type-ahead
+prefixes, exact single terms and multi-word queries and prints p50/p99 in
+microseconds. Like real recipes, each field draws from its own Zipf-like
+vocabulary: many rare name words, ~2k ingredient words, a few hundred
+instruction words (so "shake"-like terms sit in most documents). Queries are
+cold (no token or postings cache) unless --warm.
+"""
+import argparse
+import random
+import time
+from itertools import accumulate
+
+from benchmarks.ingredient_query import timed
+from pipeline.search import SearchIndex, build_search_index
+
+SYLLABLES = ["ma", "ri", "ta", "ne", "gro", "ni", "da", "qui", "ri", "mo", "ji", "to", "sa", "zer", "ac",
+             "bram", "ble", "col", "lins", "fizz", "sour", "pal", "oma", "ve", "spe", "sid", "car"]
+
+def _vocabulary(r: random.Random, size: int, skew: float):
+    words = sorted({"".join(r.choices(SYLLABLES, k=r.randint(2, 4))) for _ in range(size)})
+    cum = list(accumulate(1.0 / (i + 1) ** skew for i in range(len(words))))
+    r.shuffle(words)
+    return words, lambda k: r.choices(words, cum_weights=cum, k=k)
+
+def synthetic_cocktails(n: int, seed: int = 0):
+    """(cocktails, name vocabulary)"""
+    r = random.Random(seed)
+    names, name = _vocabulary(r, 30000, 0.6)
+    _, ingredient = _vocabulary(r, 2000, 1.0)
+    _, instruction = _vocabulary(r, 300, 1.0)
+    return [{"id": f"c{i}", "name": " ".join(name(r.randint(1, 3))).title(),
+             "ingredients": [{"name": " ".join(ingredient(r.randint(1, 2)))} for _ in range(r.randint(3, 8))],
+             "instructions": " ".join(instruction(r.randint(8, 30)))} for i in range(n)], names
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cocktails", type=int, default=100000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--warm", action="store_true", help="keep the token and postings caches between queries")
+    args = ap.parse_args()
+
+    cocktails, words = synthetic_cocktails(args.cocktails)
+    t = time.perf_counter()
+    index = build_search_index(cocktails)
+    print(f"build: {(time.perf_counter() - t):.2f} s, {index['terms']:,} terms over {args.cocktails:,} cocktails")
+    s = SearchIndex.from_index(index, [c["id"] for c in cocktails])
+    if not args.warm:
+        s.cache_size = s.cache_postings = 0
+
+    r = random.Random(1)
+    names = [c["name"] for c in r.sample(cocktails, args.queries)]
+    cases = [
+        ("prefix(3 chars)", [(w[:3],) for w in r.sample(words, args.queries)]),
+        ("prefix(5 chars)", [(w[:5],) for w in r.sample(words, args.queries)]),
+        ("term", [(w,) for w in r.sample(words, args.queries)]),
+        ("name (all words)", [(n,) for n in names]),
+        ("name, last word cut", [(n[:max(3, len(n) - 3)],) for n in names]),
+    ]
+    print(f"{'query':<24} {'p50 us':>8} {'p99 us':>8}")
+    for name, runs in cases:
+        p50, p99 = timed(s.search, runs)
+        print(f"{name:<24} {p50:>8.1f} {p99:>8.1f}")
+
+if __name__ == "__main__":
+    main()
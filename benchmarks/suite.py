@@ -0,0 +1,208 @@
+"""
+End-to-end benchmark suite over the synthetic corpus (fully offline).
+
+    python -m benchmarks.suite --scale 10k --out bench.json
+    python -m benchmarks.suite --scale 10k --baseline bench.json --threshold 0.1
+
+Runs each stage in its own fresh process (so peak RSS is per stage) and
+records items, throughput, p50/p99 latency and peak RSS:
+
+    rules             replace_text_by_rule, per ingredient line
+    iba_parse         scrapers.iba.parse_recipe, per page (capped by --parse-limit; needs bs4)
+    cocktaildb_parse  CocktailDbScraper._parse_recipe, per lookup payload (same cap)
+    normalize         IngredientNormalizer._resolve (canonical_id without its memo), per line
+    measures          utils.measure.quantity_dict over every ingredient measure, per run
+    merge             merge_to_canonical over a VersionTable, per run
+    pack              build_pack + write_pack, per run
+    serialize         write_jsonl of the version dicts, per run
+
+Stages whose optional dependencies (bs4, requests) are not installed are
+skipped. With --baseline, a stage whose throughput dropped or whose p99 grew by more
+than --threshold counts as a regression and the exit status is 1.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks import synthetic
+
+STAGES: Dict[str, Callable] = {}
+REQUIRES: Dict[str, Tuple[str, ...]] = {}  # stage -> optional modules it needs
+
+def stage(name: str, requires: Tuple[str, ...] = ()):
+    def deco(fn):
+        STAGES[name] = fn
+        REQUIRES[name] = requires
+        return fn
+    return deco
+
+def missing(name: str) -> List[str]:
+    return [m for m in REQUIRES[name] if find_spec(m) is None]
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * q))]
+
+def per_item(fn: Callable, items) -> List[float]:
+    samples = []
+    for it in items:
+        t = time.perf_counter()
+        fn(it)
+        samples.append(time.perf_counter() - t)
+    return samples
+
+def per_run(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return samples
+
+# Each stage builds its input first, then returns (items per pass, passes, latency samples)
+
+@stage("rules")
+def bench_rules(n: int, args) -> Tuple[int, int, List[float]]:
+    from utils.text import get_rule_engine, replace_text_by_rule
+    lines = synthetic.ingredient_lines(n)
+    get_rule_engine()
+    return n, 1, per_item(replace_text_by_rule, lines)
+
+@stage("iba_parse", requires=("bs4", "requests"))
+def bench_iba_parse(n: int, args) -> Tuple[int, int, List[float]]:
+    from scrapers.iba import parse_recipe
+    pages = list(synthetic.iba_pages(min(n, args.parse_limit)))
+    parse_recipe(pages[0]["url"], pages[0]["html"])  # warm up the substitution rules
+    return len(pages), 1, per_item(lambda p: parse_recipe(p["url"], p["html"]), pages)
+
+@stage("cocktaildb_parse", requires=("requests",))
+def bench_cocktaildb_parse(n: int, args) -> Tuple[int, int, List[float]]:
+    from scrapers.cocktaildb import CocktailDbScraper
+    scraper = CocktailDbScraper(delay=0)
+    payloads = list(synthetic.cocktaildb_payloads(min(n, args.parse_limit)))
+    return len(payloads), 1, per_item(lambda p: scraper._parse_recipe(json.loads(p)["drinks"][0]), payloads)
+
+@stage("normalize")
+def bench_normalize(n: int, args) -> Tuple[int, int, List[float]]:
+    from pipeline.normalize import IngredientNormalizer
+    lines = synthetic.ingredient_lines(n)
+    norm = IngredientNormalizer()
+    return n, 1, per_item(norm._resolve, lines)  # uncached: the memo would turn repeats into dict hits
+
+@stage("measures")
+def bench_measures(n: int, args) -> Tuple[int, int, List[float]]:
+    from utils import measure
+    column = [ing.get("measure") for v in synthetic.versions(n) for ing in v["ingredients"]]
+
+    def run():
+        measure._parse.cache_clear()  # cold: every distinct measure is parsed again
+        for m in column:
+            measure.quantity_dict(m)
+    return len(column), args.repeat, per_run(run, args.repeat)
+
+@stage("merge")
+def bench_merge(n: int, args) -> Tuple[int, int, List[float]]:
+    from app.table import VersionTable
+    from pipeline.dedupe import merge_to_canonical
+    table = VersionTable.from_dicts(synthetic.versions(n))
+    return n, args.repeat, per_run(lambda: merge_to_canonical(table.rows()), args.repeat)
+
+@stage("pack")
+def bench_pack(n: int, args) -> Tuple[int, int, List[float]]:
+    from app.table import VersionTable
+    from pipeline.dedupe import merge_to_canonical
+    from pipeline.export_pack import build_pack, write_pack
+    from pipeline.io import write_json, write_jsonl
+    with tempfile.TemporaryDirectory(prefix="bench-pack-") as tmp:
+        source, canonical_path = Path(tmp) / "synthetic.jsonl", Path(tmp) / "canonical.json"
+        write_jsonl(source, synthetic.versions(n))
+        canonical = [c.to_dict() for c in merge_to_canonical(VersionTable.from_dicts(synthetic.versions(n)).rows())]
+        write_json(canonical_path, canonical)
+        run = lambda: write_pack(build_pack(str(canonical_path), [str(source)]), str(Path(tmp) / "build"))
+        return len(canonical), args.repeat, per_run(run, args.repeat)
+
+@stage("serialize")
+def bench_serialize(n: int, args) -> Tuple[int, int, List[float]]:
+    from pipeline.io import write_jsonl
+    dicts = list(synthetic.versions(n))
+    with tempfile.TemporaryDirectory(prefix="bench-io-") as tmp:
+        path = Path(tmp) / "out.jsonl"
+        return n, args.repeat, per_run(lambda: write_jsonl(path, dicts), args.repeat)
+
+def run_stage(name: str, n: int, args) -> dict:
+    items, passes, samples = STAGES[name](n, args)
+    total = sum(samples)
+    samples.sort()
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+    return {
+        "items": items,
+        "passes": passes,
+        "seconds": round(total, 4),
+        "throughput": round(items * passes / total, 1),
+        "p50_ms": round(percentile(samples, 0.50) * 1e3, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1e3, 4),
+        "peak_rss_mb": round(rss, 1),
+    }
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Human-readable regressions of `current` against `baseline`."""
+    problems = []
+    if current["meta"]["n"] != baseline["meta"]["n"]:
+        print(f"warning: baseline scale {baseline['meta']['n']:,} != {current['meta']['n']:,}", file=sys.stderr)
+    for name, cur in current["stages"].items():
+        base = baseline["stages"].get(name)
+        if not base:
+            continue
+        if cur["throughput"] < base["throughput"] * (1 - threshold):
+            problems.append(f"{name}: throughput {cur['throughput']:,.1f}/s vs {base['throughput']:,.1f}/s")
+        if cur["p99_ms"] > base["p99_ms"] * (1 + threshold):
+            problems.append(f"{name}: p99 {cur['p99_ms']:.3f} ms vs {base['p99_ms']:.3f} ms")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", default="10k", help="1k, 10k, 100k, 1m or a number of records")
+    ap.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    ap.add_argument("--parse-limit", type=int, default=2000, help="max pages/payloads for the parse stages")
+    ap.add_argument("--repeat", type=int, default=3, help="runs of the whole-corpus stages")
+    ap.add_argument("--out", help="write the results JSON here")
+    ap.add_argument("--baseline", help="results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown before failing")
+    args = ap.parse_args()
+
+    n = synthetic.parse_scale(args.scale)
+    results = {"meta": {"n": n, "scale": args.scale, "python": platform.python_version(),
+                        "platform": platform.platform(), "date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+               "stages": {}}
+    print(f"{'stage':<18} {'items':>9} {'items/s':>12} {'p50 ms':>10} {'p99 ms':>10} {'peak MB':>9}")
+    ctx = multiprocessing.get_context("spawn")
+    for name in args.stages:
+        if missing(name):
+            print(f"{name:<18} skipped: {', '.join(missing(name))} not installed")
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            r = results["stages"][name] = pool.submit(run_stage, name, n, args).result()
+        print(f"{name:<18} {r['items']:>9,} {r['throughput']:>12,.1f} {r['p50_ms']:>10.3f} "
+              f"{r['p99_ms']:>10.3f} {r['peak_rss_mb']:>9.1f}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        problems = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
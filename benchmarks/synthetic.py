@@ -0,0 +1,137 @@
+"""
+Deterministic synthetic corpora for the benchmarks (no network needed).
+
+    python -m benchmarks.synthetic --scale 10k --outdir data/bench
+
+Writes, for the given scale (1k, 10k, 100k, 1m or a plain number):
+
+- iba_pages.jsonl.gz        {"url", "html"} IBA-shaped recipe pages
+- cocktaildb_lookups.jsonl.gz  lookup.php payloads, one per line
+- sources/synthetic.jsonl   RecipeVersion records, IBA and CocktailDB
+                            flavoured, with shared and near-duplicate names
+
+Every generator is seeded per item, so item i is the same at any scale.
+"""
+import argparse
+import json
+import random
+import sys
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Iterator
+
+from benchmarks.normalize import synthetic_lines
+from pipeline.io import JsonlWriter
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+GLASSES = ["Cocktail glass", "Old fashioned glass", "Highball glass", "Collins glass", "Coupe",
+           "Champagne flute", "Copper mug", "Hurricane glass", "Shot glass", "Wine glass"]
+SOURCES = [("IBA", "CC BY-NC-SA 4.0"), ("TheCocktailDB", "Free API")]
+MEASURES = ["1 oz", "1.5 oz", "2 oz", "0.75 oz", "30 ml", "45 ml", "2 dashes", "1 tsp", "Top up", None]
+TAGS = ["Unforgettables", "Contemporary Classics", "New Era Drinks", "Alcoholic", "IBA", "Sour", "Tiki"]
+INGREDIENTS = ["Gin", "Light rum", "Bourbon Whiskey", "Fresh Lime Juice", "Sugar Syrup", "Angostura Bitters",
+               "Sweet Red Vermouth", "Campari", "Triple Sec", "Club Soda", "Egg White", "Mint leaves"]
+RUNS = [f"2025-{m:02d}-01T00:00:00Z" for m in range(1, 13)]
+
+def parse_scale(value: str) -> int:
+    return SCALES.get(value.lower()) or int(value)
+
+def ingredient_name(r: random.Random) -> str:
+    # the well-known names most of the time, a long tail of house products otherwise
+    if r.random() < 0.7:
+        return r.choice(INGREDIENTS)
+    return f"Ingredient {int(r.paretovariate(1.2)) % 800}"
+
+def iba_pages(n: int, boilerplate: int = 150) -> Iterator[dict]:
+    # imported here: scrapers.iba needs bs4, which only the parse stages use
+    from benchmarks.iba_parse import make_page
+    from scrapers.iba import BASE
+    for i in range(n):
+        yield {"url": f"{BASE}iba-cocktail/cocktail-{i}/", "html": make_page(i, boilerplate)}
+
+def cocktaildb_drink(i: int) -> dict:
+    r = random.Random(f"cocktaildb-{i}")
+    drink = {"idDrink": str(11000 + i), "strDrink": f"Cocktail {i // 2}", "strCategory": "Cocktail",
+             "strInstructions": "Shake with ice and strain into a chilled glass.",
+             "strGlass": r.choice(GLASSES), "strDrinkThumb": f"https://img.example.com/{i}.jpg"}
+    for slot in range(1, 16):
+        take = slot <= r.randint(3, 7)
+        drink[f"strIngredient{slot}"] = ingredient_name(r) if take else None
+        drink[f"strMeasure{slot}"] = r.choice(MEASURES) if take else None
+    return drink
+
+def cocktaildb_payloads(n: int) -> Iterator[str]:
+    for i in range(n):
+        yield json.dumps({"drinks": [cocktaildb_drink(i)]})
+
+def version(i: int) -> dict:
+    """RecipeVersion dict number i; versions 2k and 2k+1 share a name across the two sources."""
+    r = random.Random(f"version-{i}")
+    source, license = SOURCES[i % 2]
+    name = f"Cocktail {i // 2}"
+    if i % 2 and r.random() < 0.1:
+        name = f"The {name} Cocktail"  # a near-duplicate for the fuzzy matcher
+    picked = []
+    for _ in range(r.randint(3, 7)):
+        x = ingredient_name(r)
+        if x not in picked:
+            picked.append(x)
+    prefix = "iba::" if source == "IBA" else "cocktaildb:"
+    slug = name.lower().replace(" ", "_")
+    return {
+        "id": f"{prefix}{slug}" if source == "IBA" else f"{prefix}{slug}_{i}",
+        "name": name,
+        "name_slug": slug,
+        "ingredients": [{"id": x.lower().replace(" ", "_"), "name": x, "measure": r.choice(MEASURES)}
+                        for x in picked],
+        "instructions": f"Shake {picked[0]} and {picked[-1]} with ice, strain into glass #{i}.",
+        "glass": r.choice(GLASSES),
+        "tags": r.sample(TAGS, r.randint(0, 3)),
+        "image": f"https://img.example.com/{i}.jpg",
+        "garnish": r.choice([None, "Lime wheel", "Orange twist", "Cherry"]),
+        "method": r.choice(["Shake", "Stir", "Build"]),
+        "attribution": {"source_name": source, "source_url": f"https://example.com/{source}/{i}",
+                        "author": None, "license": license, "fetched_at": r.choice(RUNS)},
+    }
+
+def versions(n: int) -> Iterator[dict]:
+    for i in range(n):
+        yield version(i)
+
+def ingredient_lines(n: int):
+    return synthetic_lines(n)
+
+def write_corpus(outdir: str, n: int, pages: int = 0) -> dict:
+    """Write the corpus files; `pages` caps the (large) HTML part, 0 = n pages."""
+    out = Path(outdir)
+    (out / "sources").mkdir(parents=True, exist_ok=True)
+    counts = {}
+    if find_spec("bs4") is not None:
+        with JsonlWriter(out / "iba_pages.jsonl.gz") as w:
+            for page in iba_pages(pages or n):
+                w.write(page)
+        counts["iba_pages"] = w.count
+    else:
+        print("bs4 is not installed: skipping the IBA pages", file=sys.stderr)
+    with JsonlWriter(out / "cocktaildb_lookups.jsonl.gz") as w:
+        for payload in cocktaildb_payloads(n):
+            w.write_raw(payload.encode("utf-8"))
+    counts["cocktaildb_lookups"] = w.count
+    with JsonlWriter(out / "sources" / "synthetic.jsonl") as w:
+        for v in versions(n):
+            w.write(v)
+    counts["versions"] = w.count
+    return counts
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", default="10k", help="1k, 10k, 100k, 1m or a number of records")
+    ap.add_argument("--pages", type=int, default=0, help="cap on IBA pages (default: same as --scale)")
+    ap.add_argument("--outdir", default="data/bench")
+    args = ap.parse_args()
+    counts = write_corpus(args.outdir, parse_scale(args.scale), args.pages)
+    print(", ".join(f"{k}: {v:,}" for k, v in counts.items()), f"-> {args.outdir}")
+
+if __name__ == "__main__":
+    main()
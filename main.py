@@ -1,115 +1,459 @@
-
 import argparse
-import json
 import glob
 import sys
 from pathlib import Path
-from typing import List
-from app.models import RecipeVersion
-from scrapers.base import get_scraper  # registry wired by imports below
-from pipeline.dedupe import merge_to_canonical
-from pipeline.export_pack import build_pack, write_pack
-
-import scrapers.iba # noqa: F401
-import scrapers.cocktaildb #noqa: F401
-
-def write_jsonl(path: Path, objs):
-    with path.open("w", encoding="utf-8") as f:
-        for o in objs:
-            f.write(json.dumps(o.to_dict(), ensure_ascii=False) + "\n")
-
-def _load_versions(paths: List[str]) -> List[RecipeVersion]:
-    versions = []
-    for p in paths:
-        with Path(p).open("r", encoding="utf-8") as f:
-            for line in f:
-                d = json.loads(line)
-                versions.append(_dict_to_version(d))
-    return versions
-
-def _dict_to_version(d) -> RecipeVersion:
-    from app.models import Ingredient, Attribution, RecipeVersion
-    ingredients = [Ingredient(**ing) for ing in d.get("ingredients", [])]
-    attribution = Attribution(**d["attribution"]) if d.get("attribution") else None
-    return RecipeVersion(
-        id=d["id"],
-        name=d["name"],
-        name_slug=d.get("name_slug") or d["id"].split("::")[-1],
-        ingredients=ingredients,
-        instructions=d.get("instructions") or "",
-        glass=d.get("glass"),
-        tags=d.get("tags", []),
-        image=d.get("image"),
-        garnish=d.get("garnish"),
-        method=d.get("method"),
-        attribution=attribution
-    )
+from typing import Dict, Iterable, List, Optional
+from app.table import VersionTable
+from scrapers.base import available_sources, get_scraper  # sources are imported on first use (scrapers.base.SOURCES)
+from scrapers.cache import HttpCache, DEFAULT_CACHE_PATH
+from pipeline.checkpoint import SIDECAR_SUFFIXES, ScrapeCheckpoint
+from pipeline.dedupe import MatchConfig, merge_to_canonical
+from pipeline.binpack import PACK_FILE, write_pack_binary
+from pipeline.export_pack import build_pack, write_pack, write_pack_v2, read_pack_versions
+from pipeline.incremental import (ScrapeState, CanonicalIndex, write_incremental, write_delta,
+                                  write_canonical_state, read_delta, apply_delta_to_versions)
+from pipeline.io import JsonlWriter, iter_jsonl, iter_jsonl_many, write_json
+from pipeline.normalize import get_normalizer
+from pipeline.orchestrate import QUEUE_SIZE, ScrapeRun
+from pipeline.packdiff import KEEP_DELTAS, load_build, publish
+from pipeline.store import open_store, import_jsonl
+from pipeline.validate import Validator, validate_files
+from utils import metrics
+
+def _load_table(dicts: Iterable[dict]) -> VersionTable:
+    """Stream version dicts into a columnar VersionTable, normalizing ingredient ids."""
+    normalizer = get_normalizer()
+    table = VersionTable()
+    for d in dicts:
+        d["name_slug"] = d.get("name_slug") or d["id"].split("::")[-1]
+        d["instructions"] = d.get("instructions") or ""
+        table.append(normalizer.normalize_version_dict(d))
+    return table
+
+def _expand(patterns: List[str]) -> List[str]:
+    """Files matching the glob patterns, minus checkpoint sidecars and unfinished .tmp files."""
+    skip = (".tmp", ".tmp.gz", ".tmp.zst") + SIDECAR_SUFFIXES
+    return [p for pattern in patterns for p in glob.glob(pattern) if not p.endswith(skip)]
+
+def _scraper_kwargs(args, delay=None, rate=None) -> dict:
+    """Scraper options shared by `scrape` and `run` (delay/rate None: the source's own default)."""
+    kwargs = {} if delay is None else {"delay": delay}
+    kwargs.update({k: getattr(args, k) for k in ("retries", "backoff") if getattr(args, k) is not None})
+    if args.concurrency > 1:
+        kwargs.update(concurrency=args.concurrency, rate=rate)
+    if args.parse_workers:
+        kwargs["parse_workers"] = args.parse_workers
+    if args.offline and args.no_cache:
+        raise SystemExit("--offline needs the cache; drop --no-cache")
+    if not args.no_cache:
+        kwargs["cache"] = HttpCache(
+            args.cache,
+            ttl=args.cache_ttl,
+            max_bytes=int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None,
+            offline=args.offline,
+        )
+    return kwargs
+
+def _write_pack(pack: dict, outdir: str, fmt: str, bundle: bool = False, shard_size: int = 0,
+                previous: Optional[dict] = None, keep_deltas: int = KEEP_DELTAS) -> None:
+    """Write the pack, then stamp its manifest with build hashes (and a delta from `previous`)."""
+    _write_pack_files(pack, outdir, fmt, bundle, shard_size)
+    manifest = publish(pack, outdir, previous, keep=keep_deltas)
+    if previous is not None:
+        if previous["_hashes"] is None:
+            print("No delta: the --since build predates record hashes", file=sys.stderr)
+        elif previous["build"] == manifest["build"]:
+            print(f"No delta: unchanged since build {previous['build']}")
+        else:
+            d = manifest["deltas"][-1]
+            counts = ", ".join(f"{kind} +{c['upsert']} -{c['delete']}" for kind, c in d["counts"].items())
+            print(f"Delta {d['from']} -> {d['to']} ({counts}, {d['bytes']} bytes) -> {Path(outdir) / d['path']}")
+
+def _write_pack_files(pack: dict, outdir: str, fmt: str, bundle: bool, shard_size: int) -> None:
+    if fmt == "binary":
+        with metrics.timer("serialize"):
+            write_pack_binary(pack, outdir)
+        print(f"Packed (binary) -> {Path(outdir) / PACK_FILE}")
+    elif fmt == "v2":
+        write_pack_v2(pack, outdir, shard_size=shard_size)
+        print(f"Packed (v2) -> {outdir}")
+    else:
+        write_pack(pack, outdir, split=not bundle)
+        print(f"Packed -> {outdir}")
 
 def cmd_scrape(args):
     outdir = Path("data/sources")
     outdir.mkdir(parents=True, exist_ok=True) 
-    scraper = get_scraper(args.source, delay=args.delay)
-    versions = list(scraper.iter_recipes())
-    path = outdir / f"{args.source}.jsonl"
-    write_jsonl(path, versions)
-    print(f"Wrote {len(versions)} recipe versions -> {path}")
+    if args.resume and args.incremental:
+        raise SystemExit("--resume does not combine with --incremental")
+    scraper = get_scraper(args.source, **_scraper_kwargs(args, args.delay, args.rate))
+    store = open_store(args.store) if args.store else None
+    path = outdir / f"{args.source}.jsonl{args.compress}"
+    normalizer = get_normalizer()
+    if args.incremental:
+        state = ScrapeState(outdir / f"{args.source}.state.json")
+        scraper.tracker = state
+        parsed = {v.id: normalizer.normalize_version(v) for v in scraper.iter_recipes()}
+        diff = state.diff()
+        delta_path = outdir / f"{args.source}.delta.jsonl{args.compress}"
+        if store:
+            store.write_versions((parsed[vid] for vid in diff["added"] + diff["changed"]), args.source)
+            store.remove_versions(diff["removed"])
+            write_delta(delta_path, parsed, diff)
+        else:
+            write_incremental(path, delta_path, parsed, diff)
+        state.save()
+        print(f"Parsed {len(parsed)} recipe versions from changed pages: +{len(diff['added'])} ~{len(diff['changed'])} "
+              f"-{len(diff['removed'])} -> {delta_path}")
+        if state.failed:
+            print(f"{len(state.failed)} pages failed; their versions from the last run were kept", file=sys.stderr)
+        return
+    # stream into <source>.jsonl.part with fsync'd checkpoints (pipeline.checkpoint)
+    checkpoint = ScrapeCheckpoint(path, resume=args.resume, every=args.checkpoint_every,
+                                  max_attempts=args.max_attempts)
+    if checkpoint.resumed:
+        print(f"Resuming: {len(checkpoint.done)} URLs and {checkpoint.count} recipe versions already done",
+              file=sys.stderr)
+    scraper.checkpoint = checkpoint
+    try:
+        for v in scraper.iter_recipes():
+            checkpoint.write(normalizer.normalize_version(v))
+    except BaseException:
+        checkpoint.close()
+        print(f"Interrupted; continue with --resume ({checkpoint.journal_path})", file=sys.stderr)
+        raise
+    if store:
+        checkpoint.checkpoint()
+        count = store.write_versions(iter_jsonl(checkpoint.part_path), args.source, replace=True)
+        checkpoint.finish(consumed=True)
+        print(f"Wrote {count} recipe versions -> {store.path}")
+    else:
+        checkpoint.finish()
+        print(f"Wrote {checkpoint.count} recipe versions -> {path}")
+    failed = checkpoint.unresolved()
+    if failed:
+        retry = checkpoint.retryable()
+        print(f"{len(failed)} URLs failed, see {checkpoint.failures_path}"
+              + (f"; --resume retries {len(retry)} of them" if retry else ""), file=sys.stderr)
+
+def _match_config(args) -> MatchConfig:
+    return MatchConfig(enabled=not args.exact, name_threshold=args.match_name, score_threshold=args.match_score,
+                       near_duplicates=args.near_dups, dup_jaccard=args.dup_jaccard, dup_hamming=args.dup_hamming)
+
+def _write_merge_report(path: str, config: MatchConfig, merged: List[dict], pairs: List[dict]) -> None:
+    write_json(path, {"config": {"name_threshold": config.name_threshold,
+                                 "score_threshold": config.score_threshold,
+                                 "near_duplicates": config.near_duplicates,
+                                 "dup_jaccard": config.dup_jaccard,
+                                 "dup_hamming": config.dup_hamming},
+                      "merges": merged, "pairs": pairs}, indent=2)
+
+def _near_dup_summary(canon: List[dict], config: MatchConfig) -> str:
+    n = sum(len(ids) for c in canon for ids in (c.get("duplicates") or {}).values())
+    if not n:
+        return ""
+    return f", {n} near-duplicate versions {'collapsed' if config.near_duplicates == 'collapse' else 'flagged'}"
+
+def _per_source(values: Optional[List[str]], flag: str) -> Dict[str, float]:
+    """NAME=VALUE options of `run` ('*' for a bare VALUE, i.e. every source)."""
+    out = {}
+    for v in values or ():
+        name, sep, x = v.rpartition("=")
+        try:
+            out[name if sep else "*"] = float(x)
+        except ValueError:
+            raise SystemExit(f"{flag}: expected NAME=NUMBER or NUMBER, got {v!r}")
+    return out
+
+def cmd_run(args):
+    names = args.sources or available_sources()
+    delays, rates = _per_source(args.delay, "--delay"), _per_source(args.rate, "--rate")
+    shared = _scraper_kwargs(args)  # one HttpCache for every source
+    scrapers = {}
+    for name in names:
+        kwargs = dict(shared)
+        if name != "iba":
+            kwargs.pop("parse_workers", None)  # only the IBA scraper parses on a process pool
+        delay = delays.get(name, delays.get("*"))
+        if delay is not None:
+            kwargs["delay"] = delay
+        rate = rates.get(name, rates.get("*"))
+        if rate is not None and args.concurrency > 1:
+            kwargs["rate"] = rate
+        scrapers[name] = get_scraper(name, **kwargs)
+
+    outdir = Path("data/sources")
+    outdir.mkdir(parents=True, exist_ok=True)
+    run = ScrapeRun(scrapers, outdir, resume=args.resume, compress=args.compress, queue_size=args.queue_size,
+                    checkpoint_every=args.checkpoint_every, max_attempts=args.max_attempts)
+    try:
+        table = _load_table(run.versions())  # fills while the sources are still scraping
+    except KeyboardInterrupt:
+        print("Interrupted; continue with `run --resume`", file=sys.stderr)
+        raise
+    for name, r in run.results.items():
+        unresolved = f", {len(r['unresolved'])} URLs failed" if r["unresolved"] else ""
+        print(f"{name}: {r['versions']} recipe versions in {r['seconds']:.1f}s{unresolved} -> {run.path(name)}")
+    failed = run.failed()
+    if failed:
+        for name, e in failed.items():
+            print(f"{name} failed: {type(e).__name__}: {e}", file=sys.stderr)
+        raise SystemExit("Not merging a partial scrape; fix the failure and rerun with --resume")
+
+    config = _match_config(args)
+    pairs = []
+    canon = [c.to_dict() for c in merge_to_canonical(table.rows(), config, report=pairs)]
+    out = Path(args.canonical)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    write_json(out, canon, indent=2, atomic=True)
+    write_canonical_state(out, canon)
+    if args.report:
+        merged = [{"id": c["id"], "name": c["name"], "aka": c["aka"]} for c in canon if c["aka"]]
+        _write_merge_report(args.report, config, merged, pairs)
+    print(f"Wrote {len(canon)} canonical cocktails{_near_dup_summary(canon, config)} -> {out}")
+
+    pack = build_pack(str(out), [str(run.path(n)) for n in names], versions=table, canonical=canon)
+    _write_pack(pack, args.outdir, args.format, shard_size=args.shard_size)
 
 def cmd_merge(args):
-    inputs = []
-    for pattern in args.inputs:
-        inputs.extend(glob.glob(pattern))
-    if not inputs:
+    out = Path("data/canonical.json")
+    config = _match_config(args)
+    store = open_store(args.store) if args.store else None
+    if not args.inputs and not store:
+        raise SystemExit("merge needs --inputs (or --store)")
+    inputs = _expand(args.inputs or [])
+    if args.incremental:
+        # --inputs are *.delta.jsonl files from `scrape --incremental`
+        if store:
+            index = CanonicalIndex(store.canonical(), store.auto_primary(), config)
+        else:
+            index = CanonicalIndex.load(out, config)
+        stats = index.apply(read_delta(inputs))
+        if store:
+            store.write_canonical(index.canonical(), index.live_auto_primary())
+            out = store.path
+        else:
+            index.save(out)
+        print(f"Applied {len(inputs)} delta file(s) (+{stats['added']} ~{stats['changed']} -{stats['removed']}, "
+              f"{stats['new_canonical']} new): {len(index.canonical())} canonical cocktails -> {out}")
+        return
+    if args.inputs and not inputs:
         print("No input files found.", file=sys.stderr)
         sys.exit(2)
-    versions = _load_versions(inputs)
-    canon = merge_to_canonical(versions)
-    Path("data").mkdir(exist_ok=True, parents=True)
-    out = Path("data/canonical.json")
-    out.write_text(json.dumps([c.to_dict() for c in canon], ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"Wrote {len(canon)} canonical cocktails -> {out}")
+    if store:
+        # --inputs with --store are imported first, replacing the source each file is named after
+        import_jsonl(store, inputs)
+        table = _load_table(store.iter_versions())
+    else:
+        table = _load_table(iter_jsonl_many(inputs))
+    pairs = []
+    canon = merge_to_canonical(table.rows(), config, report=pairs)
+    canon = [c.to_dict() for c in canon]
+    if store:
+        store.write_canonical(canon)
+        out = store.path
+    else:
+        Path("data").mkdir(exist_ok=True, parents=True)
+        write_json(out, canon, indent=2, atomic=True)
+        write_canonical_state(out, canon)
+    merged = [{"id": c["id"], "name": c["name"], "aka": c["aka"]} for c in canon if c["aka"]]
+    if args.report:
+        _write_merge_report(args.report, config, merged, pairs)
+    print(f"Wrote {len(canon)} canonical cocktails ({len(merged)} fuzzy merges{_near_dup_summary(canon, config)}) "
+          f"-> {out}")
+
+def cmd_normalize(args):
+    normalizer = get_normalizer()
+    paths = _expand(args.inputs)
+    for p in paths:
+        with JsonlWriter(p, atomic=True) as w:
+            for d in iter_jsonl(p):
+                w.write(normalizer.normalize_version_dict(d))
+        print(f"Normalized {w.count} recipe versions -> {p}")
+    info = normalizer.canonical_id.cache_info()
+    print(f"{info.currsize} distinct ingredient names ({info.hits} memo hits)")
 
 def cmd_validate(args):
-    p = Path(args.file)
-    d = json.loads(p.read_text(encoding="utf-8"))
-    ids = set()
-    for c in d:
-        if not c["id"] or not c["name"] or not c.get("versions"):
-            raise SystemExit("Invalid canonical entry found.")
-        if c["id"] in ids:
-            raise SystemExit(f"Duplicate canonical id: {c['id']}")
-        ids.add(c["id"])
-    print(f"OK: {len(d)} canonical cocktails in {p}")
+    store = open_store(args.store) if args.store else None
+    if store:
+        validator = Validator(args.max_issues)
+        validator.check_versions(store.iter_versions(), str(store.path))
+        validator.check_canonical(store.canonical(), str(store.path))
+        validator.check_orphans()
+        p, report = store.path, validator.report()
+    elif args.file:
+        p = Path(args.file)
+        # delta files from `scrape --incremental` are not full sources
+        sources = sorted({s for s in _expand(args.sources) if ".delta." not in Path(s).name})
+        report = validate_files(p, sources, workers=args.workers, max_issues=args.max_issues)
+    else:
+        raise SystemExit("validate needs --file (or --store)")
+    if args.report:
+        write_json(args.report, report, indent=2)
+    counts = report["counts"]
+    if not report["ok"]:
+        for issue in report["issues"][:10]:
+            where = f"{issue['file']}:{issue['pos']} " if issue["file"] else ""
+            print(f"{issue['code']}: {where}{issue['id'] or ''} {issue['detail']}".rstrip(), file=sys.stderr)
+        raise SystemExit(f"{counts['issues']} issue(s) in {p}: "
+                         + ", ".join(f"{code}={n}" for code, n in report["by_code"].items()))
+    refs = f", {counts['versions']} source versions" if report["referential_checks"] else " (no sources checked)"
+    print(f"OK: {counts['canonical']} canonical cocktails in {p}{refs}")
+
+def cmd_export(args):
+    store = open_store(args.store)
+    counts = store.export_jsonl(args.outdir, args.canonical, args.compress)
+    for source, n in counts.items():
+        print(f"Wrote {n} recipe versions -> {Path(args.outdir) / f'{source}.jsonl{args.compress}'}")
+    if args.canonical:
+        print(f"Wrote canonical cocktails -> {args.canonical}")
+
+def _run(args):
+    """Run the chosen command, with stage metrics and/or cProfile when asked for."""
+    if args.metrics or args.metrics_json or args.metrics_prom:
+        metrics.enable()
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(args.func, args)
+        finally:
+            profiler.dump_stats(args.profile)
+            print(f"Profile -> {args.profile} (python -m pstats {args.profile})", file=sys.stderr)
+    else:
+        args.func(args)
+    if not metrics.enabled:
+        return
+    print(metrics.summary(), file=sys.stderr)
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom, labels={"command": args.cmd})
 
 def main():
+    # flags every command takes
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--metrics", action="store_true", help="print per-stage timers and counters when done")
+    common.add_argument("--metrics-json", help="also write the stage metrics as JSON to this path")
+    common.add_argument("--metrics-prom", help="also write them in Prometheus textfile format (e.g. for node_exporter)")
+    common.add_argument("--profile", nargs="?", const="ingest.pstats", help="run under cProfile and dump stats here")
+
     ap = argparse.ArgumentParser()
     sub = ap.add_subparsers(dest="cmd", required=True)
 
-    sp = sub.add_parser("scrape", help="Scrape a source and write JSONL")
-    sp.add_argument("--source", required=True, help="e.g., iba")
+    # flags of the commands that scrape (scrape, run)
+    scraping = argparse.ArgumentParser(add_help=False)
+    scraping.add_argument("--concurrency", type=int, default=1, help="requests kept in flight (1 = sequential)")
+    scraping.add_argument("--parse-workers", type=int, default=0, help="parse pages on a process pool of this size (iba)")
+    scraping.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="HTTP cache database")
+    scraping.add_argument("--no-cache", action="store_true", help="always hit the network, bypassing the cache")
+    scraping.add_argument("--cache-ttl", type=float, default=24 * 3600, help="seconds a cached page is served without revalidation")
+    scraping.add_argument("--cache-max-mb", type=float, default=512, help="evict least recently used pages beyond this size")
+    scraping.add_argument("--offline", action="store_true", help="serve only from the cache, never the network")
+    scraping.add_argument("--compress", choices=["", ".gz", ".zst"], default="", help="compress the JSONL output")
+    scraping.add_argument("--resume", action="store_true",
+                          help="continue an interrupted run from its checkpoint instead of starting over")
+    scraping.add_argument("--checkpoint-every", type=int, default=50, help="URLs between fsync'd checkpoints")
+    scraping.add_argument("--retries", type=int, help="retries per request on connection errors, 429 and 5xx (default 3)")
+    scraping.add_argument("--backoff", type=float, help="first retry delay in seconds, doubled per retry (default 1)")
+    scraping.add_argument("--max-attempts", type=int, default=3, help="runs a failing URL is tried in before --resume skips it")
+
+    # flags of the commands that merge (run, merge)
+    matching = argparse.ArgumentParser(add_help=False)
+    matching.add_argument("--exact", action="store_true", help="only merge identical name slugs (no fuzzy matching)")
+    matching.add_argument("--match-name", type=float, default=MatchConfig.name_threshold, help="min name-token Jaccard for a fuzzy candidate")
+    matching.add_argument("--match-score", type=float, default=MatchConfig.score_threshold, help="min combined name/ingredient score to merge")
+    matching.add_argument("--near-dups", choices=["off", "flag", "collapse"], default=MatchConfig.near_duplicates,
+                          help="near-duplicate versions of a cocktail: list them (flag, default) or drop all but one (collapse)")
+    matching.add_argument("--dup-jaccard", type=float, default=MatchConfig.dup_jaccard,
+                          help="min ingredient Jaccard of near-duplicate versions")
+    matching.add_argument("--dup-hamming", type=int, default=MatchConfig.dup_hamming,
+                          help="max instruction SimHash bit distance of near-duplicate versions")
+
+    sp = sub.add_parser("scrape", help="Scrape a source and write JSONL", parents=[common, scraping])
+    sp.add_argument("--source", required=True, help="e.g., iba, cocktaildb (or a cocktail_ingest.sources entry point)")
     sp.add_argument("--delay", type=float, default=0.6)
+    sp.add_argument("--rate", type=float, default=None, help="max requests/sec per host when concurrent (default: 1/delay)")
+    sp.add_argument("--incremental", action="store_true", help="only re-parse changed pages and write <source>.delta.jsonl")
+    sp.add_argument("--store", help="sqlite:<path> -- read/write a SQLite store instead of JSONL/canonical.json")
     sp.set_defaults(func=cmd_scrape)
 
-    mp = sub.add_parser("merge", help="Merge JSONL sources into canonical.json")
-    mp.add_argument("--inputs", nargs="+", required=True, help="Glob(s) for jsonl files")
+    rp = sub.add_parser("run", help="Scrape every source concurrently, then merge and pack",
+                        parents=[common, scraping, matching])
+    rp.add_argument("--sources", nargs="+", help="sources to scrape (default: every registered one); only these are merged")
+    rp.add_argument("--delay", action="append", metavar="[NAME=]SECONDS",
+                    help="per-source request delay, repeatable (default: each source's own)")
+    rp.add_argument("--rate", action="append", metavar="[NAME=]RPS",
+                    help="per-source max requests/sec per host when concurrent, repeatable")
+    rp.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                    help="versions buffered between the scrapers and merge before the scrapers block")
+    rp.add_argument("--report", default="data/merge_report.json", help="where to write the fuzzy merge report ('' to skip)")
+    rp.add_argument("--canonical", default="data/canonical.json")
+    rp.add_argument("--outdir", default="build")
+    rp.add_argument("--format", choices=["v1", "v2", "binary"], default="v1", help="pack format (see pack --format)")
+    rp.add_argument("--shard-size", type=int, default=0, help="v2: fixed-size shards of N records instead of per-letter")
+    rp.set_defaults(func=cmd_run)
+
+    mp = sub.add_parser("merge", help="Merge JSONL sources into canonical.json", parents=[common, matching])
+    mp.add_argument("--inputs", nargs="+", help="Glob(s) for jsonl files (imported first with --store)")
+    mp.add_argument("--incremental", action="store_true", help="inputs are *.delta.jsonl; update canonical.json in place")
+    mp.add_argument("--report", default="data/merge_report.json", help="where to write the fuzzy merge report ('' to skip)")
+    mp.add_argument("--store", help="sqlite:<path> -- read/write a SQLite store instead of JSONL/canonical.json")
     mp.set_defaults(func=cmd_merge)
 
-    vp = sub.add_parser("validate", help="Validate a canonical.json")
-    vp.add_argument("--file", required=True)
+    np_ = sub.add_parser("normalize", help="Rewrite ingredient ids in JSONL files to canonical ids", parents=[common])
+    np_.add_argument("--inputs", nargs="+", required=True, help="Glob(s) for jsonl files")
+    np_.set_defaults(func=cmd_normalize)
+
+    vp = sub.add_parser("validate", help="Validate a canonical.json", parents=[common])
+    vp.add_argument("--file")
+    vp.add_argument("--sources", nargs="*", default=["data/sources/*.jsonl*"],
+                    help="Glob(s) for the source JSONL files --file refers to (none: skip referential checks)")
+    vp.add_argument("--workers", type=int, default=0, help="scan source files on a process pool of this size")
+    vp.add_argument("--report", help="write the machine-readable validation report (JSON) here")
+    vp.add_argument("--max-issues", type=int, default=100, help="issues kept in the report per code (all are counted)")
+    vp.add_argument("--store", help="sqlite:<path> -- validate the canonical groupings held in a SQLite store")
     vp.set_defaults(func=cmd_validate)
 
-    pp = sub.add_parser("pack", help="Build web-consumable JSON pack")
+    pp = sub.add_parser("pack", help="Build web-consumable JSON pack", parents=[common])
     pp.add_argument("--canonical", default="data/canonical.json")
     pp.add_argument("--inputs", nargs="+", default=["data/sources/iba.jsonl","data/sources/cocktaildb.jsonl"])
     pp.add_argument("--outdir", default="build")
     pp.add_argument("--bundle", action="store_true", help="write single pack.json instead of split files")
+    pp.add_argument("--format", choices=["v1", "v2", "binary"], default="v1",
+                    help="v2: sharded, content-hashed, precompressed files; binary: one mmap-able pack.bin")
+    pp.add_argument("--shard-size", type=int, default=0, help="v2: fixed-size shards of N records instead of per-letter")
+    pp.add_argument("--delta", nargs="+", help="update the versions.json already in --outdir with *.delta.jsonl instead of reading --inputs")
+    pp.add_argument("--store", help="sqlite:<path> -- read canonical groupings and versions from a SQLite store")
+    pp.add_argument("--since", metavar="MANIFEST",
+                    help="previous build's manifest.json: also write the delta from it (see pipeline.packdiff)")
+    pp.add_argument("--keep-deltas", type=int, default=KEEP_DELTAS, help="deltas kept in the manifest chain")
     def cmd_pack(args):
-        pack = build_pack(args.canonical, args.inputs)
-        write_pack(pack, args.outdir, split=not args.bundle)
-        print(f"Packed -> {args.outdir}")
+        versions = canonical = None
+        store = open_store(args.store) if args.store else None
+        if store:
+            canonical = store.canonical()
+        if args.delta:
+            versions = read_pack_versions(args.outdir)
+            versions = apply_delta_to_versions(versions, read_delta(args.delta))
+        elif store:
+            versions = store.load_table(canonical_only=True)
+        # read before the writers below replace it (--since is usually <outdir>/manifest.json)
+        previous = load_build(args.since) if args.since else None
+        pack = build_pack(args.canonical, args.inputs, versions=versions, canonical=canonical)
+        _write_pack(pack, args.outdir, args.format, bundle=args.bundle, shard_size=args.shard_size,
+                    previous=previous, keep_deltas=args.keep_deltas)
     pp.set_defaults(func=cmd_pack)
 
+    ep = sub.add_parser("export", help="Write a SQLite store back out as JSONL (+ canonical.json)", parents=[common])
+    ep.add_argument("--store", required=True, help="sqlite:<path>")
+    ep.add_argument("--outdir", default="data/sources")
+    ep.add_argument("--canonical", default="data/canonical.json", help="where to write canonical.json ('' to skip)")
+    ep.add_argument("--compress", choices=["", ".gz", ".zst"], default="", help="compress the JSONL output")
+    ep.set_defaults(func=cmd_export)
+
     args = ap.parse_args()
-    args.func(args)
+    _run(args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,189 @@
+# pipeline/binpack.py
+"""
+Binary pack: one file that API workers mmap and read by id, instead of
+loading versions.json into a dict at startup.
+
+Layout (little endian):
+
+    header      magic "CKTLPACK", format version u16, codec u16, section count u32
+    sections    per section: name (16 bytes, NUL padded), record count u32,
+                index offset u64, keys offset u64
+    records     u32 length + encoded record (msgpack if installed, else JSON)
+    per section sorted index of (key offset u32, key length u32, record offset u64)
+                followed by the UTF-8 ids it points into
+
+Sections are "cocktails", "versions", "ingredients", "meta" (manifest,
+postings, search index header) and "search" (search index shards). Lookups
+binary-search the index in place, so opening a pack decodes nothing and
+every process shares the same page cache.
+"""
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pipeline.io import dumpb, loads, write_json
+from pipeline.search import search_meta
+
+try:  # msgpack is optional; without it records are JSON
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b"CKTLPACK"
+BINARY_FORMAT = 1
+PACK_FILE = "pack.bin"
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+
+HEADER = struct.Struct("<8sHHI")
+SECTION = struct.Struct("<16sIQQ")
+ENTRY = struct.Struct("<IIQ")
+LENGTH = struct.Struct("<I")
+
+def _encoder(codec: int):
+    if codec == CODEC_MSGPACK:
+        return lambda obj: msgpack.packb(obj, use_bin_type=True)
+    return dumpb
+
+def _decoder(codec: int):
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("this pack was written with msgpack records; install 'msgpack' to read it")
+        return lambda data: msgpack.unpackb(data, raw=False)
+    return loads
+
+def write_binary(path, sections: Dict[str, Dict[str, object]], codec: Optional[int] = None) -> None:
+    """Write `sections` (name -> {id: record}) to a binary pack at `path` (atomically)."""
+    if codec is None:
+        codec = CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+    encode = _encoder(codec)
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    names = list(sections)
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, BINARY_FORMAT, codec, len(names)))
+        f.write(b"\0" * SECTION.size * len(names))  # filled in below
+        offsets: Dict[str, List[Tuple[bytes, int]]] = {}
+        for name in names:
+            entries = offsets[name] = []
+            for key, record in sections[name].items():
+                data = encode(record)
+                entries.append((key.encode("utf-8"), f.tell()))
+                f.write(LENGTH.pack(len(data)))
+                f.write(data)
+        directory = []
+        for name in names:
+            entries = sorted(offsets[name])
+            f.write(b"\0" * (-f.tell() % 8))
+            index_offset = f.tell()
+            key_offset = 0
+            for key, record_offset in entries:
+                f.write(ENTRY.pack(key_offset, len(key), record_offset))
+                key_offset += len(key)
+            keys_offset = f.tell()
+            f.write(b"".join(key for key, _ in entries))
+            directory.append(SECTION.pack(name.encode("utf-8"), len(entries), index_offset, keys_offset))
+        f.seek(HEADER.size)
+        f.write(b"".join(directory))
+    os.replace(tmp, path)
+
+def write_pack_binary(pack: dict, outdir: str) -> dict:
+    """pack --format binary: <outdir>/pack.bin plus a manifest.json pointing at it."""
+    out = Path(outdir)
+    out.mkdir(parents=True, exist_ok=True)
+    ids = [c["id"] for c in pack["cocktails"]]
+    manifest = dict(pack["manifest"], format="binary", file=PACK_FILE)
+    write_binary(out / PACK_FILE, {
+        "cocktails": {c["id"]: c for c in pack["cocktails"]},
+        "versions": pack["versions"],
+        "ingredients": pack["ingredients"],
+        "meta": {"manifest": manifest, "postings": dict(pack["postings"], ids=ids),
+                 "search": dict(search_meta(pack["search"]), ids=ids)},
+        "search": pack["search"]["shards"],
+    })
+    write_json(out / "manifest.json", manifest, indent=2, atomic=True)
+    return manifest
+
+class BinaryPack:
+    """
+    Read-only view of a binary pack. get() is a binary search over the
+    section's mmapped index plus one record decode; nothing else is parsed.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, codec, n = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: not a binary cocktail pack")
+        if version != BINARY_FORMAT:
+            raise ValueError(f"{self.path}: unsupported binary pack version {version}")
+        self._decode = _decoder(codec)
+        self.sections: Dict[str, Tuple[int, int, int]] = {}
+        for i in range(n):
+            name, count, index_offset, keys_offset = SECTION.unpack_from(self._mm, HEADER.size + i * SECTION.size)
+            self.sections[name.rstrip(b"\0").decode("utf-8")] = (count, index_offset, keys_offset)
+
+    @classmethod
+    def open(cls, outdir: str) -> "BinaryPack":
+        """Open the pack.bin of a build directory written by write_pack_binary."""
+        return cls(Path(outdir) / PACK_FILE)
+
+    def _entry(self, section: Tuple[int, int, int], i: int) -> Tuple[bytes, int]:
+        _, index_offset, keys_offset = section
+        key_offset, key_len, record_offset = ENTRY.unpack_from(self._mm, index_offset + i * ENTRY.size)
+        start = keys_offset + key_offset
+        return self._mm[start:start + key_len], record_offset
+
+    def _record(self, offset: int):
+        (n,) = LENGTH.unpack_from(self._mm, offset)
+        start = offset + LENGTH.size
+        return self._decode(self._mm[start:start + n])
+
+    def get(self, section: str, key: str, default=None):
+        sec = self.sections[section]
+        target = key.encode("utf-8")
+        lo, hi = 0, sec[0]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k, offset = self._entry(sec, mid)
+            if k == target:
+                return self._record(offset)
+            if k < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return default
+
+    def cocktail(self, cocktail_id: str):
+        return self.get("cocktails", cocktail_id)
+
+    def version(self, version_id: str):
+        return self.get("versions", version_id)
+
+    def count(self, section: str) -> int:
+        return self.sections[section][0]
+
+    def keys(self, section: str) -> Iterator[str]:
+        sec = self.sections[section]
+        for i in range(sec[0]):
+            yield self._entry(sec, i)[0].decode("utf-8")
+
+    def items(self, section: str) -> Iterator[Tuple[str, object]]:
+        """(id, record) pairs in id order; decodes every record, so meant for tooling, not requests."""
+        sec = self.sections[section]
+        for i in range(sec[0]):
+            key, offset = self._entry(sec, i)
+            yield key.decode("utf-8"), self._record(offset)
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,176 @@
+# pipeline/checkpoint.py
+"""
+Resumable scrape runs.
+
+Records are appended to <source>.jsonl.part as they are parsed. Every
+`every` URLs (or `interval` seconds) the part file is flushed and fsync'd,
+then one line is appended (and fsync'd) to <source>.checkpoint.jsonl:
+
+    {"offset": <bytes of the part file>, "count": <records>, "done": [urls finished since the last line]}
+
+Each line only covers records that are already on disk. A crash can only
+lose the work after the last line: on resume the part file is truncated back
+to that offset, and URLs finished after it are fetched again. Every failure
+(fetch after its retries, or parse) is appended to <source>.failures.jsonl.
+A failed URL's records are cut from the part file again (a URL's records are
+written back to back, so they are exactly those after the last completed
+URL). Failed URLs are not marked done, so a resumed run retries them, up to
+`max_attempts` failures per URL across runs. finish() moves the part file
+into place and drops the journal -- unless some failed URL still has
+attempts left, in which case the output is a copy and `--resume` retries
+just those URLs.
+"""
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Set
+from pipeline.io import JsonlWriter, dumpb, iter_jsonl, loads, open_binary
+from utils import metrics
+
+# files written next to <source>.jsonl that are not source files
+SIDECAR_SUFFIXES = (".jsonl.part", ".checkpoint.jsonl", ".failures.jsonl")
+
+class ScrapeCheckpoint:
+    def __init__(self, path: Path, resume: bool = False, every: int = 50, interval: float = 30.0,
+                 max_attempts: int = 3):
+        """`path` is the final output; the part, journal and failure log sit next to it."""
+        self.path = Path(path)
+        base = self.path.name
+        for suffix in (".gz", ".zst", ".jsonl"):
+            base = base.removesuffix(suffix)
+        self.part_path = self.path.with_name(base + ".jsonl.part")
+        self.journal_path = self.path.with_name(base + ".checkpoint.jsonl")
+        self.failures_path = self.path.with_name(base + ".failures.jsonl")
+        self.every = every
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.done: Set[str] = set()
+        self.attempts: Dict[str, int] = {}
+        self.count = 0
+        self.resumed = False
+
+        offset = 0
+        if resume and self.journal_path.exists():
+            offset = self._replay()
+            self.resumed = True
+        elif not resume:
+            for p in (self.part_path, self.journal_path, self.failures_path):
+                if p.exists():
+                    p.unlink()
+        if resume and self.failures_path.exists():
+            for f in iter_jsonl(self.failures_path):
+                if f["url"] not in self.done:
+                    self.attempts[f["url"]] = self.attempts.get(f["url"], 0) + 1
+
+        self._part = open(self.part_path, "r+b" if offset else "wb", buffering=1 << 16)
+        self._part.truncate(offset)  # drop records written after the last checkpoint
+        self._part.seek(offset)
+        self._journal = open(self.journal_path, "ab")
+        self._failures = open(self.failures_path, "ab")
+        self._safe = (offset, self.count)  # end of the last completed URL's records
+        self._recent: List[str] = []
+        self._last = time.monotonic()
+
+    def _replay(self) -> int:
+        offset = 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = loads(line)
+                except ValueError:  # torn last line: its checkpoint never completed
+                    break
+                offset, self.count = entry["offset"], entry["count"]
+                self.done.update(entry["done"])
+        return offset
+
+    def pending(self, url: str) -> bool:
+        """True unless `url` finished in an earlier run or has used up its attempts."""
+        return url not in self.done and self.attempts.get(url, 0) < self.max_attempts
+
+    def write(self, record: Any) -> None:
+        with metrics.timer("serialize"):
+            self._part.write(dumpb(record.to_dict() if hasattr(record, "to_dict") else record) + b"\n")
+        self.count += 1
+
+    def complete(self, url: str) -> None:
+        """Every record of `url` has been written."""
+        self._safe = (self._part.tell(), self.count)
+        self._recent.append(url)
+        if len(self._recent) >= self.every or time.monotonic() - self._last >= self.interval:
+            self.checkpoint()
+
+    def fail(self, url: str, stage: str, error: BaseException) -> None:
+        """`url` failed: drop any records it already wrote and log the failure."""
+        offset, count = self._safe
+        if self.count != count:
+            self._part.truncate(offset)  # flushes the buffer first
+            self._part.seek(offset)
+            metrics.incr("failed_records_dropped", self.count - count)
+            self.count = count
+        self.attempts[url] = self.attempts.get(url, 0) + 1
+        self._failures.write(dumpb({
+            "url": url, "stage": stage, "error": f"{type(error).__name__}: {error}",
+            "attempt": self.attempts[url], "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }) + b"\n")
+        self._failures.flush()
+
+    def unresolved(self) -> List[str]:
+        """URLs that failed and never completed."""
+        return [u for u in self.attempts if u not in self.done and u not in self._recent]
+
+    def retryable(self) -> List[str]:
+        """Unresolved URLs a resumed run would try again."""
+        return [u for u in self.unresolved() if self.attempts[u] < self.max_attempts]
+
+    def checkpoint(self) -> None:
+        self._part.flush()
+        os.fsync(self._part.fileno())
+        offset, count = self._safe
+        self._journal.write(dumpb({"offset": offset, "count": count, "done": self._recent}) + b"\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.done.update(self._recent)
+        self._recent = []
+        self._last = time.monotonic()
+        metrics.incr("checkpoints")
+
+    def finish(self, consumed: bool = False) -> None:
+        """
+        Write the part file to `path` (recompressing for .gz/.zst); skip that
+        when `consumed` (e.g. already loaded into a store). The journal and
+        part file are kept while retryable() is non-empty, the failure log
+        while anything is unresolved.
+        """
+        self._safe = (self._part.tell(), self.count)
+        self.checkpoint()
+        self._part.close()
+        self._journal.close()
+        self._failures.close()
+        keep = bool(self.retryable())
+        if consumed:
+            pass
+        elif self.path.suffix in (".gz", ".zst"):
+            with JsonlWriter(self.path, atomic=True) as out, open_binary(self.part_path, "rb") as f:
+                for line in f:
+                    out.write_raw(line)
+        elif keep:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            shutil.copyfile(self.part_path, tmp)
+            os.replace(tmp, self.path)
+        else:
+            os.replace(self.part_path, self.path)
+        if not keep:
+            for p in (self.part_path, self.journal_path):
+                if p.exists():
+                    p.unlink()
+        if not self.unresolved() and self.failures_path.exists():
+            self.failures_path.unlink()
+
+    def close(self) -> None:
+        """Stop without finishing (the run can be resumed)."""
+        self.checkpoint()
+        self._part.close()
+        self._journal.close()
+        self._failures.close()
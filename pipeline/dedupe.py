@@ -1,33 +1,204 @@
-
-from typing import Dict, List
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 from app.models import RecipeVersion, CanonicalRecipe
+from pipeline.similarity import near_duplicate_pairs
+from utils import metrics
 from utils.text import slugify
 
-def group_versions(versions: List[RecipeVersion]) -> Dict[str, List[RecipeVersion]]:
+NAME_STOPWORDS = frozenset(["the", "a", "an", "cocktail", "cocktails", "drink", "iba", "classic", "original"])
+
+@dataclass
+class MatchConfig:
+    """Thresholds for fuzzy canonical matching (see resolve_groups)."""
+    enabled: bool = True
+    name_threshold: float = 0.6       # minimum name-token Jaccard for a candidate pair
+    score_threshold: float = 0.75     # minimum combined score to merge
+    name_weight: float = 0.6          # score = w * name + (1 - w) * ingredient Jaccard
+    max_block: int = 500              # ignore name tokens shared by more groups than this
+    stopwords: FrozenSet[str] = field(default=NAME_STOPWORDS)
+    near_duplicates: str = "flag"     # "off", "flag" or "collapse" near-duplicate versions (pipeline.similarity)
+    dup_jaccard: float = 0.8          # minimum ingredient-id Jaccard of near-duplicate versions
+    dup_hamming: int = 10             # maximum instruction SimHash distance of near-duplicate versions
+
+def group_versions(versions: Iterable[RecipeVersion]) -> Dict[str, List[RecipeVersion]]:
     buckets = {}
     for v in versions:
         key = v.name_slug or slugify(v.name)
         buckets.setdefault(key, []).append(v)
     return buckets
 
-def pick_primary(group: List[RecipeVersion]) -> str:
+def pick_primary(group: List[RecipeVersion], support: Optional[Dict[str, int]] = None) -> str:
+    """
+    IBA first; then, with `support` (version id -> size of its near-duplicate
+    cluster), the recipe most sources agree on; then the longest instructions.
+    """
     for v in group:
         if v.id.startswith("iba::"):
             return v.id
-    group_sorted = sorted(group, key=lambda x: len(x.instructions or ""), reverse=True)
+    support = support or {}
+    group_sorted = sorted(group, key=lambda x: (support.get(x.id, 1), len(x.instructions or "")), reverse=True)
     return group_sorted[0].id
 
-def merge_to_canonical(versions: List[RecipeVersion]) -> List[CanonicalRecipe]:
+def name_tokens(key: str, stopwords: FrozenSet[str] = NAME_STOPWORDS) -> FrozenSet[str]:
+    """Core tokens of a name slug: stopwords and single characters dropped."""
+    toks = frozenset(t for t in key.split("_") if len(t) > 1 and t not in stopwords)
+    return toks or frozenset(key.split("_"))
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _candidate_pairs(tokens: Dict[str, FrozenSet[str]], max_block: int) -> Iterable[Tuple[str, str]]:
+    """
+    Blocking: an inverted index from core name token to group keys. Only
+    groups sharing a block are compared, and blocks larger than `max_block`
+    (very common tokens) are skipped, so pairs stay far below n^2.
+    """
+    index: Dict[str, List[str]] = {}
+    for key, toks in tokens.items():
+        for t in toks:
+            index.setdefault(t, []).append(key)
+    seen = set()
+    for keys in index.values():
+        if len(keys) < 2 or len(keys) > max_block:
+            continue
+        for i, a in enumerate(keys):
+            for b in keys[i + 1:]:
+                pair = (a, b) if a < b else (b, a)
+                if pair not in seen:
+                    seen.add(pair)
+                    yield pair
+
+class _UnionFind:
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+
+    def find(self, x: str) -> str:
+        root = x
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while x != root:
+            self.parent[x], x = root, self.parent.get(x, x)
+        return root
+
+    def union(self, a: str, b: str):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # the shorter (then alphabetically first) key wins, e.g. daiquiri over daiquiri_cocktail
+            if (len(rb), rb) < (len(ra), ra):
+                ra, rb = rb, ra
+            self.parent[rb] = ra
+
+def resolve_groups(buckets: Dict[str, List[RecipeVersion]], config: MatchConfig,
+                   report: Optional[List[dict]] = None) -> Dict[str, List[str]]:
+    """
+    Entity resolution over exact-slug groups. Candidate pairs come from the
+    blocking index and are scored on name-token Jaccard and ingredient-id
+    Jaccard. Returns root key -> member keys; each accepted pair is appended
+    to `report` if given.
+    """
+    tokens = {key: name_tokens(key, config.stopwords) for key in buckets}
+    ingredients = {
+        key: frozenset(ing.id for v in group for ing in (v.ingredients or []) if ing.id)
+        for key, group in buckets.items()
+    }
+    uf = _UnionFind()
+    scored = accepted = 0
+    for a, b in _candidate_pairs(tokens, config.max_block):
+        scored += 1
+        name_sim = jaccard(tokens[a], tokens[b])
+        if name_sim < config.name_threshold:
+            continue
+        if ingredients[a] and ingredients[b]:
+            ing_sim = jaccard(ingredients[a], ingredients[b])
+            score = config.name_weight * name_sim + (1 - config.name_weight) * ing_sim
+        else:
+            ing_sim = None
+            score = name_sim
+        if score < config.score_threshold:
+            continue
+        uf.union(a, b)
+        accepted += 1
+        if report is not None:
+            report.append({"a": a, "b": b, "name_similarity": round(name_sim, 3),
+                           "ingredient_jaccard": None if ing_sim is None else round(ing_sim, 3),
+                           "score": round(score, 3)})
+
+    metrics.incr("merge_pairs_scored", scored)
+    metrics.incr("merge_pairs_accepted", accepted)
+    clusters: Dict[str, List[str]] = {}
+    for key in buckets:
+        clusters.setdefault(uf.find(key), []).append(key)
+    return clusters
+
+def merge_to_canonical(versions: Iterable[RecipeVersion], config: Optional[MatchConfig] = None,
+                       report: Optional[List[dict]] = None) -> List[CanonicalRecipe]:
+    with metrics.timer("merge"):
+        return _merge_to_canonical(versions, config or MatchConfig(), report)
+
+def near_duplicate_clusters(buckets: Dict[str, List[RecipeVersion]], config: MatchConfig) -> Dict[str, List[str]]:
+    """Root version id -> member version ids, for every near-duplicate cluster of two or more versions."""
+    uf = _UnionFind()
+    with metrics.timer("near_duplicates"):
+        for a, b in near_duplicate_pairs((v for group in buckets.values() for v in group),
+                                         config.dup_jaccard, config.dup_hamming, config.max_block):
+            uf.union(a, b)
+    clusters: Dict[str, List[str]] = {}
+    for vid in list(uf.parent):
+        root = uf.find(vid)
+        clusters.setdefault(root, [root]).append(vid)
+    return clusters
+
+def _merge_to_canonical(versions: Iterable[RecipeVersion], config: MatchConfig,
+                        report: Optional[List[dict]]) -> List[CanonicalRecipe]:
     buckets = group_versions(versions)
+    if config.enabled:
+        clusters = resolve_groups(buckets, config, report)
+    else:
+        clusters = {key: [key] for key in buckets}
+    near = near_duplicate_clusters(buckets, config) if config.near_duplicates != "off" else {}
+    dup_root = {vid: root for root, members in near.items() for vid in members}
+    support = {vid: len(near[root]) for vid, root in dup_root.items()}
+    seen_in: Dict[str, Tuple[str, str]] = {}  # near-duplicate root -> (canonical id, version id) first seen
+    collapsed = 0
+
     canon = []
-    for key, group in buckets.items():
-        name = group[0].name
-        primary = pick_primary(group)
+    for key, members in clusters.items():
+        group = [v for m in members for v in buckets[m]]
+        name = buckets[key][0].name
+        duplicates: Dict[str, List[str]] = {}
+        by_root: Dict[str, List[RecipeVersion]] = {}
+        for v in group:
+            root = dup_root.get(v.id)
+            if root is not None:
+                by_root.setdefault(root, []).append(v)
+        for root, dups in by_root.items():
+            first = seen_in.setdefault(root, (key, dups[0].id))
+            if first[0] != key and report is not None:
+                # same recipe under names that did not merge
+                report.append({"a": first[0], "b": key, "near_duplicate": [first[1], dups[0].id]})
+            if len(dups) > 1:
+                rep = pick_primary(dups, support)
+                duplicates[rep] = [v.id for v in dups if v.id != rep]
+        if config.near_duplicates == "collapse" and duplicates:
+            dropped = {vid for ids in duplicates.values() for vid in ids}
+            group = [v for v in group if v.id not in dropped]
+            collapsed += len(dropped)
+        primary = pick_primary(group, support)
+        aka = []
+        for m in members:
+            other = buckets[m][0].name
+            if m != key and other != name and other not in aka:
+                aka.append(other)
         canon.append(CanonicalRecipe(
             id=key,
             name=name,
             versions=[v.id for v in group],
             primary_version_id=primary,
-            aka=[]
+            aka=aka,
+            duplicates=duplicates
         ))
+    metrics.incr("near_duplicate_versions", sum(len(m) for m in near.values()))
+    metrics.incr("near_duplicates_collapsed", collapsed)
     return canon
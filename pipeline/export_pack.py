@@ -1,22 +1,40 @@
 # pipeline/export_pack.py
-import json
+import gzip
+import hashlib
 import time
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Mapping, Optional, Set, Tuple
+from app.table import VersionTable
+from pipeline.binpack import BinaryPack
+from pipeline.io import dumpb, iter_jsonl_many, read_json, write_json
+from pipeline.normalize import get_normalizer
+from pipeline.search import build_search_index, search_meta
+from utils import metrics
+
+try:  # brotli is optional; without it only .gz siblings are written
+    import brotli
+except ImportError:
+    brotli = None
+
+PACK_FORMAT_V2 = 2
+HASH_LEN = 12
 
 def load_canonical(path: str) -> List[dict]:
-    return json.loads(Path(path).read_text(encoding="utf-8"))
-
-def load_versions(paths: List[str]) -> Dict[str, dict]:
-    """Map version_id -> RecipeVersion dict (from *.jsonl)."""
-    out: Dict[str, dict] = {}
-    for p in paths:
-        for line in Path(p).read_text(encoding="utf-8").splitlines():
-            d = json.loads(line)
-            out[d["id"]] = d
-    return out
-
-def _flatten_primary(canon_item: dict, versions: Dict[str, dict]) -> Tuple[dict, dict]:
+    return read_json(path)
+
+def load_versions(paths: List[str], wanted: Optional[Set[str]] = None) -> VersionTable:
+    """
+    version_id -> RecipeVersion dict (from *.jsonl), streamed into a columnar
+    VersionTable with canonical ingredient ids; only `wanted` ids are kept if given.
+    """
+    normalizer = get_normalizer()
+    table = VersionTable()
+    for d in iter_jsonl_many(paths):
+        if wanted is None or d["id"] in wanted:
+            table.append(normalizer.normalize_version_dict(d))
+    return table
+
+def _flatten_primary(canon_item: dict, versions: Mapping[str, dict]) -> Tuple[dict, dict]:
     """
     Returns (compact_primary_record, primary_version_dict)
     - compact_primary_record is what your web app can list quickly
@@ -34,8 +52,9 @@ def _flatten_primary(canon_item: dict, versions: Dict[str, dict]) -> Tuple[dict,
         "image": v.get("image"),
         "glass": v.get("glass"),
         "tags": v.get("tags", []),
-        # Raw measures preserved
+        # Raw measures preserved, parsed ones alongside as ingredient["quantity"]
         "ingredients": v.get("ingredients", []),
+        "volume_ml": _volume_ml(v.get("ingredients") or []),
         "instructions": v.get("instructions") or "",
         "attribution": v.get("attribution", {}),  # source_name, source_url, fetched_at
         # Link out to see other versions if you want a “compare” UI
@@ -43,13 +62,38 @@ def _flatten_primary(canon_item: dict, versions: Dict[str, dict]) -> Tuple[dict,
     }
     return compact, v
 
-def build_pack(canonical_path: str, source_jsonls: List[str]) -> dict:
-    canonical = load_canonical(canonical_path)
-    versions = load_versions(source_jsonls)
+def _volume_ml(ingredients: List[dict]) -> Optional[float]:
+    """Total volume of the measured liquid ingredients (range midpoints), None if none are."""
+    total = None
+    for ing in ingredients:
+        q = ing.get("quantity")
+        if q and q.get("ml_min") is not None:
+            total = (total or 0.0) + (q["ml_min"] + q["ml_max"]) / 2
+    return None if total is None else round(total, 1)
+
+def build_pack(canonical_path: str, source_jsonls: List[str], versions: Optional[Mapping[str, dict]] = None,
+               canonical: Optional[List[dict]] = None) -> dict:
+    with metrics.timer("pack"):
+        return _build_pack(canonical_path, source_jsonls, versions, canonical)
+
+def _build_pack(canonical_path: str, source_jsonls: List[str], versions: Optional[Mapping[str, dict]],
+                canonical: Optional[List[dict]]) -> dict:
+    if canonical is None:
+        canonical = load_canonical(canonical_path)
+    normalizer = get_normalizer()
+    if versions is None:
+        # Only versions referenced by the canonical set are ever packed
+        wanted = {vid for c in canonical for vid in c.get("versions", [])}
+        versions = load_versions(source_jsonls, wanted)
+    elif not isinstance(versions, VersionTable):
+        # canonical ingredient ids, also for sources written before normalization existed
+        for v in versions.values():
+            normalizer.normalize_version_dict(v)
 
     compact_list: List[dict] = []
     version_index: Dict[str, dict] = {}
     ingredient_index: Dict[str, dict] = {}
+    cocktail_postings: Dict[str, Set[int]] = {}
 
     for c in canonical:
         compact, primary_v = _flatten_primary(c, versions)
@@ -57,18 +101,28 @@ def build_pack(canonical_path: str, source_jsonls: List[str]) -> dict:
             continue
         compact_list.append(compact)
 
-        # add all versions for this cocktail to version_index (for detail pages)
+        # add all versions for this cocktail to version_index (for detail pages),
+        # materializing each one once; a VersionTable builds a fresh dict per lookup
         for vid in c.get("versions", []):
-            if vid in versions:
-                version_index[vid] = versions[vid]
+            if vid not in versions:
+                continue
+            v = version_index[vid] = primary_v if vid == compact["primary_version_id"] else versions[vid]
+
+            # build a simple ingredient index (id -> {name}) over every packed version
+            for ing in (v.get("ingredients") or []):
+                iid = ing.get("id")
+                name = normalizer.names.get(iid) or ing.get("name")
+                if iid and iid not in ingredient_index:
+                    ingredient_index[iid] = {"id": iid, "name": name}
 
-        # build a simple ingredient index (id -> {name})
+        # ingredient -> cocktail postings, from the primary recipe
         for ing in (primary_v.get("ingredients") or []):
             iid = ing.get("id")
-            name = ing.get("name")
-            if iid and iid not in ingredient_index:
-                ingredient_index[iid] = {"id": iid, "name": name}
+            if iid:
+                cocktail_postings.setdefault(iid, set()).add(len(compact_list) - 1)
 
+    metrics.incr("pack_cocktails", len(compact_list))
+    metrics.incr("pack_versions", len(version_index))
     manifest = {
         "name": "Cocktail Pack",
         "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
@@ -83,18 +137,135 @@ def build_pack(canonical_path: str, source_jsonls: List[str]) -> dict:
         "manifest": manifest,
         "cocktails": compact_list,
         "versions": version_index,     # optional for detail/compare screens
-        "ingredients": ingredient_index
+        "ingredients": ingredient_index,
+        "postings": encode_postings(cocktail_postings, len(compact_list)),
+        "search": build_search_index(compact_list),
+        # record id -> content hash, for deltas between builds (pipeline.packdiff)
+        "hashes": {
+            "cocktails": {c["id"]: record_hash(c) for c in compact_list},
+            "versions": {vid: record_hash(v) for vid, v in version_index.items()},
+        },
     }
 
+def record_hash(obj) -> str:
+    return hashlib.sha256(dumpb(obj)).hexdigest()[:HASH_LEN]
+
+def encode_postings(postings: Dict[str, Set[int]], n_cocktails: int) -> dict:
+    """
+    ingredient_id -> sorted indices into `cocktails`, delta-encoded (first
+    index, then gaps) so the arrays stay small. pipeline.query decodes them
+    into bitsets.
+    """
+    out = {}
+    for iid in sorted(postings):
+        prev = 0
+        gaps = []
+        for i in sorted(postings[iid]):
+            gaps.append(i - prev)
+            prev = i
+        out[iid] = gaps
+    return {"encoding": "delta", "cocktails": n_cocktails, "postings": out}
+
 def write_pack(pack: dict, outdir: str, split: bool = True):
     out = Path(outdir)
     out.mkdir(parents=True, exist_ok=True)
     # Always write a manifest
-    (out / "manifest.json").write_text(json.dumps(pack["manifest"], ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(out / "manifest.json", pack["manifest"], indent=2)
 
     if split:
-        (out / "cocktails.json").write_text(json.dumps(pack["cocktails"], ensure_ascii=False, indent=2), encoding="utf-8")
-        (out / "versions.json").write_text(json.dumps(pack["versions"], ensure_ascii=False, indent=2), encoding="utf-8")
-        (out / "ingredients.json").write_text(json.dumps(pack["ingredients"], ensure_ascii=False, indent=2), encoding="utf-8")
+        write_json(out / "cocktails.json", pack["cocktails"], indent=2)
+        write_json(out / "versions.json", pack["versions"], indent=2)
+        write_json(out / "ingredients.json", pack["ingredients"], indent=2)
+        write_json(out / "postings.json", pack["postings"])
+        meta = search_meta(pack["search"])
+        meta["ids"] = [c["id"] for c in pack["cocktails"]]
+        for key, shard in pack["search"]["shards"].items():
+            meta["shards"][key]["path"] = f"search/{key}.json"
+            (out / "search").mkdir(exist_ok=True)
+            write_json(out / "search" / f"{key}.json", shard)
+        write_json(out / "search.json", meta)
     else:
-        (out / "pack.json").write_text(json.dumps(pack, ensure_ascii=False, indent=2), encoding="utf-8")
+        write_json(out / "pack.json", {k: v for k, v in pack.items() if k != "hashes"}, indent=2)
+
+def shard_letter(record_id: str) -> str:
+    """Shard key for per-letter shards: first character of the slug part of the id."""
+    slug = record_id.rsplit(":", 1)[-1]
+    c = slug[:1].lower()
+    return c if "a" <= c <= "z" else "0"
+
+def _shard(ids: List[str], shard_size: int, key: Callable[[str], str] = shard_letter) -> Dict[str, List[str]]:
+    ids = sorted(ids)
+    if shard_size > 0:
+        return {f"{i // shard_size:04d}": ids[i:i + shard_size] for i in range(0, len(ids), shard_size)}
+    shards: Dict[str, List[str]] = {}
+    for rid in ids:
+        shards.setdefault(key(rid), []).append(rid)
+    return shards
+
+def _write_blob(out: Path, stem: str, obj) -> dict:
+    """Write minified JSON at <stem>.<sha256 prefix>.json plus .gz/.br siblings; returns its manifest entry."""
+    data = dumpb(obj)
+    digest = hashlib.sha256(data).hexdigest()
+    rel = f"{stem}.{digest[:HASH_LEN]}.json"
+    path = out / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    encodings = ["gz"]
+    # Content-addressed: an existing file with this name already holds these bytes
+    with metrics.timer("serialize"):
+        if not path.exists():
+            path.write_bytes(data)
+            path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            encodings.append("br")
+            br = path.with_name(path.name + ".br")
+            if not br.exists():
+                br.write_bytes(brotli.compress(data, quality=11))
+    return {"path": rel, "sha256": digest, "bytes": len(data), "encodings": encodings}
+
+def write_pack_v2(pack: dict, outdir: str, shard_size: int = 0) -> dict:
+    """
+    Pack format v2: cocktails and versions split into per-letter shards (or
+    fixed-size shards of `shard_size` records, sorted by id), every file
+    minified and named by its content hash, with precompressed .gz/.br
+    siblings. Only manifest.json keeps a stable name; it lists every shard
+    with its hash, so clients refetch just the shards that changed.
+    """
+    out = Path(outdir)
+    out.mkdir(parents=True, exist_ok=True)
+    cocktails = {c["id"]: c for c in pack["cocktails"]}
+    files = {"cocktails": [], "versions": []}
+
+    for kind, records in (("cocktails", cocktails), ("versions", pack["versions"])):
+        for key, ids in _shard(list(records), shard_size).items():
+            entry = _write_blob(out, f"{kind}/{key}", {rid: records[rid] for rid in ids})
+            entry.update(key=key, count=len(ids), first=ids[0], last=ids[-1])
+            files[kind].append(entry)
+    files["ingredients"] = _write_blob(out, "ingredients", pack["ingredients"])
+    files["ingredients"]["count"] = len(pack["ingredients"])
+    # cocktails are sharded by id here, so carry the index -> id mapping along
+    ids = [c["id"] for c in pack["cocktails"]]
+    files["postings"] = _write_blob(out, "postings", dict(pack["postings"], ids=ids))
+    meta = dict(search_meta(pack["search"]), ids=ids)
+    for key, shard in pack["search"]["shards"].items():
+        meta["shards"][key].update(_write_blob(out, f"search/{key}", shard))
+    files["search"] = _write_blob(out, "search", meta)
+
+    manifest = dict(pack["manifest"], format=PACK_FORMAT_V2,
+                    sharding={"mode": "size" if shard_size > 0 else "letter", "size": shard_size},
+                    files=files)
+    write_json(out / "manifest.json", manifest, indent=2, atomic=True)
+    return manifest
+
+def read_pack_versions(outdir: str) -> Dict[str, dict]:
+    """All versions of an existing build, v1 (versions.json), v2 (shards) or binary."""
+    out = Path(outdir)
+    manifest = read_json(out / "manifest.json")
+    if manifest.get("format") == "binary":
+        with BinaryPack(out / manifest["file"]) as pack:
+            return dict(pack.items("versions"))
+    if manifest.get("format") != PACK_FORMAT_V2:
+        return read_json(out / "versions.json")
+    versions: Dict[str, dict] = {}
+    for entry in manifest["files"]["versions"]:
+        versions.update(read_json(out / entry["path"]))
+    return versions
@@ -0,0 +1,303 @@
+# pipeline/incremental.py
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from pipeline.io import JsonlWriter, iter_jsonl_many, open_binary, loads, read_json, write_json
+from pipeline.dedupe import MatchConfig, jaccard, name_tokens
+from utils.text import slugify
+
+def content_hash(body: str) -> str:
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+def version_hash(d: dict) -> str:
+    """Hash of a RecipeVersion dict, ignoring fetched_at so re-fetches don't count as changes."""
+    d = dict(d)
+    if d.get("attribution"):
+        d["attribution"] = {k: v for k, v in d["attribution"].items() if k != "fetched_at"}
+    return hashlib.sha1(json.dumps(d, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class ScrapeState:
+    """
+    Per-source scrape state: source URL -> content hash of the page body and
+    the hash of every RecipeVersion parsed from it.
+
+    Scrapers call page() with each fetched body; when it returns False the body
+    is unchanged and parsing is skipped. Versions parsed from changed pages are
+    reported through emit(), the recipe URLs found in the listing through
+    listed() and pages that failed to fetch or parse through fail(). Safe to
+    call from worker threads.
+
+    A page that failed, or was listed but not fetched, keeps its previous
+    state (and versions); a page missing from this run only counts as removed
+    when the listing was complete, i.e. no listing page failed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.previous: Dict[str, dict] = {}
+        if self.path.exists():
+            self.previous = read_json(self.path).get("pages", {})
+        self.current: Dict[str, dict] = {}
+        self.seen: Set[str] = set()
+        self.failed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def page(self, url: str, body: str) -> bool:
+        h = content_hash(body)
+        with self._lock:
+            prev = self.previous.get(url)
+            if prev and prev["hash"] == h:
+                self.current[url] = prev
+                return False
+            self.current[url] = {"hash": h, "versions": {}}
+            return True
+
+    def emit(self, url: str, version) -> None:
+        with self._lock:
+            if url not in self.failed:
+                self.current[url]["versions"][version.id] = version_hash(version.to_dict())
+
+    def listed(self, urls: Iterable[str]) -> None:
+        with self._lock:
+            self.seen.update(urls)
+
+    def fail(self, url: str) -> None:
+        with self._lock:
+            self.failed.add(url)
+            prev = self.previous.get(url)
+            if prev is not None:
+                self.current[url] = prev
+            else:
+                self.current.pop(url, None)
+
+    def _carry_forward(self) -> None:
+        complete = self.failed <= self.seen  # only recipe pages failed, not listing pages
+        for url, prev in self.previous.items():
+            if url not in self.current and (url in self.seen or url in self.failed or not complete):
+                self.current[url] = prev
+
+    def diff(self) -> Dict[str, List[str]]:
+        """Version ids added / changed / removed since the previous run (call once the scrape is done)."""
+        with self._lock:
+            self._carry_forward()
+        before = {vid: h for p in self.previous.values() for vid, h in p["versions"].items()}
+        after = {vid: h for p in self.current.values() for vid, h in p["versions"].items()}
+        return {
+            "added": [vid for vid in after if vid not in before],
+            "changed": [vid for vid, h in after.items() if vid in before and before[vid] != h],
+            "removed": [vid for vid in before if vid not in after],
+        }
+
+    def save(self):
+        with self._lock:
+            self._carry_forward()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(self.path, {"pages": self.current}, atomic=True)
+
+def write_incremental(path: Path, delta_path: Path, parsed: Dict[str, object], diff: Dict[str, List[str]]) -> None:
+    """
+    Rewrite the full JSONL at `path` reusing the previous line of every
+    unchanged version, and write the added/changed/removed records to
+    `delta_path`.
+    """
+    removed = set(diff["removed"])
+    replaced = set(diff["added"]) | set(diff["changed"])
+    written = set()
+    with JsonlWriter(path, atomic=True) as out:
+        if path.exists():
+            with open_binary(path, "rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    vid = loads(line)["id"]
+                    if vid in removed or vid in written:
+                        continue
+                    if vid in replaced:
+                        out.write(parsed[vid])
+                    else:
+                        out.write_raw(line)
+                    written.add(vid)
+        for vid in diff["added"] + diff["changed"]:
+            if vid not in written:
+                out.write(parsed[vid])
+                written.add(vid)
+
+    write_delta(delta_path, parsed, diff)
+
+def write_delta(delta_path: Path, parsed: Dict[str, object], diff: Dict[str, List[str]]) -> None:
+    with JsonlWriter(delta_path) as out:
+        for op in ("added", "changed"):
+            for vid in diff[op]:
+                out.write({"op": op, "id": vid, "version": parsed[vid].to_dict()})
+        for vid in diff["removed"]:
+            out.write({"op": "removed", "id": vid})
+
+def read_delta(paths: Iterable[str]) -> Iterator[dict]:
+    return iter_jsonl_many(paths)
+
+def apply_delta_to_versions(versions: Dict[str, dict], delta: Iterable[dict]) -> Dict[str, dict]:
+    for d in delta:
+        if d["op"] == "removed":
+            versions.pop(d["id"], None)
+        else:
+            versions[d["id"]] = d["version"]
+    return versions
+
+class CanonicalIndex:
+    """
+    The existing canonical set, indexed for incremental merges:
+
+    - by_id:      canonical id -> entry
+    - by_slug:    name slug (canonical id, member slugs, aka slugs) -> canonical id
+    - by_version: version id -> canonical id
+    - by_token:   core name token -> canonical ids (fuzzy fallback for new slugs)
+    - by_duplicate: collapsed near-duplicate version id -> canonical id
+
+    apply() folds a delta into it touching only the affected entries. Canonical
+    ids never change, and hand edits are kept: aka is only ever appended to,
+    and primary_version_id is only re-picked when it still equals the value
+    merge chose last time (recorded in the sidecar state file).
+    """
+
+    def __init__(self, canonical: List[dict], auto_primary: Optional[Dict[str, str]] = None,
+                 config: Optional[MatchConfig] = None):
+        self.entries = canonical
+        self.auto_primary = dict(auto_primary or {})
+        self.config = config or MatchConfig()
+        self.by_id: Dict[str, dict] = {}
+        self.by_slug: Dict[str, str] = {}
+        self.by_version: Dict[str, str] = {}
+        self.by_token: Dict[str, set] = {}
+        self.by_duplicate: Dict[str, str] = {}
+        for c in canonical:
+            self._index(c)
+
+    @classmethod
+    def load(cls, path: Path, config: Optional[MatchConfig] = None) -> "CanonicalIndex":
+        path = Path(path)
+        canonical = read_json(path) if path.exists() else []
+        state = state_path(path)
+        auto = read_json(state).get("auto_primary", {}) if state.exists() else {}
+        return cls(canonical, auto, config)
+
+    def _index(self, c: dict):
+        self.by_id[c["id"]] = c
+        self.by_slug.setdefault(c["id"], c["id"])
+        for name in c.get("aka") or []:
+            self.by_slug.setdefault(slugify(name), c["id"])
+        for vid in c["versions"]:
+            self.by_version[vid] = c["id"]
+        for ids in (c.get("duplicates") or {}).values():
+            for vid in ids:
+                if self.by_version.get(vid) != c["id"]:
+                    self.by_duplicate[vid] = c["id"]
+        for t in name_tokens(c["id"], self.config.stopwords):
+            self.by_token.setdefault(t, set()).add(c["id"])
+
+    def _match(self, slug: str) -> Optional[str]:
+        cid = self.by_slug.get(slug)
+        if cid is not None or not self.config.enabled:
+            return cid
+        # Same blocking + name score as pipeline.dedupe, without ingredient sets
+        toks = name_tokens(slug, self.config.stopwords)
+        best, best_sim = None, 0.0
+        for t in toks:
+            block = self.by_token.get(t, ())
+            if len(block) > self.config.max_block:
+                continue
+            for other in block:
+                sim = jaccard(toks, name_tokens(other, self.config.stopwords))
+                if sim > best_sim or (sim == best_sim and best is not None and other < best):
+                    best, best_sim = other, sim
+        if best is not None and best_sim >= max(self.config.name_threshold, self.config.score_threshold):
+            return best
+        return None
+
+    def apply(self, delta: Iterable[dict]) -> Dict[str, int]:
+        touched: Dict[str, Dict[str, dict]] = {}
+        stats = {"added": 0, "changed": 0, "removed": 0, "new_canonical": 0}
+        for d in delta:
+            stats[d["op"]] += 1
+            cid = self.by_version.pop(d["id"], None)
+            if cid is not None:
+                self.by_id[cid]["versions"].remove(d["id"])
+            else:
+                cid = self.by_duplicate.get(d["id"])
+            if cid is not None:
+                self._dissolve(self.by_id[cid], d["id"])
+                touched.setdefault(cid, {})
+            if d["op"] == "removed":
+                continue
+            v = d["version"]
+            slug = v.get("name_slug") or slugify(v["name"])
+            cid = self._match(slug)
+            if cid is None:
+                c = {"id": slug, "name": v["name"], "versions": [], "primary_version_id": None, "aka": []}
+                self.entries.append(c)
+                self._index(c)
+                cid = slug
+                stats["new_canonical"] += 1
+            c = self.by_id[cid]
+            c["versions"].append(v["id"])
+            self.by_version[v["id"]] = cid
+            self.by_slug.setdefault(slug, cid)
+            if v["name"] != c["name"] and v["name"] not in c["aka"] and slug != cid:
+                c["aka"].append(v["name"])
+            touched.setdefault(cid, {})[v["id"]] = v
+
+        for cid, fresh in touched.items():
+            c = self.by_id[cid]
+            if not c["versions"]:
+                continue
+            current = c.get("primary_version_id")
+            hand_edited = current in c["versions"] and current != self.auto_primary.get(cid, current)
+            if not hand_edited:
+                c["primary_version_id"] = self.auto_primary[cid] = _pick_primary(c["versions"], fresh, current)
+        return stats
+
+    def _dissolve(self, c: dict, vid: str):
+        # `vid` changed or went away: the near-duplicate cluster it was in no longer
+        # holds, so its collapsed versions go back into `versions` until the next full merge
+        dups = c.get("duplicates")
+        if not dups:
+            return
+        for rep in [r for r, ids in dups.items() if r == vid or vid in ids]:
+            for dup in dups.pop(rep):
+                self.by_duplicate.pop(dup, None)
+                if dup != vid and dup not in self.by_version:
+                    c["versions"].append(dup)
+                    self.by_version[dup] = c["id"]
+        if not dups:
+            del c["duplicates"]
+
+    def canonical(self) -> List[dict]:
+        return [c for c in self.entries if c["versions"]]
+
+    def live_auto_primary(self) -> Dict[str, str]:
+        return {c["id"]: self.auto_primary[c["id"]] for c in self.canonical() if c["id"] in self.auto_primary}
+
+    def save(self, path: Path):
+        path = Path(path)
+        write_json(path, self.canonical(), indent=2, atomic=True)
+        write_json(state_path(path), {"auto_primary": self.live_auto_primary()}, atomic=True)
+
+def state_path(canonical_path: Path) -> Path:
+    """Sidecar recording the primary_version_id merge picked for each canonical entry."""
+    return Path(canonical_path).with_suffix(".state.json")
+
+def write_canonical_state(canonical_path: Path, canonical: List[dict]):
+    write_json(state_path(canonical_path),
+               {"auto_primary": {c["id"]: c["primary_version_id"] for c in canonical}}, atomic=True)
+
+def _pick_primary(ids: List[str], fresh: Dict[str, dict], current: Optional[str]) -> str:
+    # Same preference as pipeline.dedupe.pick_primary, judged on what the delta carries
+    for vid in ids:
+        if vid.startswith("iba::"):
+            return vid
+    if current in ids:
+        return current
+    if fresh:
+        return max(fresh.values(), key=lambda v: len(v.get("instructions") or ""))["id"]
+    return ids[0]
@@ -0,0 +1,233 @@
+# pipeline/io.py
+"""
+Streaming JSON/JSONL helpers shared by every command.
+
+- readers are lazy generators, so callers only hold what they keep
+- writers buffer encoded lines and flush them in batches
+- orjson (or msgspec) is used when installed, stdlib json otherwise
+- *.gz and *.zst paths are (de)compressed transparently
+"""
+import dataclasses
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional
+from utils import metrics
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+try:
+    import msgspec as _msgspec
+except ImportError:
+    _msgspec = None
+
+try:  # ijson is optional; iter_json_array falls back to chunked raw_decode
+    import ijson as _ijson
+except ImportError:
+    _ijson = None
+
+if _orjson is not None:
+    BACKEND = "orjson"
+
+    def dumpb(obj: Any) -> bytes:
+        return _orjson.dumps(obj)
+
+    def loads(data):
+        return _orjson.loads(data)
+elif _msgspec is not None:
+    BACKEND = "msgspec"
+    _encoder = _msgspec.json.Encoder()
+    _decoder = _msgspec.json.Decoder()
+
+    def dumpb(obj: Any) -> bytes:
+        return _encoder.encode(obj)
+
+    def loads(data):
+        return _decoder.decode(data)
+else:
+    BACKEND = "json"
+
+    def dumpb(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+def _plain(obj: Any) -> Any:
+    # orjson/msgspec serialize dataclasses natively (and faster than asdict)
+    if BACKEND != "json" and dataclasses.is_dataclass(obj):
+        return obj
+    to_dict = getattr(obj, "to_dict", None)
+    return to_dict() if to_dict is not None else obj
+
+def open_binary(path, mode: str = "rb"):
+    """Open `path` for binary I/O, compressing by suffix (.gz, .zst)."""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError(f"{path}: reading/writing .zst needs the 'zstandard' package")
+        if "r" in mode:
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), 1 << 16)
+        return zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+    return open(path, mode)
+
+def temp_path(path: Path) -> Path:
+    """Where an atomic write of `path` goes first; keeps the compression suffix so open_binary still compresses."""
+    if path.suffix in (".gz", ".zst"):
+        return path.with_name(path.stem + ".tmp" + path.suffix)
+    return path.with_name(path.name + ".tmp")
+
+def iter_jsonl(path) -> Iterator[dict]:
+    """Yield one record per non-blank line of a (possibly compressed) JSONL file."""
+    with open_binary(path, "rb") as raw:
+        for line in raw:
+            if line.strip():
+                yield loads(line)
+
+def iter_jsonl_many(paths: Iterable) -> Iterator[dict]:
+    for p in paths:
+        yield from iter_jsonl(p)
+
+def iter_json_array(path, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Yield the elements of a top-level JSON array one at a time, holding only
+    the current element (plus one read chunk) in memory. Uses ijson when
+    installed, otherwise an incremental raw_decode over text chunks.
+    """
+    if _ijson is not None:
+        with open_binary(path, "rb") as raw:
+            yield from _ijson.items(raw, "item", use_float=True)
+        return
+    decoder = json.JSONDecoder()
+    with io.TextIOWrapper(open_binary(path, "rb"), encoding="utf-8") as f:
+        buf, pos, eof = "", 0, False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        skip_ws()
+        if buf[pos:pos + 1] != "[":
+            raise ValueError(f"{path}: expected a JSON array")
+        pos += 1
+        skip_ws()
+        if buf[pos:pos + 1] == "]":
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # a number cut by the chunk boundary ("1.5e") decodes as a shorter one
+                if (not eof and type(item) in (int, float)
+                        and not buf[end:].lstrip(" \t\r\n")[:1] in (",", "]")):
+                    raise json.JSONDecodeError("incomplete number", buf, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            yield item
+            pos = end
+            skip_ws()
+            c = buf[pos:pos + 1]
+            if c == "]":
+                return
+            if not c:
+                raise ValueError(f"{path}: truncated JSON array")
+            if c != ",":
+                raise ValueError(f"{path}: expected ',' or ']' at offset {pos} of the current chunk")
+            pos += 1
+            skip_ws()
+
+class JsonlWriter:
+    """
+    Buffered JSONL writer. Records (dicts, dataclasses or objects with
+    to_dict()) are encoded as they arrive and written `batch_size` at a time.
+    With atomic=True the file is written next to `path` and renamed on close.
+    """
+
+    def __init__(self, path, batch_size: int = 1000, atomic: bool = False):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.count = 0
+        self._target = temp_path(self.path) if atomic else self.path
+        self._f = open_binary(self._target, "wb")
+        self._buf: List[bytes] = []
+
+    def write(self, obj: Any) -> None:
+        with metrics.timer("serialize"):
+            self._buf.append(dumpb(_plain(obj)))
+        self.count += 1
+        if len(self._buf) >= self.batch_size:
+            self.flush()
+
+    def write_raw(self, line: bytes) -> None:
+        """Write an already-encoded JSON line (without trailing newline)."""
+        self._buf.append(line.rstrip(b"\n"))
+        self.count += 1
+        if len(self._buf) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buf:
+            with metrics.timer("serialize"):
+                self._f.write(b"\n".join(self._buf) + b"\n")
+            self._buf = []
+
+    def close(self) -> None:
+        self.flush()
+        self._f.close()
+        if self._target != self.path:
+            os.replace(self._target, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+
+def write_jsonl(path, objs: Iterable[Any], batch_size: int = 1000) -> int:
+    with JsonlWriter(path, batch_size=batch_size) as w:
+        for o in objs:
+            w.write(o)
+    return w.count
+
+def read_json(path) -> Any:
+    with open_binary(path, "rb") as f:
+        return loads(f.read())
+
+def write_json(path, obj: Any, indent: Optional[int] = None, atomic: bool = False) -> None:
+    path = Path(path)
+    with metrics.timer("serialize"):
+        if indent:
+            data = json.dumps(obj, ensure_ascii=False, indent=indent).encode("utf-8")
+        else:
+            data = dumpb(obj)
+        target = temp_path(path) if atomic else path
+        with open_binary(target, "wb") as f:
+            f.write(data)
+        if atomic:
+            os.replace(target, path)
@@ -0,0 +1,108 @@
+# pipeline/normalize.py
+"""
+Ingredient normalization stage (between scraping and merging).
+
+Raw ingredient names are mapped to canonical ingredient ids:
+
+1. the slug of the raw name is looked up in the alias table
+   (utils/ingredient_aliases.json), then
+2. its set of core tokens -- filler words ("fresh", "squeezed", ...),
+   numbers and units removed, plurals folded -- is looked up in a
+   token-set table precomputed from the same aliases, then
+3. the core tokens themselves, in order, become the id.
+
+Lookups are memoized (LRU) since the same raw strings repeat across a corpus.
+The same stage attaches each ingredient's parsed measure (utils.measure) as
+its `quantity`.
+"""
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from utils.measure import parse_measure, quantity_dict
+from utils.text import slugify
+
+ALIASES_PATH = Path(__file__).resolve().parent.parent / "utils" / "ingredient_aliases.json"
+
+FILLER = frozenset(["fresh", "freshly", "squeezed", "of", "the", "a", "an", "chilled",
+                    "cold", "some", "top", "up", "with", "to", "taste", "for", "garnish", "optional"])
+UNITS = frozenset(["oz", "ml", "cl", "dl", "dash", "dashes", "drop", "drops", "splash", "tsp", "tbsp",
+                   "teaspoon", "teaspoons", "tablespoon", "tablespoons", "barspoon", "barspoons", "part",
+                   "parts", "shot", "shots", "cup", "cups", "pinch"])
+
+# singular words ending in "s" (-ss, -us and -is endings are never stripped either)
+NOT_PLURAL = frozenset(["calvados", "schnapps", "molasses", "jus", "pimms"])
+
+def _singular(t: str) -> str:
+    if len(t) > 3 and t.endswith("s") and not t.endswith(("ss", "us", "is")) and t not in NOT_PLURAL:
+        return t[:-1]
+    return t
+
+def core_tokens(slug: str) -> Tuple[str, ...]:
+    """Tokens of an ingredient slug that carry meaning, in their original order."""
+    out = []
+    for t in slug.split("_"):
+        if len(t) < 2 or t in FILLER or t in UNITS or t.isdigit():
+            continue
+        out.append(_singular(t))
+    return tuple(out)
+
+class IngredientNormalizer:
+    def __init__(self, table: Optional[Dict[str, dict]] = None, cache_size: int = 1 << 16):
+        if table is None:
+            table = json.loads(ALIASES_PATH.read_text(encoding="utf-8"))
+        self.names: Dict[str, str] = {}
+        self.by_slug: Dict[str, str] = {}
+        self.by_tokens: Dict[FrozenSet[str], str] = {}
+        for cid, entry in table.items():
+            if cid.startswith("_"):
+                continue
+            self.names[cid] = entry.get("name") or cid
+            for raw in [cid, entry.get("name") or ""] + list(entry.get("aliases", [])):
+                slug = slugify(raw)
+                if not slug:
+                    continue
+                self.by_slug.setdefault(slug, cid)
+                self.by_tokens.setdefault(frozenset(core_tokens(slug)), cid)
+        self.canonical_id = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, raw: str) -> str:
+        slug = slugify(raw)
+        cid = self.by_slug.get(slug)
+        if cid is not None:
+            return cid
+        toks = core_tokens(slug)
+        cid = self.by_tokens.get(frozenset(toks))
+        if cid is not None:
+            return cid
+        return "_".join(toks) or slug
+
+    def normalize_many(self, raws: Iterable[str]) -> List[str]:
+        f = self.canonical_id
+        return [f(r) for r in raws]
+
+    def normalize_version(self, v):
+        """Rewrite the ingredient ids (and quantities) of a RecipeVersion in place."""
+        for ing in v.ingredients or []:
+            if ing.name:
+                ing.id = self.canonical_id(ing.name)
+            ing.quantity = parse_measure(ing.measure)
+        return v
+
+    def normalize_version_dict(self, d: dict) -> dict:
+        for ing in d.get("ingredients") or []:
+            if ing.get("name"):
+                ing["id"] = self.canonical_id(ing["name"])
+            if type(ing.get("measure")) is list:
+                # older CocktailDB output wrapped each measure in a 1-element list
+                ing["measure"] = ing["measure"][0] if ing["measure"] else None
+            ing["quantity"] = quantity_dict(ing.get("measure"))
+        return d
+
+_DEFAULT = None
+
+def get_normalizer() -> IngredientNormalizer:
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = IngredientNormalizer()
+    return _DEFAULT
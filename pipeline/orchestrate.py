@@ -0,0 +1,113 @@
+# pipeline/orchestrate.py
+"""
+Scrape several sources at once, for `main.py run` (scrape -> merge -> pack).
+
+Each source runs on its own thread with its own scraper, so its session,
+delay and rate limiter are its own. The thread normalizes every version and
+checkpoints it to <outdir>/<source>.jsonl (pipeline.checkpoint, so
+`run --resume` resumes each source), then puts it on one bounded queue.
+ScrapeRun.versions() drains that queue on the caller's thread (into a
+VersionTable, in main.py) while the scrapers are still running, so merge and
+pack can start as soon as the slowest source ends. A full queue blocks the
+scrapers (backpressure) instead of growing memory.
+"""
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator
+from pipeline.checkpoint import ScrapeCheckpoint
+from pipeline.io import iter_jsonl
+from pipeline.normalize import get_normalizer
+
+QUEUE_SIZE = 1000
+
+class _Stopped(Exception):
+    pass
+
+class ScrapeRun:
+    """
+    `scrapers` maps source name -> scraper. After versions() is exhausted,
+    `results` holds per source: versions, seconds, the unresolved URLs and
+    the exception that stopped it (None when it finished).
+    """
+
+    def __init__(self, scrapers: Dict[str, object], outdir: Path, resume: bool = False, compress: str = "",
+                 queue_size: int = QUEUE_SIZE, checkpoint_every: int = 50, max_attempts: int = 3):
+        self.scrapers = scrapers
+        self.outdir = Path(outdir)
+        self.resume = resume
+        self.compress = compress
+        self.checkpoint_every = checkpoint_every
+        self.max_attempts = max_attempts
+        self.results: Dict[str, dict] = {}
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+
+    def path(self, name: str) -> Path:
+        return self.outdir / f"{name}.jsonl{self.compress}"
+
+    def _put(self, item) -> None:
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _scrape(self, name: str, scraper) -> None:
+        t = time.perf_counter()
+        result = self.results[name] = {"versions": 0, "seconds": 0.0, "unresolved": [], "error": None}
+        checkpoint = None
+        normalizer = get_normalizer()
+        try:
+            checkpoint = ScrapeCheckpoint(self.path(name), resume=self.resume, every=self.checkpoint_every,
+                                          max_attempts=self.max_attempts)
+            scraper.checkpoint = checkpoint
+            if checkpoint.resumed:  # what the interrupted run already wrote goes downstream too
+                for d in iter_jsonl(checkpoint.part_path):
+                    self._put(d)
+                    result["versions"] += 1
+            for v in scraper.iter_recipes():
+                v = normalizer.normalize_version(v)
+                checkpoint.write(v)
+                self._put(v.to_dict())
+                result["versions"] += 1
+            checkpoint.finish()
+            result["unresolved"] = checkpoint.unresolved()
+            checkpoint = None
+        except BaseException as e:
+            result["error"] = e
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()  # resumable
+            result["seconds"] = time.perf_counter() - t
+            self._queue.put((None, name))  # always delivered: the consumer drains until every source ends
+
+    def versions(self) -> Iterator[dict]:
+        """Version dicts from every source, in arrival order."""
+        threads = [threading.Thread(target=self._scrape, args=(name, s), name=f"scrape-{name}", daemon=True)
+                   for name, s in self.scrapers.items()]
+        for th in threads:
+            th.start()
+        running = len(threads)
+        try:
+            while running:
+                item = self._queue.get()
+                if type(item) is tuple:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            if running:  # consumer gave up: stop the scrapers and let them checkpoint
+                self._stop.set()
+                while running:
+                    if type(self._queue.get()) is tuple:
+                        running -= 1
+            for th in threads:
+                th.join()
+
+    def failed(self) -> Dict[str, BaseException]:
+        return {name: r["error"] for name, r in self.results.items() if r["error"] is not None}
@@ -0,0 +1,177 @@
+# pipeline/packdiff.py
+"""
+Deltas between pack builds, for `pack --since <previous manifest.json>`.
+
+build_pack hashes every cocktail and version record (pack["hashes"]).
+publish() adds one hash per index artifact, writes the maps as a
+content-addressed hashes.<sha>.json and stamps the manifest with:
+
+    "build":  hash of all of the above (equal builds have equal ids)
+    "hashes": {"path", "sha256", ...} of that file
+    "deltas": [{"from", "to", "path", "sha256", "bytes", "counts", ...}, ...]
+
+Given the previous build, the maps are compared with one dict lookup per
+record (linear time). Only what changed goes into a delta, written as a
+content-addressed deltas/<from>-<to>.<sha>.json with .gz/.br siblings:
+
+    {"format": "pack-delta", "from": <build>, "to": <build>,
+     "cocktails": {"upsert": {id: record}, "delete": [id]},
+     "versions":  {"upsert": {id: record}, "delete": [id]},
+     "order": [cocktail ids],     # only when pack["cocktails"] order changed
+     "ingredients": {"upsert": {id: entry}, "delete": [id]},
+     "postings": {"meta": {...}, "upsert": {ingredient id: gaps}, "delete": [id]},
+     "search": {"meta": {...}, "upsert": {term: [docs, weights]}, "delete": [term]}}
+
+The index sections are only present when something in them changed, and
+are diffed per ingredient / per term like the records. Postings and search
+postings refer to cocktails by position, so a change in `order` touches
+most of them; edits in place touch only their own terms. The chain keeps
+the last `keep` deltas. A client on build B applies every entry from the
+one whose "from" is B to the end (apply_delta), or downloads the full pack
+when B is not in the chain.
+"""
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from pipeline.export_pack import _write_blob, record_hash
+from pipeline.io import read_json, write_json
+from pipeline.search import shard_key
+
+DELTA_FORMAT = "pack-delta"
+KEEP_DELTAS = 10
+
+def _search_meta(search: dict) -> dict:
+    return {k: v for k, v in search.items() if k != "shards"}
+
+def _search_terms(search: dict) -> Dict[str, list]:
+    return {term: [shard["docs"][i], shard["weights"][i]]
+            for shard in search["shards"].values() for i, term in enumerate(shard["terms"])}
+
+def _postings_meta(postings: dict) -> dict:
+    return {k: v for k, v in postings.items() if k != "postings"}
+
+def pack_hashes(pack: dict) -> dict:
+    """pack["hashes"] plus per-entry hashes of the derived indexes."""
+    return dict(pack["hashes"], indexes={
+        "order": record_hash([c["id"] for c in pack["cocktails"]]),
+        "ingredients": {iid: record_hash(e) for iid, e in pack["ingredients"].items()},
+        "postings_meta": record_hash(_postings_meta(pack["postings"])),
+        "postings": {iid: record_hash(gaps) for iid, gaps in pack["postings"]["postings"].items()},
+        "search_meta": record_hash(_search_meta(pack["search"])),
+        "search": {term: record_hash(p) for term, p in _search_terms(pack["search"]).items()},
+    })
+
+def diff_hashes(old: Dict[str, str], new: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """(ids added or changed, ids removed)."""
+    return [k for k, h in new.items() if old.get(k) != h], [k for k in old if k not in new]
+
+def load_build(manifest_path: str) -> dict:
+    """
+    A previous build's manifest with its hash maps under "_hashes" (None
+    when that build was published before record hashes existed).
+    """
+    path = Path(manifest_path)
+    manifest = read_json(path)
+    ref = manifest.get("hashes")
+    manifest["_hashes"] = read_json(path.parent / ref["path"]) if ref else None
+    manifest["_dir"] = path.parent
+    return manifest
+
+def make_delta(old: dict, new: dict, pack: dict) -> dict:
+    """The delta from the build hashed `old` to `pack` (hashed `new`)."""
+    cocktails = {c["id"]: c for c in pack["cocktails"]}
+    delta: dict = {}
+    for kind, records in (("cocktails", cocktails), ("versions", pack["versions"])):
+        upsert, delete = diff_hashes(old[kind], new[kind])
+        delta[kind] = {"upsert": {rid: records[rid] for rid in upsert}, "delete": delete}
+    was, now = old["indexes"], new["indexes"]
+    if was["order"] != now["order"]:
+        delta["order"] = list(cocktails)
+    sections = (
+        ("ingredients", None, lambda: pack["ingredients"], None),
+        ("postings", "postings_meta", lambda: pack["postings"]["postings"], lambda: _postings_meta(pack["postings"])),
+        ("search", "search_meta", lambda: _search_terms(pack["search"]), lambda: _search_meta(pack["search"])),
+    )
+    for name, meta_key, entries, meta in sections:
+        upsert, delete = diff_hashes(was[name], now[name])
+        if upsert or delete or (meta_key and was[meta_key] != now[meta_key]):
+            current = entries()
+            delta[name] = {"upsert": {k: current[k] for k in upsert}, "delete": delete}
+            if meta:
+                delta[name]["meta"] = meta()
+    return delta
+
+def apply_delta(pack: dict, delta: dict) -> dict:
+    """
+    Client side, on a pack dict shaped like build_pack's (cocktails list,
+    versions, ingredients, postings, search): returns the next build's.
+    """
+    cocktails = {c["id"]: c for c in pack["cocktails"]}
+    versions = dict(pack["versions"])
+    for records, change in ((cocktails, delta["cocktails"]), (versions, delta["versions"])):
+        for rid in change["delete"]:
+            records.pop(rid, None)
+        records.update(change["upsert"])
+    order = delta.get("order") or list(cocktails)
+    out = dict(pack, cocktails=[cocktails[cid] for cid in order], versions=versions)
+    if "ingredients" in delta:
+        out["ingredients"] = _patched(pack["ingredients"], delta["ingredients"])
+    if "postings" in delta:
+        change = delta["postings"]
+        out["postings"] = dict(change["meta"], postings=_patched(pack["postings"]["postings"], change))
+    if "search" in delta:
+        change = delta["search"]
+        terms = _patched(_search_terms(pack["search"]), change)
+        shards: Dict[str, dict] = {}
+        for term in sorted(terms):
+            shard = shards.setdefault(shard_key(term), {"terms": [], "docs": [], "weights": []})
+            shard["terms"].append(term)
+            shard["docs"].append(terms[term][0])
+            shard["weights"].append(terms[term][1])
+        out["search"] = dict(change["meta"], shards=shards)
+    return out
+
+def _patched(entries: dict, change: dict) -> dict:
+    delete = set(change["delete"])
+    entries = {k: v for k, v in entries.items() if k not in delete}
+    entries.update(change["upsert"])
+    return entries
+
+def _copy_blob(src: Path, dst: Path, rel: str) -> None:
+    # a chained delta from another output directory
+    for suffix in ("", ".gz", ".br"):
+        s, d = src / (rel + suffix), dst / (rel + suffix)
+        if s.exists() and not d.exists():
+            d.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(s, d)
+
+def publish(pack: dict, outdir: str, previous: Optional[dict] = None, keep: int = KEEP_DELTAS) -> dict:
+    """
+    Stamp <outdir>/manifest.json (already written by a pack writer) with
+    the build id and hash maps; with `previous` (load_build), also write
+    the delta from it and extend its chain.
+    """
+    out = Path(outdir)
+    hashes = pack_hashes(pack)
+    build = record_hash(hashes)
+    manifest = read_json(out / "manifest.json")
+    manifest["build"] = build
+    manifest["hashes"] = _write_blob(out, "hashes", hashes)
+    chain: List[dict] = []
+    if previous is not None and previous.get("_hashes") is not None:
+        chain = list(previous.get("deltas") or [])
+        if previous["build"] != build:
+            delta = make_delta(previous["_hashes"], hashes, pack)
+            entry = _write_blob(out, f"deltas/{previous['build']}-{build}",
+                                dict(delta, format=DELTA_FORMAT, **{"from": previous["build"], "to": build}))
+            entry.update({"from": previous["build"], "to": build, "counts": {
+                kind: {"upsert": len(delta[kind]["upsert"]), "delete": len(delta[kind]["delete"])}
+                for kind in ("cocktails", "versions")}})
+            chain.append(entry)
+        chain = chain[-keep:] if keep > 0 else []
+        if Path(previous["_dir"]).resolve() != out.resolve():
+            for entry in chain:
+                _copy_blob(Path(previous["_dir"]), out, entry["path"])
+    manifest["deltas"] = chain
+    write_json(out / "manifest.json", manifest, indent=2, atomic=True)
+    return manifest
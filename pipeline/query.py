@@ -0,0 +1,135 @@
+# pipeline/query.py
+"""
+"What can I make" queries over a pack's ingredient postings.
+
+Every ingredient's posting list becomes a bitset (a Python int, bit i set
+when cocktail i uses it), so has-all / has-any are a handful of big-int
+AND/OR operations. Makeable-with-N-missing keeps per-cocktail ingredient
+counts as bit-sliced counters (plane k holds bit k of every count) and
+compares them lane-wise, so its cost depends on the size of the bar and not
+on the number of cocktails.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from pipeline.binpack import BinaryPack
+from pipeline.io import read_json
+
+# set bit positions of every byte value
+_BYTE_BITS = [[j for j in range(8) if b >> j & 1] for b in range(256)]
+
+def decode_postings(gaps: List[int]) -> List[int]:
+    out = []
+    i = 0
+    for g in gaps:
+        i += g
+        out.append(i)
+    return out
+
+def _bitset(indices: Iterable[int], n: int) -> int:
+    buf = bytearray((n + 7) // 8)
+    for i in indices:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+def bits_to_indices(bits: int) -> List[int]:
+    out = []
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for pos, b in enumerate(data):
+        if b:
+            base = pos << 3
+            out.extend(base + j for j in _BYTE_BITS[b])
+    return out
+
+def _add(planes: List[int], x: int) -> None:
+    """Bit-sliced increment: add 1 to every lane whose bit is set in x."""
+    for k in range(len(planes)):
+        if not x:
+            return
+        planes[k], x = planes[k] ^ x, planes[k] & x
+    if x:
+        planes.append(x)
+
+class IngredientQuery:
+    def __init__(self, postings: dict, ids: Optional[List[str]] = None):
+        if postings.get("encoding") != "delta":
+            raise ValueError(f"unsupported postings encoding: {postings.get('encoding')}")
+        self.n = postings["cocktails"]
+        self.ids = ids if ids is not None else postings.get("ids")
+        self.all = (1 << self.n) - 1
+        self.bits: Dict[str, int] = {
+            iid: _bitset(decode_postings(gaps), self.n) for iid, gaps in postings["postings"].items()
+        }
+        # number of ingredients per cocktail, bit-sliced
+        self.total: List[int] = []
+        for b in self.bits.values():
+            _add(self.total, b)
+        self.nonempty = 0
+        for plane in self.total:
+            self.nonempty |= plane
+
+    @classmethod
+    def load(cls, outdir: str) -> "IngredientQuery":
+        """Load from a pack build directory (v1 postings.json, v2 or binary manifest)."""
+        out = Path(outdir)
+        manifest = read_json(out / "manifest.json")
+        if manifest.get("format") == "binary":
+            with BinaryPack(out / manifest["file"]) as pack:
+                return cls(pack.get("meta", "postings"))
+        files = manifest.get("files")
+        if files and "postings" in files:
+            return cls(read_json(out / files["postings"]["path"]))
+        postings = read_json(out / "postings.json")
+        ids = [c["id"] for c in read_json(out / "cocktails.json")]
+        return cls(postings, ids)
+
+    def has_all(self, ingredient_ids: Iterable[str]) -> int:
+        acc = self.all
+        for iid in ingredient_ids:
+            acc &= self.bits.get(iid, 0)
+            if not acc:
+                break
+        return acc
+
+    def has_any(self, ingredient_ids: Iterable[str]) -> int:
+        acc = 0
+        for iid in ingredient_ids:
+            acc |= self.bits.get(iid, 0)
+        return acc
+
+    def makeable(self, bar: Iterable[str], missing: int = 0) -> int:
+        """Cocktails needing at most `missing` ingredients that are not in `bar`."""
+        have: List[int] = []
+        for iid in set(bar):
+            b = self.bits.get(iid)
+            if b:
+                _add(have, b)
+        # lanes where total - have <= missing, i.e. NOT (total - have > missing)
+        width = max(len(self.total), missing.bit_length())
+        mask = self.all
+        borrow = 0
+        gt, eq = 0, mask
+        diff = []
+        for k in range(width):
+            t = self.total[k] if k < len(self.total) else 0
+            h = have[k] if k < len(have) else 0
+            diff.append(t ^ h ^ borrow)
+            borrow = ((~t & mask) & (h | borrow)) | (t & h & borrow)
+        for k in reversed(range(width)):
+            d = diff[k]
+            if missing >> k & 1:
+                eq &= d
+            else:
+                gt |= eq & d
+                eq &= ~d & mask
+        return self.nonempty & ~gt & mask
+
+    def indices(self, bits: int) -> List[int]:
+        return bits_to_indices(bits)
+
+    def cocktail_ids(self, bits: int) -> List[str]:
+        return [self.ids[i] for i in bits_to_indices(bits)]
+
+    @staticmethod
+    def count(bits: int) -> int:
+        return bin(bits).count("1")
@@ -0,0 +1,328 @@
+# pipeline/search.py
+"""
+Full-text search over a pack's cocktails (type-ahead and search pages).
+
+Names, the primary recipe's ingredient names and its instructions are
+tokenized with slugify's NFKD/ASCII folding ("Crème de Cassis" -> creme, de,
+cassis). Each (term, cocktail) posting carries a precomputed BM25F weight --
+per-field term frequencies are length-normalized, boosted (name >
+ingredients > instructions) and combined before BM25 saturation -- so a
+query only adds up integers.
+
+The index is sharded by the first character of the term. Each shard holds a
+sorted term list (prefix lookups are a bisect) and, per term, its postings
+in impact order (highest weight first): weights scaled by SCALE and
+run-length encoded as [weight, count, ...], with the cocktail indices (into
+pack["cocktails"], as in the ingredient postings) ascending within each run.
+Impact order lets a one-word (type-ahead) query stop after `limit` postings
+and a multi-word query stop once no remaining posting can reach its top
+`limit`; sorted runs let a rare word probe a common one by bisection
+instead of decoding it. SearchIndex loads shards as queries touch them.
+"""
+import math
+from bisect import bisect_left
+from collections import OrderedDict
+from heapq import heappush, heapreplace, merge, nlargest
+from itertools import islice, repeat
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from pipeline.io import read_json
+from utils.text import slugify
+
+FIELD_BOOSTS = {"name": 3.0, "ingredients": 1.5, "instructions": 1.0}
+K1 = 1.2
+B = 0.75
+SCALE = 100  # weights are stored as round(weight * SCALE)
+MAX_EXPANSIONS = 32
+SMALL_PIVOT = 4096  # multi-word queries whose rarest token has fewer postings probe instead of walking
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [t for t in slugify(text or "").split("_") if t]
+
+def shard_key(term: str) -> str:
+    c = term[:1]
+    return c if "a" <= c <= "z" else "0"
+
+def _fields(cocktail: dict) -> Dict[str, List[str]]:
+    return {
+        "name": tokenize(cocktail.get("name")),
+        "ingredients": [t for ing in cocktail.get("ingredients") or [] for t in tokenize(ing.get("name"))],
+        "instructions": tokenize(cocktail.get("instructions")),
+    }
+
+def build_search_index(cocktails: List[dict], boosts: Optional[Dict[str, float]] = None) -> dict:
+    """BM25F index over `cocktails` (pack["cocktails"] order), split into shards."""
+    boosts = boosts or FIELD_BOOSTS
+    docs = [_fields(c) for c in cocktails]
+    n = len(docs)
+    avg = {f: (sum(len(d[f]) for d in docs) / n if n else 0.0) or 1.0 for f in boosts}
+
+    # term -> [(doc, length-normalized boosted tf)]
+    postings: Dict[str, List[Tuple[int, float]]] = {}
+    for i, fields in enumerate(docs):
+        tf: Dict[str, float] = {}
+        for f, boost in boosts.items():
+            tokens = fields[f]
+            if not tokens:
+                continue
+            w = boost / (1 - B + B * len(tokens) / avg[f])
+            for t in tokens:
+                tf[t] = tf.get(t, 0.0) + w
+        for t, x in tf.items():
+            postings.setdefault(t, []).append((i, x))
+
+    shards: Dict[str, dict] = {}
+    for term in sorted(postings):
+        plist = postings[term]
+        idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+        scored = sorted(((max(1, round(idf * x * (K1 + 1) / (x + K1) * SCALE)), d) for d, x in plist),
+                        key=lambda wd: (-wd[0], wd[1]))
+        docs: List[int] = []
+        runs: List[int] = []
+        for w, d in scored:
+            if not runs or runs[-2] != w:
+                runs += [w, 0]
+            runs[-1] += 1
+            docs.append(d)
+        shard = shards.setdefault(shard_key(term), {"terms": [], "docs": [], "weights": []})
+        shard["terms"].append(term)
+        shard["docs"].append(docs)
+        shard["weights"].append(runs)
+    return {"encoding": "impact-runs", "scoring": "bm25f", "k1": K1, "b": B, "scale": SCALE,
+            "boosts": dict(boosts), "cocktails": n, "terms": len(postings), "shards": shards}
+
+def search_meta(index: dict) -> dict:
+    """The index without its shards (what a loader reads first)."""
+    meta = {k: v for k, v in index.items() if k != "shards"}
+    meta["shards"] = {key: {"terms": len(s["terms"])} for key, s in index["shards"].items()}
+    return meta
+
+def iter_postings(shard: dict, i: int) -> Iterator[Tuple[int, int]]:
+    """(cocktail index, scaled weight) of term i of a shard, highest weight first."""
+    docs = shard["docs"][i]
+    runs = shard["weights"][i]
+    start = 0
+    for r in range(0, len(runs), 2):
+        end = start + runs[r + 1]
+        for d in docs[start:end]:
+            yield d, runs[r]
+        start = end
+
+def weights_of(shard: dict, i: int) -> List[int]:
+    """Term i's weights expanded to one per posting (parallel to shard["docs"][i])."""
+    runs = shard["weights"][i]
+    out: List[int] = []
+    for r in range(0, len(runs), 2):
+        out.extend(repeat(runs[r], runs[r + 1]))
+    return out
+
+def probe(shard: dict, i: int, doc: int) -> int:
+    """Term i's weight in `doc` (0 if absent): a bisect per weight run."""
+    docs = shard["docs"][i]
+    runs = shard["weights"][i]
+    start = 0
+    for r in range(0, len(runs), 2):
+        end = start + runs[r + 1]
+        j = bisect_left(docs, doc, start, end)
+        if j < end and docs[j] == doc:
+            return runs[r]
+        start = end
+    return 0
+
+class _Token:
+    """One query token: the (shard, term number) pairs it expands to."""
+    __slots__ = ("terms", "df", "max_weight")
+
+    def __init__(self, terms: List[Tuple[dict, int]]):
+        self.terms = terms
+        self.df = sum(len(shard["docs"][i]) for shard, i in terms)
+        self.max_weight = max((shard["weights"][i][0] for shard, i in terms), default=0)
+
+    def top(self, limit: int) -> List[Tuple[int, int]]:
+        """Best `limit` (doc, weight), reading at most `limit` postings per expansion."""
+        if len(self.terms) == 1:
+            return list(islice(iter_postings(*self.terms[0]), limit))
+        best: Dict[int, int] = {}
+        for shard, i in self.terms:
+            for d, w in islice(iter_postings(shard, i), limit):
+                if w > best.get(d, 0):
+                    best[d] = w
+        return nlargest(limit, best.items(), key=lambda dw: (dw[1], -dw[0]))
+
+    def ranked(self) -> Iterator[Tuple[int, int]]:
+        """Every (doc, best weight) lazily, highest weight first."""
+        if len(self.terms) == 1:
+            yield from iter_postings(*self.terms[0])
+            return
+        seen = set()
+        for d, w in merge(*(iter_postings(shard, i) for shard, i in self.terms), key=lambda dw: -dw[1]):
+            if d not in seen:
+                seen.add(d)
+                yield d, w
+
+class SearchIndex:
+    """
+    Query side. `load_shard(key)` returns one shard dict. Parsed query tokens
+    are kept in an LRU of `cache_size` entries, and the doc -> weight maps
+    multi-word queries probe in another, bounded by `cache_postings` entries
+    in total, so the popular terms are decoded once.
+    """
+
+    def __init__(self, meta: dict, load_shard: Callable[[str], dict], ids: Optional[List[str]] = None,
+                 cache_size: int = 4096, cache_postings: int = 2_000_000):
+        if meta.get("encoding") != "impact-runs":
+            raise ValueError(f"unsupported search index encoding: {meta.get('encoding')}")
+        self.meta = meta
+        self.ids = ids if ids is not None else meta.get("ids")
+        self.scale = meta.get("scale", SCALE)
+        self.cache_size = cache_size
+        self.cache_postings = cache_postings
+        self._load_shard = load_shard
+        self._shards: Dict[str, Optional[dict]] = {}
+        self._tokens: "OrderedDict[Tuple[str, bool], _Token]" = OrderedDict()
+        self._lookups: "OrderedDict[Tuple[int, int], Dict[int, int]]" = OrderedDict()
+        self._cached_postings = 0
+
+    @classmethod
+    def from_index(cls, index: dict, ids: Optional[List[str]] = None) -> "SearchIndex":
+        return cls(search_meta(index), index["shards"].__getitem__, ids)
+
+    @classmethod
+    def load(cls, outdir: str) -> "SearchIndex":
+        """Load from a pack build directory (v1 search.json, v2 or binary manifest)."""
+        out = Path(outdir)
+        manifest = read_json(out / "manifest.json")
+        if manifest.get("format") == "binary":
+            from pipeline.binpack import BinaryPack  # binpack writes the index, so import it late
+            pack = BinaryPack(out / manifest["file"])  # kept open (mmapped) while shards are read
+            return cls(pack.get("meta", "search"), lambda key: pack.get("search", key))
+        files = manifest.get("files")
+        meta = read_json(out / (files["search"]["path"] if files else "search.json"))
+        return cls(meta, lambda key: read_json(out / meta["shards"][key]["path"]))
+
+    def _shard(self, key: str) -> Optional[dict]:
+        if key not in self._shards:
+            self._shards[key] = self._load_shard(key) if key in self.meta["shards"] else None
+        return self._shards[key]
+
+    def terms(self, prefix: str) -> List[str]:
+        """Indexed terms starting with `prefix`, in order."""
+        shard = self._shard(shard_key(prefix))
+        if shard is None:
+            return []
+        terms = shard["terms"]
+        out = []
+        for i in range(bisect_left(terms, prefix), len(terms)):
+            if not terms[i].startswith(prefix):
+                break
+            out.append(terms[i])
+        return out
+
+    def _token(self, token: str, prefix: bool) -> _Token:
+        key = (token, prefix)
+        hit = self._tokens.get(key)
+        if hit is not None:
+            self._tokens.move_to_end(key)
+            return hit
+        picked: List[int] = []
+        shard = self._shard(shard_key(token))
+        if shard is not None:
+            terms = shard["terms"]
+            lo = bisect_left(terms, token)
+            if prefix:
+                hi = lo
+                while hi < len(terms) and terms[hi].startswith(token):
+                    hi += 1
+                # most frequent expansions first; the exact term always counts
+                picked = sorted(range(lo, hi), key=lambda i: -len(shard["docs"][i]))[:MAX_EXPANSIONS]
+                if lo < hi and terms[lo] == token and lo not in picked:
+                    picked.append(lo)
+            elif lo < len(terms) and terms[lo] == token:
+                picked = [lo]
+        hit = _Token([(shard, i) for i in picked])
+        if self.cache_size:
+            self._tokens[key] = hit
+            if len(self._tokens) > self.cache_size:
+                self._tokens.popitem(last=False)
+        return hit
+
+    def _lookup(self, shard: dict, i: int) -> Dict[int, int]:
+        """doc -> weight for one term."""
+        key = (id(shard), i)
+        m = self._lookups.get(key)
+        if m is not None:
+            self._lookups.move_to_end(key)
+            return m
+        m = dict(zip(shard["docs"][i], weights_of(shard, i)))
+        if len(m) <= self.cache_postings:
+            self._lookups[key] = m
+            self._cached_postings += len(m)
+            while self._cached_postings > self.cache_postings:
+                self._cached_postings -= len(self._lookups.popitem(last=False)[1])
+        return m
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True) -> List[Tuple[int, float]]:
+        """
+        (cocktail index, score) for cocktails matching every query token, best
+        first. With prefix=True the last token also matches longer terms
+        (type-ahead: "marg" finds margarita).
+        """
+        words = tokenize(query)
+        if not words or limit <= 0:
+            return []
+        tokens = [self._token(t, prefix and i == len(words) - 1) for i, t in enumerate(words)]
+        if any(not t.terms for t in tokens):
+            return []
+        if len(tokens) == 1:
+            return [(d, w / self.scale) for d, w in tokens[0].top(limit)]
+
+        tokens.sort(key=lambda t: t.df)
+        if tokens[0].df <= SMALL_PIVOT:
+            return self._intersect(tokens, limit)
+
+        # walk the rarest token in impact order, look the others up, stop once
+        # its weight plus the others' best possible weights can't make the top
+        pivot, rest = tokens[0], tokens[1:]
+        lookups = [[self._lookup(shard, i) for shard, i in t.terms] for t in rest]
+        rest_max = sum(t.max_weight for t in rest)
+        heap: List[Tuple[int, int]] = []  # (score, -doc): min-heap of the current top `limit`
+        for d, w in pivot.ranked():
+            if len(heap) == limit and w + rest_max <= heap[0][0]:
+                break
+            for maps in lookups:
+                x = max(m.get(d, 0) for m in maps) if len(maps) > 1 else maps[0].get(d, 0)
+                if not x:
+                    break
+                w += x
+            else:
+                if len(heap) < limit:
+                    heappush(heap, (w, -d))
+                elif (w, -d) > heap[0]:
+                    heapreplace(heap, (w, -d))
+        return [(-nd, w / self.scale) for w, nd in sorted(heap, reverse=True)]
+
+    def _intersect(self, tokens: List[_Token], limit: int) -> List[Tuple[int, float]]:
+        """AND of tokens (rarest first) by narrowing the rarest token's documents."""
+        cand: Dict[int, int] = {}
+        for d, w in tokens[0].ranked():
+            cand.setdefault(d, w)
+        for t in tokens[1:]:
+            best: Dict[int, int] = {}
+            for shard, i in t.terms:
+                docs = shard["docs"][i]
+                runs = len(shard["weights"][i]) // 2
+                # bisect each candidate through the runs, or intersect in C when that is cheaper
+                hits = cand if len(cand) * runs < len(docs) else cand.keys() & docs
+                for d in hits:
+                    x = probe(shard, i, d)
+                    if x > best.get(d, 0):
+                        best[d] = x
+            cand = {d: cand[d] + x for d, x in best.items()}
+            if not cand:
+                return []
+        top = nlargest(limit, cand.items(), key=lambda dw: (dw[1], -dw[0]))
+        return [(d, w / self.scale) for d, w in top]
+
+    def search_ids(self, query: str, limit: int = 10, prefix: bool = True) -> List[Tuple[str, float]]:
+        return [(self.ids[d], s) for d, s in self.search(query, limit, prefix)]
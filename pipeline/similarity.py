@@ -0,0 +1,140 @@
+# pipeline/similarity.py
+"""
+Near-duplicate recipe versions (same drink, trivially different measures or
+wording), for pipeline.dedupe.
+
+Each version gets two signatures:
+
+- MinHash (NUM_PERM values) of its ingredient-id set
+- SimHash (64 bits) of its instructions, tokenized like pipeline.search
+
+Both are built from per-token rows cached per distinct ingredient id or
+instruction word (small vocabularies): a MinHash is an elementwise min over
+a few cached tuples, a SimHash one big-int sum of rows that hold the 64
+hash bits as 16-bit counters.
+
+near_duplicate_pairs() first pairs versions whose ingredient set and SimHash
+are identical with the first one seen. The remaining versions go through
+LSH: MinHash bands of ROWS values, one band at a time so only one bucket
+table is alive. Buckets larger than `max_bucket` are split by SimHash
+blocks; max_hamming + 1 blocks guarantee a near pair shares one. Every
+candidate is checked exactly (ingredient Jaccard and SimHash Hamming
+distance), so the LSH only decides which pairs get looked at: work grows
+with the number of versions, not its square.
+
+Recipe instructions are short: one changed word in a 25-word method moves
+the SimHash by ~5 bits, unrelated methods sit 16+ bits apart, hence the
+default of 10.
+"""
+import hashlib
+import random
+import struct
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+from pipeline.search import tokenize
+from utils import metrics
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_PERM)]
+_LANE = 16
+_LANES = struct.Struct("<64H")
+_MAX_TOKENS = (1 << _LANE) - 1
+
+def _hash64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+
+@lru_cache(maxsize=1 << 16)
+def _minhash_row(ingredient_id: str) -> Tuple[int, ...]:
+    x = _hash64(ingredient_id) % _PRIME
+    return tuple((a * x + b) % _PRIME for a, b in _PERMS)
+
+@lru_cache(maxsize=1 << 16)
+def _simhash_row(token: str) -> int:
+    # bit i of the token hash as a 16-bit lane of one int, so summing rows counts every bit at once
+    h = _hash64(token)
+    return sum(1 << (i * _LANE) for i in range(64) if h >> i & 1)
+
+def minhash(ingredient_ids: Iterable[str]) -> Optional[Tuple[int, ...]]:
+    rows = [_minhash_row(i) for i in ingredient_ids]
+    return tuple(map(min, zip(*rows))) if rows else None
+
+def simhash(text: Optional[str]) -> int:
+    return _simhash(tokenize(text))
+
+def _simhash(tokens: List[str]) -> int:
+    tokens = tokens[:_MAX_TOKENS]
+    if not tokens:
+        return 0
+    counts = _LANES.unpack(sum(map(_simhash_row, tokens)).to_bytes(_LANES.size, "little"))
+    half = len(tokens) / 2
+    return sum(1 << i for i, n in enumerate(counts) if n > half)
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def _split(members: List[str], simhashes: Dict[str, int], max_hamming: int, max_bucket: int) -> Iterator[List[str]]:
+    blocks = min(max_hamming + 1, 64)
+    width = 64 // blocks
+    for i in range(blocks):
+        sub: Dict[int, List[str]] = {}
+        for vid in members:
+            sub.setdefault(simhashes[vid] >> (i * width) & ((1 << width) - 1), []).append(vid)
+        for group in sub.values():
+            if len(group) > max_bucket:
+                metrics.incr("near_duplicate_buckets_skipped")
+            elif len(group) > 1:
+                yield group
+
+def near_duplicate_pairs(versions: Iterable, min_jaccard: float = 0.8, max_hamming: int = 10,
+                         max_bucket: int = 500) -> Iterator[Tuple[str, str]]:
+    """
+    (version id, version id) pairs of near-duplicate RecipeVersions (or
+    VersionRows): ingredient-id Jaccard >= min_jaccard and instruction
+    SimHashes at most `max_hamming` bits apart. Versions without ingredient
+    ids or instruction words are never paired. A pair may be yielded more
+    than once (feed them to a union-find).
+    """
+    exact: Dict[Tuple[int, FrozenSet[str]], str] = {}
+    ingredients: Dict[str, FrozenSet[str]] = {}
+    simhashes: Dict[str, int] = {}
+    bands: Dict[str, Tuple[int, ...]] = {}
+    for v in versions:
+        ids = frozenset(ing.id for ing in (v.ingredients or ()) if ing.id)
+        tokens = tokenize(v.instructions)
+        if not ids or not tokens:
+            continue  # nothing to compare: all such versions would look alike
+        s = _simhash(tokens)
+        first = exact.setdefault((s, ids), v.id)
+        if first != v.id:
+            yield first, v.id
+            continue
+        sig = minhash(ids)
+        ingredients[v.id] = ids
+        simhashes[v.id] = s
+        bands[v.id] = tuple(hash(sig[j * ROWS:(j + 1) * ROWS]) for j in range(BANDS))
+    del exact
+
+    checked = 0
+    for j in range(BANDS):
+        buckets: Dict[int, List[str]] = {}
+        for vid, keys in bands.items():
+            buckets.setdefault(keys[j], []).append(vid)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            groups = [members] if len(members) <= max_bucket else _split(members, simhashes, max_hamming, max_bucket)
+            for group in groups:
+                for i, a in enumerate(group):
+                    for b in group[i + 1:]:
+                        checked += 1
+                        if (hamming(simhashes[a], simhashes[b]) <= max_hamming
+                                and _jaccard(ingredients[a], ingredients[b]) >= min_jaccard):
+                            yield a, b
+    metrics.incr("near_duplicate_pairs_checked", checked)
@@ -0,0 +1,320 @@
+# pipeline/store.py
+"""
+SQLite store: one file holding recipe versions, their ingredients and
+attributions, and the canonical groupings, as an alternative to
+data/sources/*.jsonl + data/canonical.json.
+
+Selected on the command line with `--store sqlite:path`. Writes go through
+executemany in batched transactions (WAL mode), reads are indexed queries,
+and export_jsonl() writes the classic file layout back out.
+"""
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.table import VersionTable
+from pipeline.incremental import state_path
+from pipeline.io import JsonlWriter, dumpb, iter_jsonl, loads, write_json
+from pipeline.normalize import get_normalizer
+from utils.measure import quantity_dict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    pos INTEGER NOT NULL DEFAULT 0,
+    name TEXT NOT NULL,
+    name_slug TEXT,
+    instructions TEXT,
+    glass TEXT,
+    tags TEXT NOT NULL DEFAULT '[]',
+    image TEXT,
+    garnish TEXT,
+    method TEXT
+);
+CREATE INDEX IF NOT EXISTS versions_source ON versions(source, generation);
+CREATE INDEX IF NOT EXISTS versions_slug ON versions(name_slug);
+
+CREATE TABLE IF NOT EXISTS attributions (
+    version_id TEXT PRIMARY KEY,
+    source_name TEXT,
+    source_url TEXT,
+    author TEXT,
+    license TEXT,
+    fetched_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS version_ingredients (
+    version_id TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    ingredient_id TEXT,
+    name TEXT,
+    measure,
+    PRIMARY KEY (version_id, pos)
+);
+CREATE INDEX IF NOT EXISTS version_ingredients_ingredient ON version_ingredients(ingredient_id);
+
+CREATE TABLE IF NOT EXISTS ingredients (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS canonical (
+    id TEXT PRIMARY KEY,
+    pos INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    primary_version_id TEXT,
+    auto_primary TEXT,
+    aka TEXT NOT NULL DEFAULT '[]'
+);
+
+CREATE TABLE IF NOT EXISTS canonical_versions (
+    canonical_id TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    version_id TEXT NOT NULL,
+    PRIMARY KEY (canonical_id, pos)
+);
+CREATE INDEX IF NOT EXISTS canonical_versions_version ON canonical_versions(version_id);
+
+CREATE TABLE IF NOT EXISTS canonical_duplicates (
+    canonical_id TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    duplicate_of TEXT NOT NULL,
+    PRIMARY KEY (canonical_id, version_id)
+);
+"""
+
+VERSION_COLUMNS = ("id", "name", "name_slug", "instructions", "glass", "tags", "image", "garnish", "method")
+ATTRIBUTION_COLUMNS = ("source_name", "source_url", "author", "license", "fetched_at")
+
+def open_store(spec: str) -> "SqliteStore":
+    """Open a store from a `--store` value such as 'sqlite:data/cocktails.sqlite'."""
+    kind, _, path = spec.partition(":")
+    if kind != "sqlite" or not path:
+        raise ValueError(f"unsupported store {spec!r} (expected sqlite:<path>)")
+    return SqliteStore(path)
+
+class SqliteStore:
+    def __init__(self, path: str, batch_size: int = 1000):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        if "pos" not in {r[1] for r in self._db.execute("PRAGMA table_info(versions)")}:
+            # stores from before versions kept their write order read back by id
+            self._db.execute("ALTER TABLE versions ADD COLUMN pos INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS versions_pos ON versions(pos)")
+
+    @contextmanager
+    def _transaction(self):
+        self._db.execute("BEGIN")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def close(self):
+        self._db.close()
+
+    # -- versions ------------------------------------------------------------
+
+    def write_versions(self, versions: Iterable, source: str, replace: bool = False) -> int:
+        """
+        Upsert RecipeVersions (or their dicts) for `source`, one transaction
+        per batch. With replace=True, versions of `source` that were not
+        written by this call are deleted at the end, so an interrupted run
+        never loses the previous data.
+
+        Versions read back in the order they were written, like lines of a
+        JSONL file: an upsert keeps a version's place, a replacing write
+        puts the source in this call's order.
+        """
+        generation, pos = self._db.execute(
+            "SELECT COALESCE(MAX(generation), 0) + 1, COALESCE(MAX(pos), -1) + 1 FROM versions").fetchone()
+        normalizer = get_normalizer()
+        count = 0
+        batch: List[dict] = []
+        for v in versions:
+            batch.append(v if isinstance(v, dict) else v.to_dict())
+            if len(batch) >= self.batch_size:
+                count += self._write_batch(batch, source, generation, pos + count, not replace, normalizer.names)
+                batch = []
+        count += self._write_batch(batch, source, generation, pos + count, not replace, normalizer.names)
+        if replace:
+            with self._transaction() as db:
+                stale = "SELECT id FROM versions WHERE source = ? AND generation < ?"
+                db.execute(f"DELETE FROM attributions WHERE version_id IN ({stale})", (source, generation))
+                db.execute(f"DELETE FROM version_ingredients WHERE version_id IN ({stale})", (source, generation))
+                db.execute("DELETE FROM versions WHERE source = ? AND generation < ?", (source, generation))
+        return count
+
+    def _write_batch(self, batch: List[dict], source: str, generation: int, pos: int, keep_pos: bool,
+                     names: Dict[str, str]) -> int:
+        if not batch:
+            return 0
+        pos_sql = "COALESCE((SELECT pos FROM versions WHERE id = ?), ?)" if keep_pos else "?"
+        ids = [(d["id"],) for d in batch]
+        ings = [(d["id"], pos, i.get("id"), i.get("name"), i.get("measure"))
+                for d in batch for pos, i in enumerate(d.get("ingredients") or [])]
+        with self._transaction() as db:
+            db.executemany(
+                f"INSERT OR REPLACE INTO versions (pos, source, generation, {', '.join(VERSION_COLUMNS)}) "
+                f"VALUES ({pos_sql}, ?, ?, {', '.join('?' * len(VERSION_COLUMNS))})",
+                [((d["id"], pos + i) if keep_pos else (pos + i,)) + (source, generation, d["id"], d["name"], d.get("name_slug"), d.get("instructions"),
+                  d.get("glass"), dumpb(d.get("tags") or []).decode("utf-8"), d.get("image"),
+                  d.get("garnish"), d.get("method")) for i, d in enumerate(batch)])
+            db.executemany("DELETE FROM attributions WHERE version_id = ?", ids)
+            db.executemany(
+                "INSERT INTO attributions VALUES (?, ?, ?, ?, ?, ?)",
+                [(d["id"],) + tuple(d["attribution"].get(c) for c in ATTRIBUTION_COLUMNS)
+                 for d in batch if d.get("attribution")])
+            db.executemany("DELETE FROM version_ingredients WHERE version_id = ?", ids)
+            db.executemany("INSERT INTO version_ingredients VALUES (?, ?, ?, ?, ?)", ings)
+            db.executemany("INSERT OR IGNORE INTO ingredients VALUES (?, ?)",
+                           [(iid, names.get(iid) or name) for _, _, iid, name, _ in ings if iid])
+        return len(batch)
+
+    def remove_versions(self, ids: Iterable[str]) -> None:
+        rows = [(vid,) for vid in ids]
+        with self._transaction() as db:
+            db.executemany("DELETE FROM attributions WHERE version_id = ?", rows)
+            db.executemany("DELETE FROM version_ingredients WHERE version_id = ?", rows)
+            db.executemany("DELETE FROM versions WHERE id = ?", rows)
+
+    def sources(self) -> List[str]:
+        return [r[0] for r in self._db.execute("SELECT DISTINCT source FROM versions ORDER BY source")]
+
+    def iter_versions(self, source: Optional[str] = None, canonical_only: bool = False) -> Iterator[dict]:
+        """
+        RecipeVersion dicts in write order, optionally only those of `source`
+        or only those referenced by a canonical entry. Versions and their
+        ingredients are two index scans walked side by side.
+        """
+        where, params = [], []
+        if source is not None:
+            where.append("v.source = ?")
+            params.append(source)
+        if canonical_only:
+            where.append("v.id IN (SELECT version_id FROM canonical_versions)")
+        cond = f"WHERE {' AND '.join(where)}" if where else ""
+        vcols = ", ".join(f"v.{c}" for c in VERSION_COLUMNS)
+        acols = ", ".join(f"a.{c}" for c in ATTRIBUTION_COLUMNS)
+        versions = self._db.execute(
+            f"SELECT v.pos, {vcols}, a.version_id, {acols} FROM versions v "
+            f"LEFT JOIN attributions a ON a.version_id = v.id {cond} ORDER BY v.pos, v.id", params)
+        ings = self._db.cursor().execute(
+            "SELECT v.pos, i.version_id, i.ingredient_id, i.name, i.measure FROM version_ingredients i "
+            f"JOIN versions v ON v.id = i.version_id {cond} ORDER BY v.pos, v.id, i.pos", params)
+        pending = next(ings, None)
+        n = len(VERSION_COLUMNS) + 1
+        for row in versions:
+            key = row[:2]  # (pos, id): the order both scans walk in
+            d = dict(zip(VERSION_COLUMNS, row[1:n]))
+            d["tags"] = loads(d["tags"])
+            d["ingredients"] = []
+            while pending is not None and pending[:2] < key:
+                pending = next(ings, None)
+            while pending is not None and pending[:2] == key:
+                d["ingredients"].append({"id": pending[2], "name": pending[3], "measure": pending[4],
+                                         "quantity": quantity_dict(pending[4])})
+                pending = next(ings, None)
+            d["attribution"] = dict(zip(ATTRIBUTION_COLUMNS, row[n + 1:])) if row[n] is not None else None
+            yield _ordered(d)
+
+    def load_table(self, source: Optional[str] = None, canonical_only: bool = False) -> VersionTable:
+        return VersionTable.from_dicts(self.iter_versions(source, canonical_only))
+
+    def ingredient_names(self) -> Dict[str, str]:
+        return dict(self._db.execute("SELECT id, name FROM ingredients"))
+
+    # -- canonical -------------------------------------------------------------
+
+    def write_canonical(self, canonical: List[dict], auto_primary: Optional[Dict[str, str]] = None) -> None:
+        """Replace the canonical groupings; `auto_primary` is what merge picked (see pipeline.incremental)."""
+        if auto_primary is None:
+            auto_primary = {c["id"]: c.get("primary_version_id") for c in canonical}
+        with self._transaction() as db:
+            db.execute("DELETE FROM canonical")
+            db.execute("DELETE FROM canonical_versions")
+            db.execute("DELETE FROM canonical_duplicates")
+            db.executemany("INSERT INTO canonical VALUES (?, ?, ?, ?, ?, ?)",
+                           [(c["id"], pos, c["name"], c.get("primary_version_id"), auto_primary.get(c["id"]),
+                             dumpb(c.get("aka") or []).decode("utf-8")) for pos, c in enumerate(canonical)])
+            db.executemany("INSERT INTO canonical_versions VALUES (?, ?, ?)",
+                           [(c["id"], pos, vid) for c in canonical for pos, vid in enumerate(c["versions"])])
+            db.executemany("INSERT INTO canonical_duplicates VALUES (?, ?, ?)",
+                           [(c["id"], vid, rep) for c in canonical
+                            for rep, ids in (c.get("duplicates") or {}).items() for vid in ids])
+
+    def canonical(self) -> List[dict]:
+        """Canonical entries in merge order, shaped like canonical.json."""
+        members: Dict[str, List[str]] = {}
+        for cid, vid in self._db.execute("SELECT canonical_id, version_id FROM canonical_versions "
+                                         "ORDER BY canonical_id, pos"):
+            members.setdefault(cid, []).append(vid)
+        duplicates: Dict[str, Dict[str, List[str]]] = {}
+        for cid, vid, rep in self._db.execute("SELECT canonical_id, version_id, duplicate_of "
+                                              "FROM canonical_duplicates ORDER BY rowid"):
+            duplicates.setdefault(cid, {}).setdefault(rep, []).append(vid)
+        out = []
+        for cid, name, primary, aka in self._db.execute(
+                "SELECT id, name, primary_version_id, aka FROM canonical ORDER BY pos"):
+            c = {"id": cid, "name": name, "versions": members.get(cid, []), "primary_version_id": primary,
+                 "aka": loads(aka)}
+            if cid in duplicates:
+                c["duplicates"] = duplicates[cid]
+            out.append(c)
+        return out
+
+    def auto_primary(self) -> Dict[str, str]:
+        return {cid: p for cid, p in self._db.execute("SELECT id, auto_primary FROM canonical") if p}
+
+    def missing_versions(self) -> List[Tuple[str, str]]:
+        """(canonical id, version id) pairs whose version is not in the store."""
+        return self._db.execute(
+            "SELECT cv.canonical_id, cv.version_id FROM canonical_versions cv "
+            "LEFT JOIN versions v ON v.id = cv.version_id WHERE v.id IS NULL").fetchall()
+
+    # -- export ------------------------------------------------------------------
+
+    def export_jsonl(self, outdir: str, canonical_path: Optional[str] = None, compress: str = "") -> Dict[str, int]:
+        """Write <outdir>/<source>.jsonl per source (and canonical.json if a path is given)."""
+        out = Path(outdir)
+        out.mkdir(parents=True, exist_ok=True)
+        counts = {}
+        for source in self.sources():
+            with JsonlWriter(out / f"{source}.jsonl{compress}", atomic=True) as w:
+                for d in self.iter_versions(source):
+                    w.write(d)
+            counts[source] = w.count
+        if canonical_path:
+            canon = self.canonical()
+            write_json(canonical_path, canon, indent=2, atomic=True)
+            write_json(state_path(canonical_path), {"auto_primary": self.auto_primary()}, atomic=True)
+        return counts
+
+def _ordered(d: dict) -> dict:
+    # the key order of RecipeVersion.to_dict, so exports match scraped JSONL
+    return {"id": d["id"], "name": d["name"], "name_slug": d["name_slug"], "ingredients": d["ingredients"],
+            "instructions": d["instructions"], "glass": d["glass"], "tags": d["tags"], "image": d["image"],
+            "garnish": d["garnish"], "method": d["method"], "attribution": d["attribution"]}
+
+def import_jsonl(store: SqliteStore, paths: Iterable[str]) -> Dict[str, int]:
+    """
+    Load JSONL files into the store, with canonical ingredient ids; the
+    source name is the file name up to the first dot.
+    """
+    normalizer = get_normalizer()
+    counts = {}
+    for p in paths:
+        source = Path(p).name.split(".")[0]
+        versions = (normalizer.normalize_version_dict(d) for d in iter_jsonl(p))
+        counts[source] = store.write_versions(versions, source, replace=True)
+    return counts
@@ -0,0 +1,163 @@
+# pipeline/validate.py
+"""
+Streaming validation of canonical.json against the source JSONL files.
+
+Each file is read once, record by record: source files (in parallel, one
+process per file) for schema checks and the set of version ids, then
+canonical.json through iter_json_array for schema and referential checks.
+Memory is bounded by that id set, never by record bodies.
+
+Checks, reported under these codes:
+
+    bad_record          not a JSON object / missing or mistyped required field
+    bad_ingredient_id   ingredient id is not a slug ([a-z0-9] runs joined by '_')
+    duplicate_version   version id appears more than once across the sources
+    duplicate_canonical canonical id appears more than once
+    missing_version     canonical `versions` (or `duplicates`) entry not found in any source
+    bad_primary         primary_version_id missing from the sources or not in `versions`
+    orphan_version      source version not referenced by any canonical cocktail
+                        (collapsed near-duplicates count as referenced)
+
+The report is a plain dict (see Validator.report) so `validate --report`
+can write it as JSON.
+"""
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set
+from pipeline.io import iter_json_array, iter_jsonl
+
+INGREDIENT_ID_RE = re.compile(r"[a-z0-9]+(?:_[a-z0-9]+)*\Z")
+MAX_ISSUES = 100
+
+class Validator:
+    """Collects issues (the first `max_issues` of each code are kept, all are counted)."""
+
+    def __init__(self, max_issues: int = MAX_ISSUES):
+        self.max_issues = max_issues
+        self.issues: List[dict] = []
+        self.by_code: Dict[str, int] = {}
+        self.version_ids: Set[str] = set()
+        self.referenced: Set[str] = set()
+        self.files: Dict[str, List[str]] = {"canonical": [], "sources": []}
+        self.counts = {"canonical": 0, "versions": 0}
+        self.sources_checked = False
+
+    def issue(self, code: str, file: str, pos: int, rid: Optional[str] = None, detail: str = "") -> None:
+        n = self.by_code.get(code, 0)
+        self.by_code[code] = n + 1
+        if n < self.max_issues:
+            self.issues.append({"code": code, "file": file, "pos": pos, "id": rid, "detail": detail})
+
+    # -- sources -----------------------------------------------------------------
+
+    def check_versions(self, records: Iterable[dict], file: str) -> None:
+        """Schema-check source versions (pos is the 1-based line) and record their ids."""
+        self.sources_checked = True
+        self.files["sources"].append(file)
+        for pos, d in enumerate(records, 1):
+            self.counts["versions"] += 1
+            if not isinstance(d, dict) or not isinstance(d.get("id"), str) or not d["id"]:
+                self.issue("bad_record", file, pos, detail="version without a string id")
+                continue
+            vid = d["id"]
+            if vid in self.version_ids:
+                self.issue("duplicate_version", file, pos, vid)
+            self.version_ids.add(vid)
+            if not isinstance(d.get("name"), str) or not d["name"]:
+                self.issue("bad_record", file, pos, vid, "missing name")
+            ingredients = d.get("ingredients")
+            if not isinstance(ingredients, list):
+                self.issue("bad_record", file, pos, vid, "ingredients is not a list")
+                continue
+            for ing in ingredients:
+                iid = ing.get("id") if isinstance(ing, dict) else None
+                if not isinstance(iid, str) or not INGREDIENT_ID_RE.match(iid):
+                    self.issue("bad_ingredient_id", file, pos, vid, repr(iid))
+
+    def merge(self, other: "Validator") -> None:
+        """Fold a per-file Validator (from a worker) into this one."""
+        self.sources_checked = self.sources_checked or other.sources_checked
+        self.files["sources"].extend(other.files["sources"])
+        self.counts["versions"] += other.counts["versions"]
+        dupes = self.version_ids & other.version_ids
+        self.version_ids |= other.version_ids
+        for code, n in other.by_code.items():
+            kept = self.by_code.get(code, 0)
+            self.by_code[code] = kept + n
+            room = max(0, self.max_issues - kept)
+            self.issues.extend([i for i in other.issues if i["code"] == code][:room])
+        for vid in sorted(dupes):
+            self.issue("duplicate_version", other.files["sources"][-1], 0, vid, "also in another source file")
+
+    # -- canonical ---------------------------------------------------------------
+
+    def check_canonical(self, records: Iterable[dict], file: str) -> None:
+        """Schema- and reference-check canonical entries (pos is the 0-based array index)."""
+        self.files["canonical"].append(file)
+        seen: Set[str] = set()
+        for pos, c in enumerate(records):
+            self.counts["canonical"] += 1
+            if not isinstance(c, dict) or not isinstance(c.get("id"), str) or not c["id"]:
+                self.issue("bad_record", file, pos, detail="canonical entry without a string id")
+                continue
+            cid = c["id"]
+            if cid in seen:
+                self.issue("duplicate_canonical", file, pos, cid)
+            seen.add(cid)
+            if not isinstance(c.get("name"), str) or not c["name"]:
+                self.issue("bad_record", file, pos, cid, "missing name")
+            versions = c.get("versions")
+            if not isinstance(versions, list) or not versions:
+                self.issue("bad_record", file, pos, cid, "empty or missing versions")
+                continue
+            duplicates = c.get("duplicates") or {}
+            for vid in dict.fromkeys(versions + [d for ids in duplicates.values() for d in ids]):
+                self.referenced.add(vid)
+                if self.sources_checked and vid not in self.version_ids:
+                    self.issue("missing_version", file, pos, cid, vid)
+            primary = c.get("primary_version_id")
+            if primary is not None:
+                if primary not in versions:
+                    self.issue("bad_primary", file, pos, cid, f"{primary} is not one of its versions")
+                elif self.sources_checked and primary not in self.version_ids:
+                    self.issue("bad_primary", file, pos, cid, f"{primary} not in the sources")
+
+    def check_orphans(self) -> None:
+        if not self.sources_checked or not self.files["canonical"]:
+            return
+        for vid in sorted(self.version_ids - self.referenced):
+            self.issue("orphan_version", "", 0, vid)
+
+    def report(self) -> dict:
+        return {
+            "ok": not self.by_code,
+            "files": self.files,
+            "counts": dict(self.counts, referenced=len(self.referenced), issues=sum(self.by_code.values())),
+            "by_code": dict(sorted(self.by_code.items())),
+            "issues": self.issues,
+            "referential_checks": self.sources_checked,
+        }
+
+def _check_source(path: str, max_issues: int) -> Validator:
+    v = Validator(max_issues)
+    v.check_versions(iter_jsonl(path), path)
+    return v
+
+def validate_files(canonical_path: str, source_paths: List[str], workers: int = 0,
+                   max_issues: int = MAX_ISSUES) -> dict:
+    """
+    Validate canonical.json against the source JSONL files; with workers > 1
+    the source files are scanned on a process pool. Referential checks are
+    skipped when `source_paths` is empty.
+    """
+    v = Validator(max_issues)
+    if workers > 1 and len(source_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(source_paths))) as pool:
+            for part in pool.map(_check_source, source_paths, [max_issues] * len(source_paths)):
+                v.merge(part)
+    else:
+        for p in source_paths:
+            v.merge(_check_source(p, max_issues))
+    v.check_canonical(iter_json_array(canonical_path), str(canonical_path))
+    v.check_orphans()
+    return v.report()
@@ -1,23 +1,150 @@
 
-from typing import Iterator
+import inspect
+import sys
+from typing import Callable, Iterable, Iterator, List, TypeVar
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from app.models import RecipeVersion
 from abc import ABC, abstractmethod
+from importlib import import_module
+from utils import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 _REGISTRY = {}
 
+# name -> "module:Class", imported only when that source is asked for, so
+# commands that never scrape don't pay for bs4/requests at startup
+SOURCES = {
+    "iba": "scrapers.iba:IBAScraper",
+    "cocktaildb": "scrapers.cocktaildb:CocktailDbScraper",
+}
+# third-party sources: [project.entry-points."cocktail_ingest.sources"] name = "pkg.mod:Class"
+ENTRY_POINT_GROUP = "cocktail_ingest.sources"
+
 def register_source(name: str):
     def wrap(cls):
         _REGISTRY[name] = cls
         return cls
     return wrap
 
-def get_scraper(name: str, **kwargs):
+def _entry_points() -> dict:
+    from importlib.metadata import entry_points
+    try:
+        eps = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:  # Python < 3.10
+        eps = entry_points().get(ENTRY_POINT_GROUP, [])
+    return {ep.name: ep.value for ep in eps}
+
+def available_sources() -> list:
+    return sorted(set(_REGISTRY) | set(SOURCES) | set(_entry_points()))
+
+def _resolve(name: str):
     cls = _REGISTRY.get(name)
+    if cls is not None:
+        return cls
+    target = SOURCES.get(name) or _entry_points().get(name)
+    if target is None:
+        return None
+    module, _, attr = target.partition(":")
+    cls = getattr(import_module(module), attr)
+    _REGISTRY.setdefault(name, cls)
+    return cls
+
+def _accepted(cls, kwargs: dict) -> dict:
+    """`kwargs` minus the options `cls.__init__` does not take (all of them with **kwargs)."""
+    params = inspect.signature(cls.__init__).parameters.values()
+    if any(p.kind is p.VAR_KEYWORD for p in params):
+        return kwargs
+    names = {p.name for p in params if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)}
+    return {k: v for k, v in kwargs.items() if k in names}
+
+def get_scraper(name: str, **kwargs):
+    """
+    Instantiate a source. Options are keyword arguments (see SourceScraper);
+    those the source's constructor does not take are dropped with a warning,
+    so third-party scrapers need not accept every option `scrape` passes.
+    """
+    cls = _resolve(name)
     if not cls:
-        raise ValueError(f'Unknown source: {name}. Registered: {list(_REGISTRY.keys())}')
-    return cls(**kwargs)
+        raise ValueError(f'Unknown source: {name}. Registered: {available_sources()}')
+    accepted = _accepted(cls, kwargs)
+    ignored = sorted(k for k in kwargs if k not in accepted)
+    if ignored:
+        print(f"{name}: ignoring options it does not take: {', '.join(ignored)}", file=sys.stderr)
+    return cls(**accepted)
 
 class SourceScraper(ABC):
+    """
+    A recipe source. get_scraper() passes the command-line options as keyword
+    arguments, each only if the constructor takes it: delay, rate,
+    concurrency, cache (scrapers.cache.HttpCache), retries, backoff and
+    parse_workers -- see HttpScraper for their meaning.
+    """
+    # Optional pipeline.incremental.ScrapeState, set by `scrape --incremental`
+    tracker = None
+    # Optional pipeline.checkpoint.ScrapeCheckpoint, set by `scrape` (see --resume)
+    checkpoint = None
+
     @abstractmethod
     def iter_recipes(self) -> Iterator[RecipeVersion]:
         raise NotImplementedError
+
+    def _page_changed(self, url: str, body: str) -> bool:
+        """False when the tracker has seen this exact body before (skip parsing)."""
+        return self.tracker is None or self.tracker.page(url, body)
+
+    def _emitted(self, url: str, version: RecipeVersion) -> RecipeVersion:
+        if self.tracker is not None:
+            self.tracker.emit(url, version)
+        return version
+
+    def _todo(self, urls: Iterable[str]) -> List[str]:
+        """
+        `urls` (recipe pages found in the listing) minus those an interrupted
+        run already finished (or gave up on).
+        """
+        urls = list(urls)
+        if self.tracker is not None:
+            self.tracker.listed(urls)
+        if self.checkpoint is None:
+            return list(urls)
+        return [u for u in urls if self.checkpoint.pending(u)]
+
+    def _completed(self, url: str) -> None:
+        """Called once every version parsed from `url` has been yielded."""
+        if self.checkpoint is not None:
+            self.checkpoint.complete(url)
+
+    def _failed(self, url: str, stage: str, error: BaseException) -> None:
+        """A fetch (after retries) or parse of `url` failed; the run goes on without it."""
+        metrics.incr(f"{stage}_errors")
+        if self.tracker is not None:
+            self.tracker.fail(url)
+        if self.checkpoint is not None:
+            self.checkpoint.fail(url, stage, error)
+        else:
+            print(f"{stage} failed: {url}: {type(error).__name__}: {error}", file=sys.stderr)
+
+def iter_unordered(fn: Callable[[T], R], items: Iterable[T], workers: int, executor=ThreadPoolExecutor) -> Iterator[R]:
+    """
+    Map `fn` over `items` on a bounded pool (threads by default), yielding
+    results as they complete. At most 2 * workers calls are queued at once, so
+    `items` may be a long or lazy iterable.
+    """
+    items = iter(items)
+    pool = executor(max_workers=workers)
+    pending = set()
+    try:
+        for it in items:
+            pending.add(pool.submit(fn, it))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,150 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Optional
+from utils import metrics
+
+DEFAULT_CACHE_PATH = "data/cache/http.sqlite"
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when a URL has never been cached."""
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+class HttpCache:
+    """
+    On-disk HTTP response cache (SQLite), keyed by the sha256 of the URL.
+
+    - entries younger than `ttl` seconds are served without any request
+    - older entries are revalidated with If-None-Match / If-Modified-Since,
+      so an unchanged page costs a 304 instead of a full body
+    - `max_bytes` bounds the stored (compressed) bodies; least recently used
+      entries are evicted first
+    - `offline` serves only from the cache and raises CacheMiss otherwise
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, offline: bool = False):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)")
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        with self._lock:
+            self._evict_locked()
+
+    def _row(self, url: str):
+        with self._lock:
+            return self._db.execute(
+                "SELECT etag, last_modified, body, stored_at FROM responses WHERE key = ?",
+                (url_key(url),),
+            ).fetchone()
+
+    def _touch(self, url: str, stored: bool = False):
+        now = time.time()
+        with self._lock:
+            if stored:
+                self._db.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                                 (now, now, url_key(url)))
+            else:
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, url_key(url)))
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Return the cached body if it can be served without a request, else None."""
+        row = self._row(url)
+        if row is None:
+            if self.offline:
+                raise CacheMiss(url)
+            return None
+        _, _, body, stored_at = row
+        if self.offline or (self.ttl is not None and time.time() - stored_at < self.ttl):
+            self.hits += 1
+            metrics.incr("cache_hits")
+            self._touch(url)
+            return zlib.decompress(body).decode("utf-8")
+        return None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        row = self._row(url)
+        headers = {}
+        if row:
+            etag, last_modified, _, _ = row
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def store(self, url: str, response) -> Optional[str]:
+        """
+        Record a response (following a conditional request) and return its
+        body; None for a 304 whose entry was evicted in the meantime (repeat
+        the request without conditional headers).
+        """
+        if response.status_code == 304:
+            row = self._row(url)
+            if row is None:
+                metrics.incr("cache_revalidate_evicted")
+                return None
+            self.revalidated += 1
+            metrics.incr("cache_revalidated")
+            self._touch(url, stored=True)
+            return zlib.decompress(row[2]).decode("utf-8")
+        response.raise_for_status()
+        self.misses += 1
+        metrics.incr("cache_misses")
+        text = response.text
+        body = zlib.compress(text.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (url_key(url),)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url_key(url), url, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                 body, len(body), now, now),
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            self._evict_locked()
+        return text
+
+    def _evict_locked(self):
+        if not self.max_bytes or self._total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are back under 90% of the budget
+        target = int(self.max_bytes * 0.9)
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total <= target:
+                break
+            doomed.append((key,))
+            self._total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,42 +1,47 @@
 from datetime import datetime
-import time
 import json
-import requests
-import urllib.request
+from typing import Optional
 from utils import text
 from app import models
-from scrapers.base import SourceScraper, register_source
+from scrapers.base import register_source
+from scrapers.cache import HttpCache
+from scrapers.http import HttpScraper
+from utils import metrics
 
 
 BASE = "https://www.thecocktaildb.com/api/json/v1/1/"
-LOOKUP_URL = BASE + "lookup.php?i="
+LOOKUP_PATH = "lookup.php?i="
 HEADERS = {"User-Agent": "CocktailIngest/1.0 (+for personal noncommercial use)"}
 
 ALLOWED_CATEGORIES = ['Cocktail']
 
 @register_source("cocktaildb")
-class CocktailDbScraper(SourceScraper):
-    def __init__(self, delay: float = 0.1):
-        self.delay = delay
-        self.session = requests.Session()
+class CocktailDbScraper(HttpScraper):
+    def __init__(self, delay: float = 0.1, concurrency: int = 1, rate: Optional[float] = None,
+                 cache: Optional[HttpCache] = None, base: str = BASE, retries: int = 3, backoff: float = 1.0):
+        # One keep-alive pool shared by the filter and lookup calls
+        super().__init__(delay, concurrency=concurrency, rate=rate, cache=cache, headers=HEADERS,
+                         retries=retries, backoff=backoff)
+        self.base = base
 
-    def fetch(self, url: str):
-        r = self.session.get(url, headers=HEADERS, timeout=20)
-        r.raise_for_status()
-        time.sleep(self.delay)
-        return r.text
+    def fetch_json(self, url: str):
+        return json.loads(self.fetch(url))
 
     def _parse_recipe(self, drink):
+        slots = [i for i in range(1, 16) if drink.get(f"strIngredient{i}") is not None]
+        # Rewrite every name/measure of the drink in one batch
+        with metrics.timer("rules"):
+            names = text.replace_text_by_rules([drink[f"strIngredient{i}"] for i in slots])
+            measures = text.replace_text_by_rules([drink.get(f"strMeasure{i}") or "" for i in slots])
+            drink_name = text.replace_text_by_rule(drink["strDrink"])
+
         ingredient_list = []
-        for i in range (1,16):
-            if drink.get(f"strIngredient{i}") is None:
-                continue
-            ingredient_name = text.replace_text_by_rule(drink[f"strIngredient{i}"])
+        for i, ingredient_name, measure in zip(slots, names, measures):
             ingredient_measure = (
-                text.replace_text_by_rule(drink[f"strMeasure{i}"])
+                measure
                 if drink.get(f"strMeasure{i}")
                 else ""
-            ),
+            )
             ingredient_id = text.slugify(ingredient_name)
             ingredient_list.append(
                 models.Ingredient(
@@ -45,7 +50,6 @@ class CocktailDbScraper(SourceScraper):
                     measure= ingredient_measure
                 )
             )
-        drink_name = text.replace_text_by_rule(drink["strDrink"])
         drink_slug = text.slugify(drink_name)
 
         recipeVersion = models.RecipeVersion(
@@ -68,13 +72,13 @@ class CocktailDbScraper(SourceScraper):
         return recipeVersion
 
     def _get_filters(self, kind, property):
-        url = BASE + f"list.php?{kind}=list"
-        data = requests.get(url, timeout=20).json()
+        url = self.base + f"list.php?{kind}=list"
+        data = self.fetch_json(url)
         return [d[property] for d in data.get("drinks", []) if d.get(property)]
 
     def _get_drink_ids(self, kind: str, value: str):
-        url = BASE + f"filter.php?{kind}={value.replace(' ', '+')}"
-        data = requests.get(url, timeout=20).json()
+        url = self.base + f"filter.php?{kind}={value.replace(' ', '+')}"
+        data = self.fetch_json(url)
         return [d["idDrink"] for d in data.get("drinks", []) if d.get("idDrink")]
 
     def iter_recipes(self):
@@ -105,21 +109,47 @@ class CocktailDbScraper(SourceScraper):
             for i in ingredients
             if any(s in i.lower() for s in allowed_ingredient_substr)
         ]
-        for i in filtered_ingredients:
-            drinkIds.update(self._get_drink_ids("i", i))
+        # filter calls are cheap and always repeated; they are only reported
+        # so a failed one keeps the run resumable
+        for ingredient, ids, err in self._map(self._try_drink_ids, filtered_ingredients):
+            filter_url = self.base + f"filter.php?i={ingredient.replace(' ', '+')}"
+            if err is not None:
+                self._failed(filter_url, "fetch", err)
+                continue
+            self._completed(filter_url)
+            drinkIds.update(ids)
 
-        all_urls = [f"{LOOKUP_URL}{str(id)}" for id in drinkIds]
-        for url in all_urls:
-            with urllib.request.urlopen(url) as page:
-                data = json.load(page)
-                if data["drinks"] is None:
-                    continue
-                for drink in data["drinks"]:
-                    try:
-                        if drink["strCategory"] in ALLOWED_CATEGORIES:
-                            yield self._parse_recipe(drink)
-                        else:
-                            continue
-                    except Exception as e:
-                        print(e)
+        all_urls = [f"{self.base}{LOOKUP_PATH}{str(id)}" for id in drinkIds]
+        for url, body, err in self._map(self._try_fetch, self._todo(all_urls)):
+            if err is not None:
+                self._failed(url, "fetch", err)
+                continue
+            if not self._page_changed(url, body):
+                self._completed(url)
+                continue
+            try:
+                drinks = json.loads(body)["drinks"] or []
+            except (ValueError, KeyError, TypeError) as e:
+                self._failed(url, "parse", e)
+                continue
+            ok = True
+            for drink in drinks:
+                try:
+                    if drink["strCategory"] not in ALLOWED_CATEGORIES:
                         continue
+                    with metrics.timer("parse"):
+                        rv = self._parse_recipe(drink)
+                except Exception as e:
+                    # the whole lookup fails: the checkpoint drops its drinks already written
+                    self._failed(url, "parse", e)
+                    ok = False
+                    break
+                yield self._emitted(url, rv)
+            if ok:
+                self._completed(url)
+
+    def _try_drink_ids(self, ingredient: str):
+        try:
+            return ingredient, self._get_drink_ids("i", ingredient), None
+        except Exception as e:
+            return ingredient, None, e
@@ -0,0 +1,94 @@
+import time
+from typing import Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from scrapers.base import SourceScraper, iter_unordered
+from scrapers.cache import HttpCache
+from scrapers.ratelimit import HostRateLimiter
+from utils import metrics
+
+def _retryable(e: requests.RequestException) -> bool:
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = e.response.status_code if e.response is not None else None
+    return status == 429 or (status is not None and status >= 500)
+
+class HttpScraper(SourceScraper):
+    """
+    Shared HTTP plumbing for scrapers: one keep-alive session, optional
+    concurrency with a per-host token bucket, and an optional HttpCache.
+    Connection errors, timeouts, 429s and 5xx responses are retried up to
+    `retries` times, sleeping backoff * 2**attempt seconds in between.
+    """
+
+    def __init__(self, delay: float, concurrency: int = 1, rate: Optional[float] = None,
+                 cache: Optional[HttpCache] = None, headers: Optional[Dict[str, str]] = None,
+                 retries: int = 3, backoff: float = 1.0):
+        self.delay = delay
+        self.retries = retries
+        self.backoff = backoff
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Concurrent mode replaces the per-request sleep with a per-host token bucket
+        self.limiter = HostRateLimiter.from_delay(delay, rate) if self.concurrency > 1 else None
+
+    def fetch(self, url: str) -> str:
+        attempt = 0
+        while True:
+            try:
+                return self._fetch(url)
+            except requests.RequestException as e:
+                if attempt >= self.retries or not _retryable(e):
+                    raise
+                metrics.incr("http_retries")
+                with metrics.timer("sleep"):
+                    time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+
+    def _fetch(self, url: str) -> str:
+        if self.cache:
+            body = self.cache.lookup(url)
+            if body is not None:
+                return body
+        if self.limiter:
+            with metrics.timer("sleep"):
+                self.limiter.wait(url)
+        with metrics.timer("fetch"):
+            if self.cache:
+                r = self.session.get(url, headers=self.cache.conditional_headers(url), timeout=20)
+                text = self.cache.store(url, r)
+                if text is None:  # 304, but the cached copy was evicted since
+                    r = self.session.get(url, timeout=20)
+                    text = self.cache.store(url, r)
+                    if text is None:
+                        raise requests.HTTPError(f"304 Not Modified for an unconditional request: {url}", response=r)
+            else:
+                r = self.session.get(url, timeout=20)
+                r.raise_for_status()
+                text = r.text
+        metrics.incr("http_requests")
+        metrics.incr("bytes_fetched", len(r.content))
+        if not self.limiter:
+            with metrics.timer("sleep"):
+                time.sleep(self.delay)
+        return text
+
+    def _try_fetch(self, url: str) -> Tuple[str, Optional[str], Optional[Exception]]:
+        """(url, body, None), or (url, None, error) once retries are exhausted."""
+        try:
+            return url, self.fetch(url), None
+        except Exception as e:
+            return url, None, e
+
+    def _map(self, fn, items):
+        if self.concurrency <= 1:
+            for it in items:
+                yield fn(it)
+        else:
+            yield from iter_unordered(fn, items, self.concurrency)
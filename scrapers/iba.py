@@ -1,44 +1,58 @@
-
 import time
-import requests
-from bs4 import BeautifulSoup
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from bs4 import BeautifulSoup, Tag
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
-from typing import List
+from typing import List, Optional, Set, Tuple, Union
 from app.models import RecipeVersion, Ingredient, Attribution
-from scrapers.base import SourceScraper, register_source
-from utils.text import slugify, normalize_whitespace, looks_like_ingredient, split_measure_ingredient, replace_text_by_rule
+from scrapers.base import register_source, iter_unordered
+from scrapers.cache import HttpCache
+from scrapers.http import HttpScraper
+from utils import metrics
+from utils.text import slugify, normalize_whitespace, looks_like_ingredient, split_measure_ingredient, replace_text_by_rules
 
 BASE = "https://iba-world.com/"
 ALL_URL = urljoin(BASE, "cocktails/all-cocktails/")
 HEADERS = {"User-Agent": "CocktailIngest/1.0 (+for personal noncommercial use)"}
 
-@register_source("iba")
-class IBAScraper(SourceScraper):
-    def __init__(self, delay: float = 0.6):
-        self.delay = delay
-        self.session = requests.Session()
+try:  # lxml is optional; it is a much faster tree builder when installed
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
 
-    def fetch(self, url: str):
-        r = self.session.get(url, headers=HEADERS, timeout=20)
-        r.raise_for_status()
-        time.sleep(self.delay)
-        return r.text
+HEADINGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+SECTION_KEYWORDS = {
+    "ingredients": ("ingredient",),
+    "instructions": ("method", "directions", "instructions", "preparation"),
+    "garnish": ("garnish",),
+}
 
-    def _parse_all(self, html: str, links=None, pages_parsed =None) -> List[str]:
-        if links is None:
-            links = set()
-        if pages_parsed is None:
-            pages_parsed = set()
+@register_source("iba")
+class IBAScraper(HttpScraper):
+    def __init__(self, delay: float = 0.6, concurrency: int = 1, rate: Optional[float] = None,
+                 cache: Optional[HttpCache] = None, base: str = BASE, parse_workers: int = 0,
+                 parser: Optional[str] = None, retries: int = 3, backoff: float = 1.0):
+        super().__init__(delay, concurrency=concurrency, rate=rate, cache=cache, headers=HEADERS,
+                         retries=retries, backoff=backoff)
+        self.base = base
+        self.all_url = urljoin(base, "cocktails/all-cocktails/")
+        self.parse_workers = parse_workers
+        self.parser = parser or PARSER
 
+    def _parse_links(self, html: str) -> Tuple[Set[str], List[Tuple[str, str]]]:
+        """Returns (recipe_links, [(page_num, page_url), ...]) found on one listing page."""
         soup = BeautifulSoup(html, "html.parser")
+        links = set()
+        pages = []
 
         for a in soup.select("a"):
             href = a.get("href", "")
             if not href:
                 continue
 
-            full = urljoin(BASE, href)  # normalize relative URLs
+            full = urljoin(self.base, href)  # normalize relative URLs
             path = urlparse(full).path.rstrip("/")
             parts = path.split("/")
 
@@ -54,136 +68,296 @@ class IBAScraper(SourceScraper):
                     page_num = path.split("/page/")[1].split("/")[0]
                 except IndexError:
                     page_num = None
-                if page_num and page_num not in pages_parsed:
-                    pages_parsed.add(page_num)
+                if page_num:
+                    pages.append((page_num, full))
+
+        return links, pages
+
+    def _parse_all(self, html: str, links=None, pages_parsed =None) -> List[str]:
+        if links is None:
+            links = set()
+        if pages_parsed is None:
+            pages_parsed = set()
+
+        found, pages = self._parse_links(html)
+        links.update(found)
+        for page_num, full in pages:
+            if page_num not in pages_parsed:
+                pages_parsed.add(page_num)
+                try:
                     next_html = self.fetch(full)            # <-- key fix: fetch HTML here
-                    self._parse_all(next_html, links, pages_parsed)
+                except Exception as e:
+                    self._failed(full, "fetch", e)
+                    continue
+                self._completed(full)
+                self._parse_all(next_html, links, pages_parsed)
 
         return links  # caller can do: sorted(self._parse_all(...))
 
     def _parse_recipe(self, url: str, html: str) -> RecipeVersion:
-        soup = BeautifulSoup(html, "html.parser")
+        return parse_recipe(url, html, base=self.base, parser=self.parser)
 
-        title = soup.find(["h1","h2"])
-        name = title.get_text(strip=True) if title else "Unknown IBA Cocktail"
-        name_slug = slugify(name)
-
-        img = soup.find("img", {"class": "attachment-medium_large"})
-        image = img["src"] if img and img.get("src") else None
-        if image and image.startswith("//"):
-            image = "https:" + image
-        if image and image.startswith("/"):
-            image = urljoin(BASE, image)
-
-        ingredients = []
-        ingredients_header = None
-        for tag in soup.find_all(["h2","h3","h4","h5","h6"]):
-            if "ingredient" in tag.get_text(strip=True).lower():
-                ingredients_header = tag
-                break
-        if ingredients_header:
-            lst = ingredients_header.find_next(["ul","ol"])
-            if lst:
-                for li in lst.find_all("li"):
-                    line = normalize_whitespace(li.get_text(" ", strip=True))
-                    if not line:
-                        continue
-                    tranformed_line = replace_text_by_rule(line)
-                    m, n = split_measure_ingredient(tranformed_line)
-                    ingredients.append(Ingredient(id=slugify(n), name=n, measure=m))
-        if not ingredients:
-            for li in soup.select("li"):
-                line = normalize_whitespace(li.get_text(' ', strip=True))
-                if looks_like_ingredient(line):
-                    tranformed_line = replace_text_by_rule(line)
-                    m, n = split_measure_ingredient(tranformed_line)
-                    ingredients.append(Ingredient(id=slugify(n), name=n, measure=m))
-
-        seen = set()
-        uniq = []
-        for ing in ingredients:
-            key = (ing.id, ing.measure or "")
-            if key in seen: 
-                continue
-            seen.add(key)
-            uniq.append(ing)
-        ingredients = uniq
-
-        instructions = ""
-        for tag in soup.find_all(["h2","h3","h4","h5","h6"]):
-            if any(k in tag.get_text(strip=True).lower() for k in ["method","directions","instructions","preparation"]):
-                parts = []
-                for sib in tag.find_all_next():
-                    if sib.name and sib.name.lower() in ["h1","h2","h3","h4","h5","h6"]:
-                        break
-                    if sib.name in ["p"]:
-                        t = sib.get_text(" ", strip=True)
-                        if t: 
-                            parts.append(t)
-                    if sib.name in ("ul","ol"):
-                        for li in sib.find_all("li"):
-                            t = li.get_text(" ", strip=True)
-                            if t:
-                                parts.append(t)
-                instructions = "\\n".join(parts).strip()
-                break
-        if not instructions:
-            p = soup.find("p")
-            if p:
-                instructions = p.get_text(" ", strip=True)
-    
-        garnish = None
-        for tag in soup.find_all(["h2","h3","h4","h5","h6"]):
-            if any(k in tag.get_text(strip=True).lower() for k in ["garnish"]):
-                parts = []
-                for sib in tag.find_all_next():
-                    if sib.name and sib.name.lower() in ["h1","h2","h3","h4","h5","h6"]:
-                        break
-                    if sib.name in ["p"]:
-                        t = sib.get_text(" ", strip=True)
-                        if t:
-                            parts.append(t)
-                garnish = "\\n".join(parts).strip()
-                break
+    def _fetch_page(self, url: str) -> Tuple[str, str]:
+        return url, self.fetch(url)
 
-        glass = None
-        for tag in soup.find_all(["p","li","span"]):
-            t = tag.get_text(" ", strip=True).lower()
-            if "glass" in t and len(t) < 120:
-                glass = t
-                break
+    def _iter_pages_concurrent(self):
+        """
+        Keeps up to `concurrency` requests in flight. Listing pages are fetched
+        as soon as they are discovered (instead of recursing), and recipe pages
+        are yielded as (url, html) in completion order.
+        """
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="iba")
+        pending = {}  # future -> ("page" | "recipe", url)
+        pages_parsed = set()
+        links = set()
 
-        tags = []
-        for a in soup.select("a[rel='tag'], a[href*='/category/']"):
-            t = a.get_text(strip=True)
-            if t:
-                tags.append(t)
-
-        rv = RecipeVersion(
-            id=f"iba::{name_slug}",
-            name=name,
-            name_slug=name_slug,
-            ingredients=ingredients,
-            instructions=instructions,
-            glass=glass,
-            tags=tags,
-            image=image,
-            garnish=garnish,
-            method=None,
-            attribution=Attribution(
-                source_name="IBA (iba-world.com)",
-                source_url=url,
-                fetched_at=datetime.utcnow().isoformat(timespec="seconds")+"Z"
-            )
-        )
-        return rv
+        def on_listing(html):
+            found, pages = self._parse_links(html)
+            for page_num, full in pages:
+                if page_num not in pages_parsed:
+                    pages_parsed.add(page_num)
+                    pending[pool.submit(self.fetch, full)] = ("page", full)
+            new = found - links
+            links.update(new)
+            for u in self._todo(new):
+                pending[pool.submit(self._fetch_page, u)] = ("recipe", u)
 
-    def iter_recipes(self):
-        index_html = self.fetch(ALL_URL)
-        urls = self._parse_all(index_html)
+        try:
+            on_listing(self.fetch(self.all_url))
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    kind, url = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        self._failed(url, "fetch", e)
+                        continue
+                    if kind == "page":
+                        on_listing(result)
+                        self._completed(url)
+                    else:
+                        yield result
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_pages(self):
+        """Fetch stage: yields (url, html) for every recipe page."""
+        if self.concurrency > 1:
+            yield from self._iter_pages_concurrent()
+            return
+        index_html = self.fetch(self.all_url)
+        urls = self._todo(self._parse_all(index_html))
         for u in urls:
             try:
-                html = self.fetch(u)
-                yield self._parse_recipe(u, html)
-            except Exception:
+                page = self._fetch_page(u)
+            except Exception as e:
+                self._failed(u, "fetch", e)
+                continue
+            yield page
+
+    def _changed_pages(self):
+        for u, html in self._iter_pages():
+            if self._page_changed(u, html):
+                yield u, html
+            else:
+                self._completed(u)
+
+    def iter_recipes(self):
+        # Parse stage: inline, or fanned out across processes
+        jobs = ((u, html, self.base, self.parser) for u, html in self._changed_pages())
+        if self.parse_workers > 0:
+            results = iter_unordered(_parse_job, jobs, self.parse_workers, executor=ProcessPoolExecutor)
+        else:
+            results = map(_parse_job, jobs)
+        for u, rv, seconds in results:
+            metrics.record("parse", seconds)
+            if isinstance(rv, Exception):
+                self._failed(u, "parse", rv)
                 continue
+            yield self._emitted(u, rv)
+            self._completed(u)
+
+def _parse_job(job) -> Tuple[str, Union[RecipeVersion, Exception], float]:
+    # returns its own wall time so parse is measured in pool workers too, and
+    # the exception (instead of raising) so one bad page doesn't stop the pool
+    url, html, base, parser = job
+    t = time.perf_counter()
+    try:
+        rv = parse_recipe(url, html, base=base, parser=parser)
+    except Exception as e:
+        rv = e
+    return url, rv, time.perf_counter() - t
+
+class _Index:
+    """Everything parse_recipe needs from the tree, collected in one document pass."""
+    __slots__ = ("title", "img", "headings", "items", "first_p", "glass", "tag_links")
+
+    def __init__(self, soup):
+        self.title = self.img = self.first_p = self.glass = None
+        self.headings = []   # h2-h6
+        self.items = []      # every li
+        self.tag_links = []  # a[rel='tag'], a[href*='/category/']
+        for el in soup.descendants:
+            if not isinstance(el, Tag):
+                continue
+            name = el.name
+            if name in ("h1", "h2") and self.title is None:
+                self.title = el
+            if name in ("h2", "h3", "h4", "h5", "h6"):
+                self.headings.append(el)
+            elif name == "li":
+                self.items.append(el)
+            elif name == "p" and self.first_p is None:
+                self.first_p = el
+            elif name == "img" and self.img is None and "attachment-medium_large" in (el.get("class") or ()):
+                self.img = el
+            elif name == "a":
+                rel = el.get("rel")
+                if isinstance(rel, list):
+                    rel = " ".join(rel)
+                if rel == "tag" or "/category/" in el.get("href", ""):
+                    self.tag_links.append(el)
+            if self.glass is None and _is_glass_line(el):
+                self.glass = el
+
+    def sections(self) -> dict:
+        """The first heading matching each section's keywords."""
+        found = {}
+        for tag in self.headings:
+            t = tag.get_text(strip=True).lower()
+            for section, keys in SECTION_KEYWORDS.items():
+                if section not in found and any(k in t for k in keys):
+                    found[section] = tag
+            if len(found) == len(SECTION_KEYWORDS):
+                break
+        return found
+
+def _until_next_heading(tag):
+    """Tags after `tag` in document order, stopping at the next h1-h6."""
+    for sib in tag.next_elements:
+        if not isinstance(sib, Tag):
+            continue
+        if sib.name and sib.name.lower() in HEADINGS:
+            return
+        yield sib
+
+def _is_glass_line(tag) -> bool:
+    if tag.name not in ("p", "li", "span"):
+        return False
+    t = tag.get_text(" ", strip=True).lower()
+    return "glass" in t and len(t) < 120
+
+def parse_recipe(url: str, html: str, base: str = BASE, parser: str = PARSER) -> RecipeVersion:
+    soup = BeautifulSoup(html, parser)
+    index = _Index(soup)
+    sections = index.sections()
+
+    title = index.title
+    name = title.get_text(strip=True) if title else "Unknown IBA Cocktail"
+    name_slug = slugify(name)
+
+    img = index.img
+    image = img["src"] if img and img.get("src") else None
+    if image and image.startswith("//"):
+        image = "https:" + image
+    if image and image.startswith("/"):
+        image = urljoin(base, image)
+
+    ingredients = []
+    ingredients_header = sections.get("ingredients")
+    if ingredients_header:
+        lst = ingredients_header.find_next(["ul","ol"])
+        if lst:
+            lines = []
+            for li in lst.find_all("li"):
+                line = normalize_whitespace(li.get_text(" ", strip=True))
+                if not line:
+                    continue
+                lines.append(line)
+            with metrics.timer("rules"):
+                lines = replace_text_by_rules(lines)
+            for tranformed_line in lines:
+                m, n = split_measure_ingredient(tranformed_line)
+                ingredients.append(Ingredient(id=slugify(n), name=n, measure=m))
+    if not ingredients:
+        lines = []
+        for li in index.items:
+            line = normalize_whitespace(li.get_text(' ', strip=True))
+            if looks_like_ingredient(line):
+                lines.append(line)
+        with metrics.timer("rules"):
+            lines = replace_text_by_rules(lines)
+        for tranformed_line in lines:
+            m, n = split_measure_ingredient(tranformed_line)
+            ingredients.append(Ingredient(id=slugify(n), name=n, measure=m))
+
+    seen = set()
+    uniq = []
+    for ing in ingredients:
+        key = (ing.id, ing.measure or "")
+        if key in seen: 
+            continue
+        seen.add(key)
+        uniq.append(ing)
+    ingredients = uniq
+
+    instructions = ""
+    tag = sections.get("instructions")
+    if tag:
+        parts = []
+        for sib in _until_next_heading(tag):
+            if sib.name in ["p"]:
+                t = sib.get_text(" ", strip=True)
+                if t: 
+                    parts.append(t)
+            if sib.name in ("ul","ol"):
+                for li in sib.find_all("li"):
+                    t = li.get_text(" ", strip=True)
+                    if t:
+                        parts.append(t)
+        instructions = "\\n".join(parts).strip()
+    if not instructions:
+        p = index.first_p
+        if p:
+            instructions = p.get_text(" ", strip=True)
+
+    garnish = None
+    tag = sections.get("garnish")
+    if tag:
+        parts = []
+        for sib in _until_next_heading(tag):
+            if sib.name in ["p"]:
+                t = sib.get_text(" ", strip=True)
+                if t:
+                    parts.append(t)
+        garnish = "\\n".join(parts).strip()
+
+    glass = None
+    if index.glass:
+        glass = index.glass.get_text(" ", strip=True).lower()
+
+    tags = []
+    for a in index.tag_links:
+        t = a.get_text(strip=True)
+        if t:
+            tags.append(t)
+
+    rv = RecipeVersion(
+        id=f"iba::{name_slug}",
+        name=name,
+        name_slug=name_slug,
+        ingredients=ingredients,
+        instructions=instructions,
+        glass=glass,
+        tags=tags,
+        image=image,
+        garnish=garnish,
+        method=None,
+        attribution=Attribution(
+            source_name="IBA (iba-world.com)",
+            source_url=url,
+            fetched_at=datetime.utcnow().isoformat(timespec="seconds")+"Z"
+        )
+    )
+    return rv
@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most `burst`.
+
+    acquire() reserves a token and sleeps outside the lock until it is due, so
+    concurrent callers queue up fairly instead of spinning.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, blocking until it is available. Returns seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+class HostRateLimiter:
+    """One TokenBucket per host, created on first use."""
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_delay(cls, delay: float, rate: Optional[float] = None, burst: int = 1) -> "HostRateLimiter":
+        """Explicit `rate` wins; otherwise keep the old politeness of one request per `delay`."""
+        if rate is None and delay and delay > 0:
+            rate = 1.0 / delay
+        return cls(rate, burst=burst)
+
+    def wait(self, url: str) -> float:
+        if not self.rate:
+            return 0.0
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket.acquire()
@@ -0,0 +1,140 @@
+# utils/metrics.py
+"""
+Stage timers and counters for the commands in main.py.
+
+Off by default: timer() then returns one shared no-op context manager and
+record()/incr() return on a single flag check, so instrumented code costs
+next to nothing. main.py turns it on with --metrics, --metrics-json or
+--metrics-prom and prints summary() when the command ends.
+
+Stages: fetch, sleep, parse, rules, merge, pack, serialize (rules runs inside
+parse, so the two overlap). Numbers are per process: with --parse-workers
+the parse time comes back from the workers, their rules time does not.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+STAGES = ("fetch", "sleep", "parse", "rules", "merge", "pack", "serialize")
+
+enabled = False
+_lock = threading.Lock()
+_timers: Dict[str, List[float]] = {}   # name -> [calls, seconds]
+_counters: Dict[str, float] = {}
+_started = time.perf_counter()
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL = _NullTimer()
+
+def enable(on: bool = True) -> None:
+    global enabled, _started
+    enabled = on
+    _started = time.perf_counter()
+
+def reset() -> None:
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+def timer(name: str):
+    """`with metrics.timer("parse"): ...` adds the block's wall time to a stage."""
+    return _Timer(name) if enabled else _NULL
+
+def record(name: str, seconds: float, calls: int = 1) -> None:
+    if not enabled:
+        return
+    with _lock:
+        t = _timers.get(name)
+        if t is None:
+            t = _timers[name] = [0, 0.0]
+        t[0] += calls
+        t[1] += seconds
+
+def incr(name: str, value: float = 1) -> None:
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def snapshot() -> dict:
+    with _lock:
+        timers = {k: {"calls": int(c), "seconds": round(s, 6)} for k, (c, s) in _timers.items()}
+        counters = dict(_counters)
+    lookups = sum(counters.get(k, 0) for k in ("cache_hits", "cache_revalidated", "cache_misses"))
+    if lookups:
+        counters["cache_hit_rate"] = round((counters.get("cache_hits", 0) + counters.get("cache_revalidated", 0))
+                                           / lookups, 4)
+    return {"wall_seconds": round(time.perf_counter() - _started, 6), "timers": timers, "counters": counters}
+
+def summary() -> str:
+    snap = snapshot()
+    wall = snap["wall_seconds"] or 1e-9
+    names = [s for s in STAGES if s in snap["timers"]] + sorted(set(snap["timers"]) - set(STAGES))
+    w = max(map(len, ["stage", *names]))
+    lines = [f"{'stage':<{w}} {'calls':>9} {'seconds':>10} {'% wall':>7}"]
+    for name in names:
+        t = snap["timers"][name]
+        lines.append(f"{name:<{w}} {t['calls']:>9,} {t['seconds']:>10.3f} {100 * t['seconds'] / wall:>6.1f}%")
+    lines.append(f"{'wall':<{w}} {'':>9} {snap['wall_seconds']:>10.3f}")
+    w = max(map(len, snap["counters"]), default=0)
+    for name, value in sorted(snap["counters"].items()):
+        if name == "cache_hit_rate":
+            lines.append(f"{name:<{w}} {100 * value:>10.1f}%")
+        elif name.startswith("bytes"):
+            lines.append(f"{name:<{w}} {value / 2**20:>10.2f} MiB")
+        else:
+            lines.append(f"{name:<{w}} {value:>10,.0f}")
+    return "\n".join(lines)
+
+def write_json(path) -> None:
+    Path(path).write_text(json.dumps(snapshot(), indent=2))
+
+def _labels(labels: Dict[str, str]) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+
+def write_prometheus(path, prefix: str = "cocktail_ingest", labels: Optional[Dict[str, str]] = None) -> None:
+    """Prometheus textfile-collector format, renamed into place so a scrape never sees half a file."""
+    snap = snapshot()
+    labels = labels or {}
+    out = [f"# TYPE {prefix}_stage_seconds_total counter",
+           f"# TYPE {prefix}_stage_calls_total counter"]
+    for name, t in sorted(snap["timers"].items()):
+        stage = _labels(dict(labels, stage=name))
+        out.append(f"{prefix}_stage_seconds_total{stage} {t['seconds']}")
+        out.append(f"{prefix}_stage_calls_total{stage} {t['calls']}")
+    for name, value in sorted(snap["counters"].items()):
+        kind = "gauge" if name == "cache_hit_rate" else "counter"
+        metric = f"{prefix}_{name}" if kind == "gauge" else f"{prefix}_{name}_total"
+        out.append(f"# TYPE {metric} {kind}")
+        out.append(f"{metric}{_labels(labels)} {value}")
+    out.append(f"# TYPE {prefix}_wall_seconds gauge")
+    out.append(f"{prefix}_wall_seconds{_labels(labels)} {snap['wall_seconds']}")
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text("\n".join(out) + "\n")
+    os.replace(tmp, path)
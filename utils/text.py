@@ -1,9 +1,15 @@
 import json
 import re
 import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Hard-coded path to the substitutions file (resolved next to this module)
+SUBS_PATH = Path(__file__).with_name("substitutes.json")
 
 _SUBS_CACHE = None        # dict of rules
 _SUBS_KEYS = None         # keys sorted by length desc
+_ENGINE = None            # compiled RuleEngine for _SUBS_CACHE
 
 def slugify(s: str) -> str:
     s = unicodedata.normalize('NFKD', s).encode('ascii', 'ignore').decode('ascii')
@@ -22,29 +28,24 @@ def looks_like_ingredient(line: str) -> bool:
     line_lower = line.lower()
     return any(u in line_lower for u in units) or any(k in line_lower for k in keywords)
 
+_MEASURE_JOINERS = frozenset(['oz','ml','cl','dash','dashes','barspoon','barspoons','tablespoon','tablespoons',
+                              'tsp','teaspoon','teaspoons','pcs','drops','splash'])
+_RANGE_TOKEN = re.compile(r'\d+\s*-\s*\d+')
+
+def _is_amount(t: str) -> bool:
+    return t.replace('/', '').replace('.', '').isdigit() or _RANGE_TOKEN.fullmatch(t) is not None
+
 def split_measure_ingredient(line: str):
+    """Split "1 1/2 oz Gin" into ("1 1/2 oz", "Gin"); see utils.measure for the numbers."""
     tokens = line.split()
     if not tokens:
         return None, line.strip()
 
-    joiners = set(['oz','ml','cl','dash','dashes','barspoon','barspoons','tablespoon','tablespoons',
-                   'tsp','teaspoon','teaspoons','pcs','drops','splash'])
-
-    if (
-        any(
-            t.replace('/', '').replace('.', '').isdigit() or
-            re.fullmatch(r'\d+\s*-\s*\d+', t)
-            for t in tokens[:2]
-        )
-        or any(t.lower() in joiners for t in tokens[:3])
-    ):
+    joiners = _MEASURE_JOINERS
+    if any(_is_amount(t) for t in tokens[:2]) or any(t.lower() in joiners for t in tokens[:3]):
         measure = []
         i = 0
-        while i < len(tokens) and (
-            tokens[i].replace('/', '').replace('.', '').isdigit()
-            or re.fullmatch(r'\d+\s*-\s*\d+', tokens[i])
-            or tokens[i].lower() in joiners
-        ):
+        while i < len(tokens) and (_is_amount(tokens[i]) or tokens[i].lower() in joiners):
             measure.append(tokens[i])
             i += 1
 
@@ -56,34 +57,110 @@ def split_measure_ingredient(line: str):
 
     return None, line.strip()
 
-def replace_text_by_rule(line: str) -> str:
-    # Hard-coded path to the substitutions file
-    SUBS_PATH = "./utils/substitutes.json"
-
-    global _SUBS_CACHE, _SUBS_KEYS  # , _SUBS_MTIME
+def _is_regex_key(key) -> bool:
+    # Regex key: starts and ends with /
+    return isinstance(key, str) and key.startswith("/") and key.endswith("/")
+
+class _LiteralRun:
+    """
+    A run of consecutive literal rules, applied in order.
+
+    Each node carries one alternation of every key in its range. If the
+    alternation finds nothing in the current text, none of the rules in the
+    range can fire, so the whole range is skipped; otherwise the range is split
+    in half and each half is checked against the (possibly rewritten) text.
+    Results are therefore identical to running every rule one after another.
+    """
+    __slots__ = ("guard", "rule", "left", "right")
+
+    def __init__(self, rules):
+        self.guard = re.compile("|".join(p.pattern for p, _ in rules), re.IGNORECASE)
+        self.rule = rules[0] if len(rules) == 1 else None
+        self.left = self.right = None
+        if self.rule is None:
+            mid = len(rules) // 2
+            self.left = _LiteralRun(rules[:mid])
+            self.right = _LiteralRun(rules[mid:])
+
+    def apply(self, out: str) -> str:
+        if self.rule is not None:
+            pattern, val = self.rule
+            return pattern.sub(val, out)
+        if not self.guard.search(out):
+            return out
+        out = self.left.apply(out)
+        return self.right.apply(out)
+
+class RuleEngine:
+    """
+    Compiled form of the substitutions table.
+
+    Keys are applied longest-first (ties keep file order). Regex keys
+    (``/.../``) are compiled once; consecutive literal keys are merged into
+    guarded alternations so a line only pays for the rules that can match it.
+    """
+
+    def __init__(self, rules: Dict[str, str]):
+        self.keys = sorted(rules.keys(), key=len, reverse=True)
+        self._steps = []
+        run = []
+        for key in self.keys:
+            val = rules[key]
+            if _is_regex_key(key):
+                if run:
+                    self._steps.append(_LiteralRun(run))
+                    run = []
+                self._steps.append((re.compile(key[1:-1], re.IGNORECASE), val))
+            else:
+                run.append((re.compile(re.escape(key), re.IGNORECASE), val))
+        if run:
+            self._steps.append(_LiteralRun(run))
+
+    def apply(self, line: str) -> str:
+        out = line
+        for step in self._steps:
+            if isinstance(step, _LiteralRun):
+                out = step.apply(out)
+            else:
+                pattern, val = step
+                out = pattern.sub(val, out)
+        return out
+
+    def apply_batch(self, lines: List[str]) -> List[str]:
+        """Rewrite a list of lines, computing each distinct line only once."""
+        seen: Dict[str, str] = {}
+        out = []
+        for line in lines:
+            res = seen.get(line)
+            if res is None:
+                res = seen[line] = self.apply(line)
+            out.append(res)
+        return out
+
+def load_rules(path: Optional[Path] = None) -> Dict[str, str]:
+    with open(path or SUBS_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    # Allow for a list with one dict or a plain dict (same behavior as before)
+    if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+        data = data[0]
+    elif not isinstance(data, dict):
+        raise ValueError("substitutes.json must be a dict or a list with one dict")
+    return data
+
+def get_rule_engine() -> RuleEngine:
+    global _SUBS_CACHE, _SUBS_KEYS, _ENGINE
 
     # Lazy-load (and cache) the rules on first use
-    if _SUBS_CACHE is None:
-        with open(SUBS_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        # Allow for a list with one dict or a plain dict (same behavior as before)
-        if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
-            data = data[0]
-        elif not isinstance(data, dict):
-            raise ValueError("substitutes.json must be a dict or a list with one dict")
-
-        _SUBS_CACHE = data
-        _SUBS_KEYS = sorted(_SUBS_CACHE.keys(), key=len, reverse=True)
-
-    out = line
-    for key in _SUBS_KEYS:
-        val = _SUBS_CACHE[key]
-        # Regex key: starts and ends with /
-        if isinstance(key, str) and key.startswith("/") and key.endswith("/"):
-            pattern = key[1:-1]
-            out = re.sub(pattern, val, out, flags=re.IGNORECASE)
-        else:
-            out = re.sub(re.escape(key), val, out, flags=re.IGNORECASE)
-
-    return out
\ No newline at end of file
+    if _ENGINE is None:
+        _SUBS_CACHE = load_rules()
+        _ENGINE = RuleEngine(_SUBS_CACHE)
+        _SUBS_KEYS = _ENGINE.keys
+    return _ENGINE
+
+def replace_text_by_rule(line: str) -> str:
+    return get_rule_engine().apply(line)
+
+def replace_text_by_rules(lines: List[str]) -> List[str]:
+    """Batch form of replace_text_by_rule: returns the rewritten list."""
+    return get_rule_engine().apply_batch(lines)